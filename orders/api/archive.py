@@ -0,0 +1,62 @@
+"""
+Перенос завершенных заказов в архив.
+
+Заказы в статусах ``ARCHIVE_STATES`` старше заданной даты переносятся пачками
+в ``ArchivedOrder`` и удаляются из ``Order``/``OrderItem`` в одной транзакции.
+"""
+from django.db import transaction
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedOrder, Order, OrderItem
+
+ARCHIVE_STATES = ('delivered', 'canceled')
+
+
+def archive_batch(before, batch_size):
+    """Архивирует одну пачку заказов, возвращает количество перенесенных."""
+    with transaction.atomic():
+        order_ids = list(Order.objects.select_for_update().filter(
+            state__in=ARCHIVE_STATES, dt__lt=before
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not order_ids:
+            return 0
+
+        orders = {order.id: order for order in Order.objects.filter(id__in=order_ids)}
+        archives = {
+            order.id: ArchivedOrder(id=order.id, user_id=order.user_id, dt=order.dt, placed_at=order.placed_at,
+                                    state=order.state, contact_id=order.contact_id)
+            for order in orders.values()
+        }
+        shops = {order_id: set() for order_id in orders}
+
+        # Позиции в порядке ArchivedOrder.ITEM_FIELDS; цена — зафиксированная при оформлении.
+        order_items = OrderItem.objects.filter(order_id__in=order_ids).annotate(
+            item_price=Coalesce('price', 'product_info__price')
+        ).values_list(
+            'order_id', 'product_info_id', 'product_info__shop_id', 'product_info__product__name',
+            'product_info__product__category__name', 'product_info__model', 'item_price', 'quantity',
+            'product_info__external_id'
+        ).order_by('id')
+        for order_id, *item in order_items:
+            archive = archives[order_id]
+            archive.items.append(item)
+            archive.total_sum += item[5] * item[6]
+            shops[order_id].add(item[1])
+
+        ArchivedOrder.objects.bulk_create(archives.values())
+        ArchivedOrder.shops.through.objects.bulk_create([
+            ArchivedOrder.shops.through(archivedorder_id=order_id, shop_id=shop_id)
+            for order_id, shop_ids in shops.items() for shop_id in shop_ids
+        ])
+        Order.objects.filter(id__in=order_ids).delete()
+    return len(order_ids)
+
+
+def archive_orders(before, batch_size=500):
+    """Архивирует все подходящие заказы пачками по ``batch_size``."""
+    total = 0
+    while True:
+        archived = archive_batch(before, batch_size)
+        if not archived:
+            return total
+        total += archived
@@ -0,0 +1,185 @@
+"""
+Асинхронные версии читающих представлений для запуска под ASGI.
+
+Подключаются вместо синхронных при ``ASYNC_READ_VIEWS = True`` (см. ``api/urls.py``)
+и отдают те же данные в том же формате, что ``CategoryView``, ``ShopView``,
+список ``ProductInfoView`` и ``OrderView.get``. Запросы к БД выполняются через
+асинхронный ORM, проверка токена и ограничение частоты — одним переходом в
+синхронный поток. ``seller_update`` скачивает файл каталога в отдельном потоке,
+не занимая общий поток синхронных представлений.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db.models import Sum, F
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .catalog import load_catalog, import_catalog
+from .db_router import ReplicaReadMixin, ais_sticky, replica_reads_enabled
+from .models import Category, Shop, ProductInfo, Order, ArchivedOrder
+from .permissions import IsShopUser
+from .serializers import CategorySerializer, ShopSerializer, ProductInfoSerializer
+from .throttling import ScopedSlidingWindowThrottle, UserSlidingWindowThrottle, AnonSlidingWindowThrottle
+from .views import OrderView, order_history, with_archive
+
+
+async def replica_allowed(request):
+    """Чтение с реплик по тем же правилам, что в ``ReplicaReadMixin``."""
+    return request.method in ReplicaReadMixin.replica_methods and not await ais_sticky(request.user)
+
+
+def render(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class ViewStub:
+    """Минимальный объект представления для классов ограничения частоты."""
+
+    def __init__(self, throttle_scope=None):
+        self.throttle_scope = throttle_scope
+
+
+def check_request(request, throttle_classes=(), throttle_scope=None, permission_classes=()):
+    """
+    Аутентификация, права и ограничение частоты средствами DRF.
+    Возвращает ``Request`` DRF или готовый ответ с ошибкой.
+    """
+    drf_request = Request(request,
+                          parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                          authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    view = ViewStub(throttle_scope)
+    try:
+        drf_request.user
+        for permission_class in permission_classes:
+            if not permission_class().has_permission(drf_request, view):
+                raise exceptions.PermissionDenied()
+        for throttle_class in throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(drf_request, view):
+                raise exceptions.Throttled(throttle.wait())
+        # Тело запроса разбирается здесь же, пока мы в синхронном потоке.
+        drf_request.data
+    except exceptions.APIException as error:
+        return render({'detail': error.detail}, status=error.status_code)
+    return drf_request
+
+
+async def paginated(request, queryset, serializer_class):
+    """Страница результатов в формате ``PageNumberPagination``."""
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        return render({'detail': 'Invalid page.'}, status=404)
+
+    count = await queryset.acount()
+    offset = (page - 1) * page_size
+    if offset >= count and page != 1:
+        return render({'detail': 'Invalid page.'}, status=404)
+
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if offset + page_size < count else None
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+
+    return render({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': serializer_class(objects, many=True).data,
+    })
+
+
+@require_GET
+async def categories(request):
+    return await paginated(request, Category.objects.filter(shops__state=True), CategorySerializer)
+
+
+@require_GET
+async def shops(request):
+    return await paginated(request, Shop.objects.filter(state=True), ShopSerializer)
+
+
+@require_GET
+async def products(request):
+    checked = await sync_to_async(check_request)(
+        request, throttle_classes=(UserSlidingWindowThrottle, AnonSlidingWindowThrottle))
+    if isinstance(checked, HttpResponse):
+        return checked
+
+    queryset = ProductInfo.objects.filter(shop__state=True, version=F('shop__catalog_version')).select_related(
+        'shop', 'product__category'
+    ).prefetch_related('product_parameters__parameter').distinct().order_by('id')
+    with replica_reads_enabled(await replica_allowed(checked)):
+        return await paginated(request, queryset, ProductInfoSerializer)
+
+
+@csrf_exempt
+async def order(request):
+    """GET обслуживается асинхронно, остальные методы — синхронным ``OrderView``."""
+    if request.method != 'GET':
+        return await sync_to_async(OrderView.as_view())(request)
+
+    checked = await sync_to_async(check_request)(
+        request, throttle_classes=(ScopedSlidingWindowThrottle,), throttle_scope='user')
+    if isinstance(checked, HttpResponse):
+        return checked
+    if not checked.user.is_authenticated:
+        return render({'Status': False, 'Error': 'Log in required'}, status=403)
+
+    queryset = Order.objects.filter(
+        user_id=checked.user.id
+    ).exclude(state='basket').prefetch_related(
+        'ordered_items__product_info__product__category',
+        'ordered_items__product_info__product_parameters__parameter'
+    ).select_related('contact').annotate(
+        total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))
+    ).distinct()
+    with replica_reads_enabled(await replica_allowed(checked)):
+        orders = [order async for order in queryset]
+
+        # Архив читается только по явному запросу ?archive=true, как в OrderView.get.
+        archived = []
+        if with_archive(checked):
+            archived = [order async for order in ArchivedOrder.objects.filter(
+                user_id=checked.user.id).select_related('contact')]
+        return render(order_history(orders, archived))
+
+
+@csrf_exempt
+@require_POST
+async def seller_update(request):
+    checked = await sync_to_async(check_request)(request, permission_classes=(IsAuthenticated, IsShopUser))
+    if isinstance(checked, HttpResponse):
+        return checked
+
+    url = checked.data.get('url')
+    if not url:
+        return render({'Status': False, 'Errors': 'Отсутствуют обязательные аргументы'})
+    try:
+        URLValidator()(url)
+    except ValidationError as e:
+        return render({'Status': False, 'Error': str(e)})
+
+    # Скачивание в пуле потоков asyncio: медленный сервер магазина не блокирует
+    # общий поток, в котором под ASGI выполняются синхронные представления.
+    data = await asyncio.to_thread(load_catalog, url)
+    await sync_to_async(import_catalog)(checked.user.id, data)
+    return render({'Status': True})
@@ -0,0 +1,181 @@
+"""
+Аутентификация по токену с кэшированием и подписанные токены.
+
+Пара (пользователь, токен) ищется сначала в LRU-кэше процесса, затем в общем
+кэше Django и только при промахе — в БД. Записи в общем кэше удаляются при
+удалении токена и при любом сохранении пользователя (смена пароля, ``is_active``).
+Локальный кэш других процессов так не очистить, поэтому его записи живут не
+дольше ``AUTH_TOKEN_LOCAL_TTL`` секунд. Кэширование включается настройкой
+``AUTH_TOKEN_CACHE_ENABLED`` (по умолчанию — только при общем кэше), без неё
+токен каждый раз проверяется по БД, как в ``TokenAuthentication``.
+
+Подписанные токены (заголовок ``Authorization: Bearer ...``) содержат id
+пользователя, тип (``a`` — доступ, ``r`` — обновление), срок действия, id токена
+и отпечаток хеша пароля. Подпись проверяется без обращения к БД, пользователь
+берется из общего кэша. Смена пароля делает недействительными все токены
+пользователя, отдельные токены отзываются через список отозванных id в кэше,
+записи которого живут до истечения срока токена. Отзыв должен быть виден всем
+процессам, поэтому подписанные токены работают только при
+``SIGNED_TOKENS_ENABLED`` (по умолчанию — при общем кэше).
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import User
+
+AUTH_TOKEN_CACHE_KEY = 'auth_token:{key}'
+AUTH_USER_CACHE_KEY = 'auth_user:{user_id}'
+REVOKED_TOKEN_CACHE_KEY = 'revoked_token:{jti}'
+SIGNED_TOKEN_SALT = 'api.authentication.signed-token'
+ACCESS_TOKEN = 'a'
+REFRESH_TOKEN = 'r'
+
+
+class LocalTokenCache:
+    """Потокобезопасный LRU-кэш с ограниченным временем жизни записей."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` с локальным и общим кэшем."""
+
+    local_cache = LocalTokenCache(settings.AUTH_TOKEN_LOCAL_SIZE)
+    counters = {'local_hits': 0, 'cache_hits': 0, 'misses': 0}
+
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE_ENABLED:
+            return super().authenticate_credentials(key)
+
+        credentials = self.local_cache.get(key)
+        if credentials is not None:
+            self.counters['local_hits'] += 1
+            return credentials
+
+        credentials = cache.get(AUTH_TOKEN_CACHE_KEY.format(key=key))
+        if credentials is not None:
+            self.counters['cache_hits'] += 1
+        else:
+            self.counters['misses'] += 1
+            credentials = super().authenticate_credentials(key)
+            cache.set(AUTH_TOKEN_CACHE_KEY.format(key=key), credentials, settings.AUTH_TOKEN_CACHE_TTL)
+
+        self.local_cache.set(key, credentials, settings.AUTH_TOKEN_LOCAL_TTL)
+        return credentials
+
+    @classmethod
+    def invalidate(cls, *keys):
+        """Удаляет токены из кэша текущего процесса и общего кэша."""
+        for key in keys:
+            cls.local_cache.delete(key)
+        cache.delete_many([AUTH_TOKEN_CACHE_KEY.format(key=key) for key in keys])
+
+    @classmethod
+    def stats(cls):
+        total = sum(cls.counters.values())
+        hits = cls.counters['local_hits'] + cls.counters['cache_hits']
+        return {**cls.counters, 'hit_rate': round(hits / total, 4) if total else 0}
+
+
+def password_fingerprint(user):
+    return salted_hmac(SIGNED_TOKEN_SALT, user.password).hexdigest()[:8]
+
+
+def issue_signed_token(user, token_type=ACCESS_TOKEN):
+    """Выпускает подписанный токен доступа или обновления."""
+    ttl = settings.SIGNED_TOKEN_ACCESS_TTL if token_type == ACCESS_TOKEN else settings.SIGNED_TOKEN_REFRESH_TTL
+    claims = {
+        'u': user.pk,
+        't': token_type,
+        'e': int(time.time()) + ttl,
+        'j': secrets.token_urlsafe(6),
+        'p': password_fingerprint(user),
+    }
+    return signing.dumps(claims, salt=SIGNED_TOKEN_SALT, compress=True)
+
+
+def get_cached_user(user_id):
+    """Пользователь из общего кэша, при промахе — из БД."""
+    user = cache.get(AUTH_USER_CACHE_KEY.format(user_id=user_id))
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(AUTH_USER_CACHE_KEY.format(user_id=user_id), user, settings.AUTH_TOKEN_CACHE_TTL)
+    return user
+
+
+def read_signed_token(token, token_type=ACCESS_TOKEN):
+    """Проверяет подписанный токен, возвращает пользователя и содержимое токена."""
+    if not settings.SIGNED_TOKENS_ENABLED:
+        raise AuthenticationFailed('Signed tokens are disabled.')
+    try:
+        claims = signing.loads(token, salt=SIGNED_TOKEN_SALT)
+    except signing.BadSignature:
+        raise AuthenticationFailed('Invalid token.')
+    if claims.get('t') != token_type:
+        raise AuthenticationFailed('Invalid token.')
+    if claims['e'] < time.time():
+        raise AuthenticationFailed('Token expired.')
+    if cache.get(REVOKED_TOKEN_CACHE_KEY.format(jti=claims['j'])):
+        raise AuthenticationFailed('Token revoked.')
+
+    user = get_cached_user(claims['u'])
+    if user is None or password_fingerprint(user) != claims['p']:
+        raise AuthenticationFailed('Invalid token.')
+    if not user.is_active:
+        raise AuthenticationFailed('User inactive or deleted.')
+    return user, claims
+
+
+def revoke_signed_token(claims):
+    """Заносит токен в список отозванных до окончания его срока действия."""
+    cache.set(REVOKED_TOKEN_CACHE_KEY.format(jti=claims['j']), True, max(int(claims['e'] - time.time()), 1))
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по подписанному токену доступа без запросов к БД."""
+
+    keyword = 'Bearer'
+
+    def authenticate_credentials(self, key):
+        user, claims = read_signed_token(key, ACCESS_TOKEN)
+        return user, claims
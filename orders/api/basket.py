@@ -0,0 +1,289 @@
+"""
+Корзина покупателя в кэше с отложенной записью в БД.
+
+Включается настройкой ``BASKET_CACHE_ENABLED``. Пока режим включен, ``BasketView``
+читает и изменяет корзину только в кэше Django (``default``), а таблицы
+``Order``/``OrderItem`` догоняют её фоновым потоком.
+
+Гарантии согласованности:
+
+* Для корзины пользователя источником истины является запись в кэше. Запись
+  создаётся из БД при первом обращении, ``Order`` со статусом ``basket``
+  создаётся тогда же, поэтому ``id`` корзины известен клиенту сразу.
+* Позиции адресуются ``id`` строки ``OrderItem``, как и без кэша. Чтобы ``id``
+  был известен сразу, добавление товаров пишет корзину в БД синхронно;
+  изменение количества и удаление идут только в кэш.
+* БД отстаёт от кэша не более чем на ``BASKET_FLUSH_DELAY`` секунд в пределах
+  процесса, несколько изменений за это время сливаются в одну запись.
+* Перед оформлением заказа (``OrderView.post``) корзина сбрасывается в БД
+  синхронно, после оформления запись в кэше удаляется.
+* Изменения корзины одного пользователя из разных процессов применяются по
+  правилу «последняя запись побеждает».
+* Позиции пишутся только в заказ, который все еще является корзиной. Если
+  запись в кэше ссылается на уже оформленный заказ (сброс опоздал к
+  оформлению), она удаляется без записи в БД.
+* Если кэш потерял запись до сброса, несохранённые изменения теряются, поэтому
+  ``BASKET_CACHE_TIMEOUT`` должен быть много больше ``BASKET_FLUSH_DELAY``.
+* Цены и остатки в кэше — снимок на момент добавления товара. При оформлении
+  заказа используются актуальные цены из БД.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from rest_framework import serializers
+
+from .models import Order, OrderItem, ProductInfo
+from .serializers import ProductInfoSerializer
+
+BASKET_CACHE_KEY = 'basket:{user_id}'
+
+logger = logging.getLogger(__name__)
+
+
+class CachedBasket:
+    """Корзина пользователя, хранящаяся в кэше."""
+
+    def __init__(self, user_id, order_id, items=None, dt=None):
+        self.user_id = user_id
+        self.order_id = order_id
+        # {id информации о продукте: {'id': id позиции, 'quantity': ..., 'product_info': сериализованный товар}}
+        self.items = items or {}
+        # Дата создания корзины в представлении ``OrderSerializer``.
+        self.dt = dt
+
+    @staticmethod
+    def cache_key(user_id):
+        return BASKET_CACHE_KEY.format(user_id=user_id)
+
+    @classmethod
+    def load(cls, user_id):
+        """Загрузка корзины из кэша, при промахе — из БД."""
+        data = cache.get(cls.cache_key(user_id))
+        if data is not None:
+            return cls(user_id, data['order_id'], data['items'], data['dt'])
+
+        order, _ = Order.objects.get_or_create(user_id=user_id, state='basket')
+        order_items = OrderItem.objects.filter(order_id=order.id).select_related(
+            'product_info__product__category'
+        ).prefetch_related('product_info__product_parameters__parameter')
+        items = {
+            order_item.product_info_id: {
+                'id': order_item.id,
+                'quantity': order_item.quantity,
+                'product_info': ProductInfoSerializer(order_item.product_info).data,
+            }
+            for order_item in order_items
+        }
+        basket = cls(user_id, order.id, items, serializers.DateTimeField().to_representation(order.dt))
+        basket.save(persist=False)
+        return basket
+
+    @classmethod
+    def discard(cls, user_id):
+        cache.delete(cls.cache_key(user_id))
+
+    def save(self, persist=True):
+        """Сохранение в кэш и постановка в очередь на запись в БД."""
+        cache.set(self.cache_key(self.user_id),
+                  {'order_id': self.order_id, 'items': self.items, 'dt': self.dt},
+                  settings.BASKET_CACHE_TIMEOUT)
+        if persist:
+            writer.schedule(self.user_id)
+
+    def add(self, items):
+        """
+        Добавление позиций ``[{'product_info': id, 'quantity': n}, ...]``.
+        Возвращает число добавленных позиций или текст ошибки.
+
+        Корзина вместе с новыми позициями сразу пишется в БД: клиент получает
+        ``id`` строк ``OrderItem``, которыми затем адресует позиции.
+        """
+        quantities = {}
+        for item in items:
+            if type(item.get('product_info')) != int or type(item.get('quantity')) != int \
+                    or item['quantity'] <= 0:
+                return 'Неверный формат запроса'
+            if item['product_info'] in self.items or item['product_info'] in quantities:
+                return f'Товар {item["product_info"]} уже есть в корзине'
+            quantities[item['product_info']] = item['quantity']
+
+        # Товары прежних версий каталога магазина в корзину не добавляются.
+        product_infos = ProductInfo.objects.filter(
+            id__in=quantities, version=F('shop__catalog_version')
+        ).select_related('product__category').prefetch_related('product_parameters__parameter')
+        product_infos = {product_info.id: product_info for product_info in product_infos}
+        missing = set(quantities) - set(product_infos)
+        if missing:
+            return f'Товары не найдены: {sorted(missing)}'
+
+        with transaction.atomic():
+            # Сначала догоняем в БД прежние изменения (в том числе удаления тех же товаров).
+            if not self.persist():
+                return 'Корзина уже оформлена, повторите запрос'
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(order_id=self.order_id, product_info_id=product_info_id, quantity=quantity)
+                for product_info_id, quantity in quantities.items()
+            ])
+
+        for order_item in order_items:
+            self.items[order_item.product_info_id] = {
+                'id': order_item.id,
+                'quantity': order_item.quantity,
+                'product_info': ProductInfoSerializer(product_infos[order_item.product_info_id]).data,
+            }
+        return len(order_items)
+
+    def update(self, items):
+        """
+        Изменение количества, возвращает список обновлённых позиций и словарь
+        ``{id: причина}`` для отклонённых.
+        """
+        basket_items = {basket_item['id']: basket_item for basket_item in self.items.values()}
+        updated = []
+        errors = {}
+        for item in items:
+            if type(item.get('id')) != int:
+                continue
+            basket_item = basket_items.get(item['id'])
+            if type(item.get('quantity')) != int or item['quantity'] <= 0:
+                errors[item['id']] = 'Неверное количество'
+            elif basket_item is None:
+                errors[item['id']] = 'Позиция не найдена'
+            elif item['quantity'] > basket_item['product_info']['quantity']:
+                errors[item['id']] = 'Недостаточно товара'
+            else:
+                basket_item['quantity'] = item['quantity']
+                updated.append(item['id'])
+        return sorted(updated), errors
+
+    def remove(self, ids):
+        """Удаление позиций по ``id``, возвращает их количество."""
+        ids = set(ids)
+        removed = [product_info_id for product_info_id, item in self.items.items() if item['id'] in ids]
+        for product_info_id in removed:
+            del self.items[product_info_id]
+        return len(removed)
+
+    def to_representation(self):
+        """Представление в формате ``OrderSerializer``."""
+        ordered_items = [
+            {'id': item['id'], 'product_info': item['product_info'], 'quantity': item['quantity']}
+            for item in self.items.values()
+        ]
+        total_sum = sum(item['quantity'] * item['product_info']['price'] for item in self.items.values())
+        return [{'id': self.order_id,
+                 'ordered_items': ordered_items,
+                 'state': 'basket',
+                 'dt': self.dt,
+                 'total_sum': total_sum or None,
+                 'contact': None}]
+
+    def persist(self):
+        """
+        Синхронная запись корзины в таблицы ``Order``/``OrderItem``. Если заказ
+        уже оформлен (запись в кэше устарела), позиции не пишутся, запись
+        удаляется из кэша и возвращается ``False``.
+        """
+        quantities = {product_info_id: item['quantity'] for product_info_id, item in self.items.items()}
+        with transaction.atomic():
+            # Блокировка строки заказа не дает оформлению пройти между проверкой и записью.
+            if not Order.objects.select_for_update().filter(
+                    id=self.order_id, user_id=self.user_id, state='basket').exists():
+                self.discard_stale()
+                return False
+
+            order_items = OrderItem.objects.select_for_update().filter(order_id=self.order_id)
+            existing = {order_item.product_info_id: order_item for order_item in order_items}
+
+            removed = [order_item.id for product_info_id, order_item in existing.items()
+                       if product_info_id not in quantities]
+            if removed:
+                OrderItem.objects.filter(id__in=removed).delete()
+
+            changed = []
+            for product_info_id, quantity in quantities.items():
+                order_item = existing.get(product_info_id)
+                if order_item and order_item.quantity != quantity:
+                    order_item.quantity = quantity
+                    changed.append(order_item)
+            if changed:
+                OrderItem.objects.bulk_update(changed, ['quantity'])
+
+            OrderItem.objects.bulk_create([
+                OrderItem(order_id=self.order_id, product_info_id=product_info_id, quantity=quantity)
+                for product_info_id, quantity in quantities.items() if product_info_id not in existing
+            ])
+        return True
+
+    def discard_stale(self):
+        """Удаляет запись из кэша, если она все еще относится к этому заказу."""
+        data = cache.get(self.cache_key(self.user_id))
+        if data is not None and data['order_id'] == self.order_id:
+            cache.delete(self.cache_key(self.user_id))
+            logger.warning('Корзина пользователя %s в кэше относится к оформленному заказу %s и удалена',
+                           self.user_id, self.order_id)
+
+
+def flush_basket(user_id):
+    """Сброс корзины пользователя из кэша в БД, если она есть в кэше."""
+    data = cache.get(CachedBasket.cache_key(user_id))
+    if data is not None:
+        return CachedBasket(user_id, data['order_id'], data['items']).persist()
+    return False
+
+
+class BasketWriter:
+    """
+    Фоновый поток отложенной записи корзин.
+
+    Собирает пользователей, изменивших корзину, и раз в ``BASKET_FLUSH_DELAY``
+    секунд записывает их корзины в БД. При нулевой задержке запись синхронная.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def schedule(self, user_id):
+        if settings.BASKET_FLUSH_DELAY <= 0:
+            flush_basket(user_id)
+            return
+        with self._lock:
+            self._pending.add(user_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='basket-writer', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def flush(self):
+        """Запись всех ожидающих корзин в текущем потоке."""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for user_id in pending:
+            try:
+                flush_basket(user_id)
+            except Exception:
+                logger.exception('Не удалось записать корзину пользователя %s', user_id)
+                with self._lock:
+                    self._pending.add(user_id)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            time.sleep(settings.BASKET_FLUSH_DELAY)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+writer = BasketWriter()
@@ -0,0 +1,149 @@
+"""
+Выполнение нескольких запросов к API за один HTTP-запрос.
+
+Каждая операция ``{"method": "GET", "path": "user/details", "params": {...},
+"body": {...}, "headers": {...}}`` выполняется существующим представлением в
+этом же процессе, без повторного прохода через middleware. Тело передается
+представлению как данные формы — так же, как от обычного клиента: строки и числа
+становятся строками, списки и объекты — строками JSON (например, ``items``
+корзины). Исключение в представлении дает операции ответ 500, остальные
+операции выполняются как обычно. Пользователь
+аутентифицируется один раз — по внешнему запросу — и передается операциям через
+принудительную аутентификацию DRF. Ограничения частоты и права доступа
+представлений действуют для каждой операции как обычно.
+
+При ``atomic`` все операции выполняются в одной транзакции: на первой
+неуспешной операции (код ответа от 400 или ``"Status": false``) выполнение
+прекращается и изменения откатываются.
+"""
+import io
+import json
+import logging
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve, reverse
+
+from .idempotency import response_data
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Заголовки внешнего запроса, которые не должны попадать в операции.
+SKIPPED_HEADERS = ('HTTP_CONTENT_LENGTH', 'HTTP_CONTENT_TYPE', 'HTTP_IDEMPOTENCY_KEY')
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(ValueError):
+    """Неверное описание операции."""
+
+
+def api_prefix():
+    return reverse('api:batch')[:-len('batch')]
+
+
+def form_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def encode_body(body):
+    """Тело операции в виде данных формы, которые представления получают от клиентов."""
+    return urlencode({name: form_value(value) for name, value in (body or {}).items() if value is not None}).encode()
+
+
+def build_request(request, method, path, params=None, body=None, headers=None):
+    """Запрос Django для операции с окружением внешнего запроса."""
+    data = encode_body(body)
+    environ = {key: value for key, value in request.META.items()
+               if isinstance(value, str) and key not in SKIPPED_HEADERS}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(params or {}, doseq=True),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(data)),
+        'wsgi.input': io.BytesIO(data),
+        'wsgi.url_scheme': request.scheme,
+    })
+    for name, value in (headers or {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    sub_request = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        # DRF подставляет этого пользователя вместо повторной аутентификации.
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def parse_operation(operation):
+    if not isinstance(operation, dict) or not isinstance(operation.get('path'), str):
+        raise BatchError('Неверный формат операции')
+    method = str(operation.get('method', 'GET')).upper()
+    if method not in BATCH_METHODS:
+        raise BatchError(f'Метод {method} не поддерживается')
+    for field in ('params', 'body', 'headers'):
+        if operation.get(field) is not None and not isinstance(operation[field], dict):
+            raise BatchError(f'Поле {field} должно быть объектом')
+    return method, operation['path'].lstrip('/'), operation.get('params'), operation.get('body'), \
+        operation.get('headers')
+
+
+def execute(request, operation):
+    """Выполняет операцию, возвращает ``{'status': код, 'body': данные ответа}``."""
+    try:
+        method, path, params, body, headers = parse_operation(operation)
+    except BatchError as error:
+        return {'status': 400, 'body': {'Status': False, 'Errors': str(error)}}
+
+    full_path = api_prefix() + path
+    try:
+        match = resolve(full_path)
+    except Resolver404:
+        match = None
+    if match is None or match.namespace != 'api' or match.url_name == 'batch':
+        return {'status': 404, 'body': {'Status': False, 'Errors': f'Маршрут {path} не найден'}}
+
+    sub_request = build_request(request, method, full_path, params, body, headers)
+    sub_request.resolver_match = match
+    view = match.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+    try:
+        response = view(sub_request, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception('Операция %s %s завершилась исключением', method, path)
+        return {'status': 500, 'body': {'Status': False, 'Errors': 'Внутренняя ошибка сервера'}}
+    try:
+        data = response_data(response)
+    except ValueError:
+        data = response.content.decode(response.charset)
+    return {'status': response.status_code, 'body': data}
+
+
+def failed(result):
+    return result['status'] >= 400 or isinstance(result['body'], dict) and result['body'].get('Status') is False
+
+
+def execute_batch(request, operations, atomic=False):
+    """
+    Выполняет операции по порядку. Возвращает результаты и номер операции,
+    на которой транзакция была отменена (``None``, если не отменялась).
+    """
+    if not atomic:
+        return [execute(request, operation) for operation in operations], None
+
+    results = []
+    with transaction.atomic():
+        for number, operation in enumerate(operations):
+            results.append(execute(request, operation))
+            if failed(results[-1]):
+                transaction.set_rollback(True)
+                return results, number
+    return results, None
@@ -0,0 +1,355 @@
+"""
+Синтетические данные и сценарии нагрузки для сквозного тестирования API.
+
+``seed`` создает пользователей, магазины, категории, товары с параметрами и
+заказы пакетными вставками и возвращает описание набора (токены покупателей и
+магазинов, диапазон ``id`` товаров), которое команда ``seed_bench_data``
+сохраняет в файл для ``bench_api``. Все созданные пользователи получают адреса
+в домене ``BENCH_EMAIL_DOMAIN``, названия справочников — префикс ``BENCH_PREFIX``,
+поэтому ``clear`` удаляет набор, не затрагивая остальные данные.
+
+Сценарии (``WORKLOADS``) — последовательности запросов одного клиента: каждый
+шаг возвращает метку маршрута, код ответа и время. Сводка по меткам — число
+запросов, ошибок, ответов 429 и процентили задержки. Маршруты, которые сценарии
+намеренно не вызывают, перечислены в ``EXCLUDED_ROUTES``.
+
+Описание набора содержит действующие токены, поэтому по умолчанию хранится во
+временном каталоге (``DEFAULT_DATA_FILE``), а не в рабочем.
+"""
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from itertools import islice
+
+import requests
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .models import User, Contact, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, \
+    Order, OrderItem, OutgoingEmail
+
+BENCH_EMAIL_DOMAIN = 'bench.local'
+BENCH_PREFIX = 'bench-'
+DEFAULT_DATA_FILE = os.path.join(tempfile.gettempdir(), 'bench_data.json')
+ORDER_STATES = ('new', 'confirmed', 'assembled', 'sent', 'delivered', 'canceled')
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def latency_summary(latencies):
+    """Задержки в миллисекундах: среднее и процентили."""
+    latencies = [latency * 1000 for latency in latencies]
+    if not latencies:
+        return {'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    return {
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def create_users(count, kind, password_hash, batch_size):
+    """Пользователи с токенами, возвращает список ``(id, токен)``."""
+    created = []
+    for numbers in chunks(range(count), batch_size):
+        users = User.objects.bulk_create([
+            User(email=f'{kind}{number}@{BENCH_EMAIL_DOMAIN}', password=password_hash, is_active=True,
+                 type='shop' if kind == 'shop' else 'buyer', first_name=kind, last_name=str(number))
+            for number in numbers
+        ])
+        tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+        created += [(user.id, token.key) for user, token in zip(users, tokens)]
+    return created
+
+
+def seed(users=1000, shops=20, categories=50, products=100000, offers=2, parameters=5,
+         orders=20000, items=3, password='bench-password', batch_size=5000, seed_value=0, log=None):
+    """Создает набор данных и возвращает его описание."""
+    rng = random.Random(seed_value)
+    log = log or (lambda message: None)
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        buyers = create_users(users, 'buyer', password_hash, batch_size)
+        contacts = Contact.objects.bulk_create([
+            Contact(user_id=user_id, city='Москва', street=f'Улица {user_id}', phone='+70000000000')
+            for user_id, _ in buyers
+        ], batch_size=batch_size)
+        shop_users = create_users(shops, 'shop', password_hash, batch_size)
+        shop_objects = Shop.objects.bulk_create([
+            Shop(name=f'{BENCH_PREFIX}{number}', user_id=user_id)
+            for number, (user_id, _) in enumerate(shop_users)
+        ])
+        category_objects = Category.objects.bulk_create([
+            Category(name=f'{BENCH_PREFIX}{number}') for number in range(categories)
+        ])
+        Category.shops.through.objects.bulk_create([
+            Category.shops.through(category_id=category.id, shop_id=shop.id)
+            for category in category_objects for shop in shop_objects
+        ], batch_size=batch_size)
+        parameter_objects = Parameter.objects.bulk_create([
+            Parameter(name=f'{BENCH_PREFIX}{number}') for number in range(parameters)
+        ])
+    log(f'Пользователей: {len(buyers)}, магазинов: {len(shop_objects)}, категорий: {len(category_objects)}')
+
+    # Товары вставляются порциями в отдельных транзакциях, чтобы не держать в памяти весь каталог.
+    product_info_ids = []
+    for numbers in chunks(range(products), max(batch_size // max(offers, 1), 1)):
+        with transaction.atomic():
+            product_objects = Product.objects.bulk_create([
+                Product(name=f'{BENCH_PREFIX}{number}', category=rng.choice(category_objects))
+                for number in numbers
+            ])
+            infos = ProductInfo.objects.bulk_create([
+                ProductInfo(product_id=product.id, shop=shop, external_id=product.id, model=f'm{product.id % 100}',
+                            quantity=rng.randint(10, 1000), price=(price := rng.randint(100, 100000)),
+                            price_rrc=price + price // 10)
+                for product in product_objects for shop in rng.sample(shop_objects, min(offers, len(shop_objects)))
+            ])
+            ProductParameter.objects.bulk_create([
+                ProductParameter(product_info_id=info.id, parameter_id=parameter.id, value=str(rng.randint(1, 100)))
+                for info in infos for parameter in parameter_objects
+            ], batch_size=batch_size)
+        product_info_ids += [info.id for info in infos]
+        log(f'Товаров: {len(product_info_ids)}')
+
+    # Заказы создаются без сигналов: после заполнения нужен rebuild_sales_rollups.
+    for numbers in chunks(range(orders), max(batch_size // max(items, 1), 1)):
+        with transaction.atomic():
+            order_objects = Order.objects.bulk_create([
+                Order(user_id=buyers[number % len(buyers)][0], contact=contacts[number % len(contacts)],
+                      state=rng.choice(ORDER_STATES))
+                for number in numbers
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order_id=order.id, product_info_id=product_info_id, quantity=rng.randint(1, 5))
+                for order in order_objects
+                for product_info_id in rng.sample(product_info_ids, min(items, len(product_info_ids)))
+            ])
+        log(f'Заказов: {numbers[-1] + 1}')
+
+    return {
+        'password': password,
+        'buyers': [{'email': f'buyer{number}@{BENCH_EMAIL_DOMAIN}', 'token': token, 'contact': contact.id}
+                   for number, ((_, token), contact) in enumerate(zip(buyers, contacts))],
+        'shops': [{'email': f'shop{number}@{BENCH_EMAIL_DOMAIN}', 'token': token}
+                  for number, (_, token) in enumerate(shop_users)],
+        'shop_ids': [shop.id for shop in shop_objects],
+        'category_ids': [category.id for category in category_objects],
+        'product_info_ids': [min(product_info_ids), max(product_info_ids)] if product_info_ids else None,
+    }
+
+
+def clear():
+    """Удаляет набор данных, созданный ``seed``."""
+    with transaction.atomic():
+        # Вместе с пользователями удаляются их магазины, товары магазинов и заказы.
+        deleted = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()[0]
+        deleted += Product.objects.filter(name__startswith=BENCH_PREFIX).delete()[0]
+        deleted += Category.objects.filter(name__startswith=BENCH_PREFIX).delete()[0]
+        deleted += Parameter.objects.filter(name__startswith=BENCH_PREFIX).delete()[0]
+        # Письма подтверждения пользователям, зарегистрированным сценарием register.
+        deleted += OutgoingEmail.objects.filter(to__icontains=f'@{BENCH_EMAIL_DOMAIN}').delete()[0]
+    return deleted
+
+
+class Client:
+    """HTTP-клиент сценария: один пользователь, одна сессия, замеры по меткам маршрутов."""
+
+    def __init__(self, base_url, data, rng):
+        self.base_url = base_url
+        self.data = data
+        self.rng = rng
+        self.session = requests.Session()
+        self.samples = []
+
+    def call(self, label, method, path, token=None, **kwargs):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, headers=headers, timeout=30, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, None
+        self.samples.append((label, status, time.perf_counter() - started))
+        return response
+
+    def buyer(self):
+        return self.rng.choice(self.data['buyers'])
+
+    def shop(self):
+        return self.rng.choice(self.data['shops'])
+
+    def product_info_id(self):
+        return self.rng.randint(*self.data['product_info_ids'])
+
+
+def browse(client):
+    client.call('GET categories', 'GET', 'categories')
+    client.call('GET shops', 'GET', 'shops')
+    client.call('GET products/', 'GET', 'products/', params={'page': client.rng.randint(1, 50)})
+    client.call('GET products/<id>/', 'GET', f'products/{client.product_info_id()}/')
+
+
+def search(client):
+    client.call('GET products/?filter', 'GET', 'products/', params={
+        'shop_id': client.rng.choice(client.data['shop_ids']),
+        'product__category_id': client.rng.choice(client.data['category_ids']),
+    })
+
+
+def account(client):
+    buyer = client.buyer()
+    client.call('POST user/login', 'POST', 'user/login',
+                data={'email': buyer['email'], 'password': client.data['password']})
+    client.call('GET user/details', 'GET', 'user/details', token=buyer['token'])
+    client.call('GET user/contact', 'GET', 'user/contact', token=buyer['token'])
+    client.call('GET order', 'GET', 'order', token=buyer['token'])
+    client.call('POST batch', 'POST', 'batch', token=buyer['token'], json={'requests': [
+        {'method': 'GET', 'path': 'user/details'},
+        {'method': 'GET', 'path': 'basket'},
+    ]})
+
+
+def contacts(client):
+    buyer = client.buyer()
+    client.call('POST user/contact', 'POST', 'user/contact', token=buyer['token'],
+                data={'city': 'Москва', 'street': f'{BENCH_PREFIX}улица', 'house': '1', 'phone': '+70000000000'})
+    response = client.call('GET user/contact', 'GET', 'user/contact', token=buyer['token'])
+    # Контакт из набора нужен для оформления заказов: меняются и удаляются только добавленные.
+    added = [contact['id'] for contact in (response.json() if response is not None and response.ok else [])
+             if contact['id'] != buyer['contact']]
+    if added:
+        client.call('PUT user/contact', 'PUT', 'user/contact', token=buyer['token'],
+                    data={'id': str(added[0]), 'house': '2'})
+        client.call('DELETE user/contact', 'DELETE', 'user/contact', token=buyer['token'],
+                    data={'items': ','.join(map(str, added))})
+
+
+def tokens(client):
+    buyer = client.buyer()
+    response = client.call('POST user/login (signed)', 'POST', 'user/login',
+                           data={'email': buyer['email'], 'password': client.data['password'],
+                                 'token_type': 'signed'})
+    signed = response.json() if response is not None and response.ok else {}
+    if 'Refresh' in signed:
+        client.call('POST user/token/refresh', 'POST', 'user/token/refresh', data={'refresh': signed['Refresh']})
+        client.call('POST user/token/revoke', 'POST', 'user/token/revoke', data={'token': signed['Access']})
+    client.call('POST user/password_reset', 'POST', 'user/password_reset', data={'email': buyer['email']})
+
+
+def register(client):
+    # Адрес в домене набора: пользователя и письмо подтверждения удаляет clear.
+    client.call('POST user/register', 'POST', 'user/register', data={
+        'first_name': 'bench', 'last_name': 'bench', 'email': f'registered-{uuid.uuid4().hex}@{BENCH_EMAIL_DOMAIN}',
+        'password': client.data['password'], 'company': 'bench', 'position': 'bench',
+    })
+
+
+def basket(client):
+    token = client.buyer()['token']
+    product_info_id = client.product_info_id()
+    client.call('POST basket', 'POST', 'basket', token=token,
+                data={'items': json.dumps([{'product_info': product_info_id, 'quantity': 1}])})
+    response = client.call('GET basket', 'GET', 'basket', token=token)
+    item_ids = [item['id'] for order in (response.json() if response is not None and response.ok else [])
+                for item in order['ordered_items']]
+    if item_ids:
+        client.call('PUT basket', 'PUT', 'basket', token=token,
+                    data={'items': json.dumps([{'id': item_ids[0], 'quantity': 2}])})
+        client.call('DELETE basket', 'DELETE', 'basket', token=token,
+                    data={'items': ','.join(map(str, item_ids))})
+
+
+def checkout(client):
+    buyer = client.buyer()
+    client.call('POST basket', 'POST', 'basket', token=buyer['token'],
+                data={'items': json.dumps([{'product_info': client.product_info_id(), 'quantity': 1}])})
+    response = client.call('GET basket', 'GET', 'basket', token=buyer['token'])
+    orders = response.json() if response is not None and response.ok else []
+    if orders:
+        client.call('POST order', 'POST', 'order', token=buyer['token'],
+                    data={'id': str(orders[0]['id']), 'contact': buyer['contact']})
+
+
+def partner(client):
+    token = client.shop()['token']
+    client.call('GET partner/orders', 'GET', 'partner/orders', token=token)
+    client.call('GET partner/analytics', 'GET', 'partner/analytics', token=token,
+                params={'date_from': '2000-01-01', 'date_to': '2100-01-01', 'period': 'month'})
+    client.call('GET seller/state', 'GET', 'seller/state', token=token)
+    # Статус не меняется, но запрос проходит весь путь записи и сброса кэша магазина.
+    client.call('POST seller/state', 'POST', 'seller/state', token=token, data={'state': 'on'})
+
+
+WORKLOADS = {
+    'browse': browse,
+    'search': search,
+    'account': account,
+    'basket': basket,
+    'checkout': checkout,
+    'partner': partner,
+    'contacts': contacts,
+    'tokens': tokens,
+    'register': register,
+}
+
+DEFAULT_MIX = {'browse': 45, 'search': 20, 'account': 10, 'basket': 10, 'checkout': 5, 'partner': 5,
+               'contacts': 2, 'tokens': 2, 'register': 1}
+
+# Маршруты api/urls.py, которые сценарии не вызывают, и причины.
+EXCLUDED_ROUTES = {
+    'user/register/confirm': 'токен подтверждения приходит только в письме',
+    'user/password_reset/confirm': 'токен сброса приходит только в письме',
+    'seller/update': 'скачивает файл каталога по внешнему адресу и заменяет каталог магазина',
+    'partner/webhook': 'send_webhooks начнет доставлять события на указанный адрес',
+    'metrics, auth/cache-stats': 'только для сотрудников, в наборе их нет',
+}
+
+
+def parse_mix(value):
+    """``browse=50,search=20`` -> ``{'browse': 50, 'search': 20}``."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in WORKLOADS:
+            raise ValueError(f'Неизвестный сценарий: {name}')
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def report(samples, seconds):
+    """Сводка замеров ``[(метка, код ответа, секунды), ...]`` по меткам маршрутов."""
+    routes = {}
+    for label, status, elapsed in samples:
+        route = routes.setdefault(label, {'latencies': [], 'errors': 0, 'throttled': 0})
+        route['latencies'].append(elapsed)
+        route['throttled'] += status == 429
+        route['errors'] += status is None or (status >= 400 and status != 429)
+    return {
+        'requests': len(samples),
+        'seconds': round(seconds, 3),
+        'rps': round(len(samples) / seconds, 1) if seconds else None,
+        'routes': {
+            label: {'requests': len(route['latencies']), 'errors': route['errors'],
+                    'throttled': route['throttled'], **latency_summary(route['latencies'])}
+            for label, route in sorted(routes.items())
+        },
+    }
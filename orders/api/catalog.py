@@ -0,0 +1,134 @@
+"""
+Загрузка и импорт каталога магазина из YAML-файла.
+
+Товары нового файла записываются отдельной версией каталога (``ProductInfo.version``),
+которую покупатели не видят, пока ``publish_catalog`` одним UPDATE не переключит на
+нее ``Shop.catalog_version``. До переключения читатели получают прежний каталог
+целиком, после — новый целиком. Предыдущие версии удаляет
+``manage.py gc_catalog_versions``.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+
+from . import history, object_cache
+from .metrics import registry
+from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, OrderItem
+
+
+def load_catalog(url):
+    """Скачивает и разбирает YAML-файл каталога."""
+    # HTTP-клиент и YAML нужны только здесь и заметно замедляют запуск воркера.
+    import requests
+    from yaml import load as load_yaml, Loader
+
+    stream = requests.get(url, timeout=settings.CATALOG_DOWNLOAD_TIMEOUT).content
+    return load_yaml(stream, Loader=Loader)
+
+
+def stage_catalog(shop, goods):
+    """
+    Записывает товары новой неопубликованной версии каталога магазина, возвращает ее номер.
+    Версия записывается целиком или не записывается вовсе.
+    """
+    with transaction.atomic():
+        # Строка магазина заблокирована до конца записи: параллельный импорт того же
+        # магазина ждет и получает следующий номер, а не тот же самый.
+        catalog_version = Shop.objects.select_for_update().values_list('catalog_version', flat=True).get(id=shop.id)
+        latest = ProductInfo.objects.filter(shop_id=shop.id).aggregate(version=Max('version'))['version'] or 0
+        version = max(latest, catalog_version) + 1
+        write_version(shop, goods, version)
+    return version
+
+
+def write_version(shop, goods, version):
+    """Товары и их параметры версии ``version`` каталога магазина."""
+    product_infos = []
+    for item in goods:
+        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
+        product_infos.append(ProductInfo(product_id=product.id,
+                                         external_id=item['id'],
+                                         model=item['model'],
+                                         price=item['price'],
+                                         price_rrc=item['price_rrc'],
+                                         quantity=item['quantity'],
+                                         shop_id=shop.id,
+                                         version=version))
+    ProductInfo.objects.bulk_create(product_infos, batch_size=500)
+
+    parameter_ids, product_parameters = {}, []
+    for product_info, item in zip(product_infos, goods):
+        for name, value in item['parameters'].items():
+            if name not in parameter_ids:
+                parameter_ids[name] = Parameter.objects.get_or_create(name=name)[0].id
+            product_parameters.append(ProductParameter(product_info_id=product_info.id,
+                                                       parameter_id=parameter_ids[name],
+                                                       value=value))
+    ProductParameter.objects.bulk_create(product_parameters, batch_size=500)
+
+
+def publish_catalog(shop_id, version):
+    """
+    Делает версию каталога видимой покупателям. Версия старее опубликованной
+    (параллельный импорт успел раньше) не публикуется, возвращается ``False``.
+    """
+    published = bool(Shop.objects.filter(id=shop_id, catalog_version__lt=version).update(catalog_version=version))
+    if published:
+        # Карточки товаров прежней версии перестают отдаваться вместе со сбросом записи магазина.
+        object_cache.invalidate(object_cache.SHOP, shop_id)
+    return published
+
+
+def collect_garbage(batch_size=500):
+    """
+    Удаляет товары версий старее опубликованной пачками по ``batch_size``.
+    Товары, на которые ссылаются позиции заказов (в том числе корзин), остаются:
+    история заказов и корзины покупателей не теряют позиций. Возвращает число
+    удаленных товаров.
+    """
+    superseded = ProductInfo.objects.filter(version__lt=F('shop__catalog_version')).exclude(
+        id__in=OrderItem.objects.values('product_info_id'))
+    deleted = 0
+    while True:
+        ids = list(superseded.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        ProductInfo.objects.filter(id__in=ids).delete()
+        object_cache.invalidate(object_cache.PRODUCT_INFO, *ids)
+        deleted += len(ids)
+
+
+def import_catalog(user_id, data):
+    """Заменяет каталог магазина пользователя данными из файла."""
+    started = time.perf_counter()
+
+    # Если у пользователя нет магазина, то он создает
+    if not Shop.objects.filter(user_id=user_id).exists():
+        shop = Shop.objects.create(name=data['shop'], user_id=user_id)
+    else:
+        shop = Shop.objects.get(user_id=user_id)
+
+    # Обновление названия; версия каталога меняется только в publish_catalog
+    shop.name = data['shop']
+    shop.save(update_fields=['name'])
+
+    for category in data['categories']:
+        if not Category.objects.filter(id=category['id']).exists():
+            category_object = Category.objects.create(id=category['id'], name=category['name'])
+        else:
+            category_object = Category.objects.get(id=category['id'])
+
+        category_object.shops.add(shop.id)
+        category_object.save()
+
+    # В историю попадают только изменения цен и остатков относительно прошлого импорта.
+    history.record(shop.id, data['goods'])
+    version = stage_catalog(shop, data['goods'])
+    if publish_catalog(shop.id, version):
+        shop.catalog_version = version
+
+    registry.inc('catalog_import_items_total', value=len(data['goods']))
+    registry.observe('catalog_import_duration_seconds', (), time.perf_counter() - started)
+    return shop
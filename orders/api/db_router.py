@@ -0,0 +1,78 @@
+"""
+Маршрутизация чтения на реплики БД.
+
+Чтение уходит на реплики из ``DATABASE_REPLICAS`` только внутри представлений с
+``ReplicaReadMixin`` (каталог и история заказов) и их асинхронных версий (блок
+``replica_reads_enabled``), все остальные запросы и любая запись идут в
+``default``. После изменяющего запроса пользователь на ``REPLICA_STICKY_SECONDS``
+«прилипает» к основной БД, чтобы видеть свои изменения, пока реплика догоняет.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+STICKY_CACHE_KEY = 'db_sticky:{user_id}'
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+def mark_sticky(user):
+    cache.set(STICKY_CACHE_KEY.format(user_id=user.pk), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user):
+    return bool(user and user.is_authenticated and cache.get(STICKY_CACHE_KEY.format(user_id=user.pk)))
+
+
+async def ais_sticky(user):
+    return bool(user and user.is_authenticated and await cache.aget(STICKY_CACHE_KEY.format(user_id=user.pk)))
+
+
+@contextmanager
+def replica_reads_enabled(enabled=True):
+    """Разрешает чтение с реплик внутри блока; для представлений без ``ReplicaReadMixin``."""
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение — на случайную реплику, если разрешено, запись и миграции — в ``default``."""
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and replica_reads.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+    """Разрешает чтение с реплик для методов ``replica_methods`` представления DRF."""
+
+    replica_methods = ('GET', 'HEAD')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in self.replica_methods and not is_sticky(request.user):
+            self._replica_token = replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            replica_reads.reset(token)
+            self._replica_token = None
+        return response
@@ -0,0 +1,35 @@
+"""
+Общие средства очередей доставки: писем (``OutgoingEmail``) и уведомлений
+магазинов (``WebhookEvent``).
+
+Запись очереди готова к отправке, когда наступил её ``send_after``. Забранные
+обработчиком записи арендуются сдвигом ``send_after``, чтобы их не взял
+параллельный обработчик; при ошибке запись откладывается с экспоненциальной
+задержкой, ``attempts`` и ``last_error`` хранят число попыток и текст последней
+ошибки.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+
+def claim(queryset, batch_size, lease):
+    """Арендует до ``batch_size`` готовых записей ``queryset`` на ``lease`` секунд, возвращает их ``id``."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(queryset.select_for_update(skip_locked=True).filter(
+            send_after__lte=now
+        ).order_by('send_after').values_list('id', flat=True)[:batch_size])
+        queryset.model.objects.filter(id__in=ids).update(send_after=now + timedelta(seconds=lease))
+    return ids
+
+
+def retry_later(records, error, retry_delay):
+    """Откладывает записи на ``retry_delay * 2 ** (attempts - 1)`` секунд после очередной неудачи."""
+    now = timezone.now()
+    for record in records:
+        record.attempts += 1
+        record.last_error = str(error)
+        record.send_after = now + timedelta(seconds=retry_delay * 2 ** (record.attempts - 1))
+    type(records[0]).objects.bulk_update(records, ['attempts', 'last_error', 'send_after'])
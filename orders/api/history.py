@@ -0,0 +1,121 @@
+"""
+История цен и остатков товаров магазинов.
+
+При импорте каталога ``record`` сравнивает цену и количество каждого товара с
+последней точкой его истории и дописывает точку только при изменении. Точки
+товара (пара магазин — внешний ИД) хранятся чанками ``PriceHistoryChunk`` по
+``PRICE_HISTORY_CHUNK_SIZE`` точек: каждая точка — три разности с предыдущей
+(секунды, цена, количество), закодированные zigzag-varint. Время записывается с
+точностью до секунды, типичная точка занимает 4–8 байт, так что миллион точек —
+единицы мегабайт вместе с накладными расходами строк.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PriceHistoryChunk
+
+
+def encode_varint(value, out):
+    """Дописывает целое со знаком (zigzag) в ``out``."""
+    value = (value << 1) ^ (value >> 63)
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data):
+    """Целые со знаком из последовательности zigzag-varint."""
+    result, shift, value = [], 0, 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        result.append((value >> 1) ^ -(value & 1))
+        shift = value = 0
+    return result
+
+
+def epoch(moment):
+    return int(moment.timestamp())
+
+
+def append_point(chunk, moment, price, quantity):
+    """Дописывает точку в чанк (без сохранения)."""
+    data = bytearray(chunk.data or b'')
+    if chunk.count:
+        encode_varint(epoch(moment) - epoch(chunk.last_at), data)
+        encode_varint(price - chunk.last_price, data)
+        encode_varint(quantity - chunk.last_quantity, data)
+    else:
+        # Первая точка чанка хранится относительно first_at и нулевых цены и количества.
+        chunk.first_at = moment
+        encode_varint(0, data)
+        encode_varint(price, data)
+        encode_varint(quantity, data)
+    chunk.data = bytes(data)
+    chunk.last_at, chunk.last_price, chunk.last_quantity = moment, price, quantity
+    chunk.count += 1
+
+
+def decode_chunk(chunk):
+    """Точки чанка: ``[(момент, цена, количество), ...]``."""
+    values = decode_varints(bytes(chunk.data))
+    points, timestamp, price, quantity = [], epoch(chunk.first_at), 0, 0
+    for index in range(0, len(values), 3):
+        timestamp += values[index]
+        price += values[index + 1]
+        quantity += values[index + 2]
+        points.append((datetime.fromtimestamp(timestamp, dt_timezone.utc), price, quantity))
+    return points
+
+
+def record(shop_id, goods, moment=None):
+    """
+    Дописывает изменившиеся цены и остатки товаров из файла каталога.
+    Возвращает количество записанных точек.
+    """
+    moment = moment or timezone.now()
+    with transaction.atomic():
+        open_chunks = {chunk.external_id: chunk for chunk in PriceHistoryChunk.objects.select_for_update().filter(
+            shop_id=shop_id, closed=False)}
+        changed, created, points = {}, {}, 0
+        for item in goods:
+            chunk = open_chunks.get(item['id'])
+            if chunk is not None and chunk.last_price == item['price'] and chunk.last_quantity == item['quantity']:
+                continue
+            if chunk is not None and chunk.count >= settings.PRICE_HISTORY_CHUNK_SIZE:
+                # Заполненный чанк закрывается, точка начинает новый.
+                chunk.closed = True
+                changed[item['id']] = chunk
+                chunk = None
+            if chunk is None:
+                chunk = open_chunks[item['id']] = created[item['id']] = PriceHistoryChunk(
+                    shop_id=shop_id, external_id=item['id'], data=b'')
+            elif item['id'] not in created:
+                changed[item['id']] = chunk
+            append_point(chunk, moment, item['price'], item['quantity'])
+            points += 1
+
+        # Сначала закрываются старые чанки, затем создаются новые открытые.
+        PriceHistoryChunk.objects.bulk_update(
+            list(changed.values()), ['last_at', 'last_price', 'last_quantity', 'count', 'closed', 'data'],
+            batch_size=500)
+        PriceHistoryChunk.objects.bulk_create(list(created.values()), batch_size=500)
+    return points
+
+
+def price_series(shop_id, external_id, date_from=None, date_to=None):
+    """История товара за период: ``[{'at': ..., 'price': ..., 'quantity': ...}, ...]``."""
+    chunks = PriceHistoryChunk.objects.filter(shop_id=shop_id, external_id=external_id).order_by('first_at')
+    if date_from:
+        chunks = chunks.filter(last_at__gte=date_from)
+    if date_to:
+        chunks = chunks.filter(first_at__lte=date_to)
+    return [{'at': moment, 'price': price, 'quantity': quantity}
+            for chunk in chunks for moment, price, quantity in decode_chunk(chunk)
+            if (not date_from or moment >= date_from) and (not date_to or moment <= date_to)]
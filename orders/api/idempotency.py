@@ -0,0 +1,111 @@
+"""
+Поддержка заголовка ``Idempotency-Key`` для изменяющих запросов.
+
+Первый запрос с ключом выполняется и его ответ сохраняется в ``IdempotencyKey``.
+Повтор с тем же ключом и телом получает сохраненный ответ без повторного
+выполнения, с тем же ключом и другим телом — ошибку 422. Пока первый запрос
+выполняется, повторы получают 409. Если ответ не записан за ``IDEMPOTENCY_LEASE``
+секунд (воркер упал посреди запроса), повтор забирает ключ и выполняет запрос
+заново. Запрос и запись его ответа выполняются в одной транзакции. Записи
+живут ``IDEMPOTENCY_KEY_TTL`` секунд и удаляются командой
+``manage.py purge_idempotency_keys``.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def response_data(response):
+    if hasattr(response, 'data'):
+        return response.data
+    return json.loads(response.content or 'null')
+
+
+def idempotent(method):
+    """Декоратор метода ``APIView``, включающий обработку ``Idempotency-Key``."""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return JsonResponse({'Status': False,
+                                 'Errors': f'Слишком длинный {IDEMPOTENCY_HEADER}'}, status=400)
+
+        fingerprint = request_fingerprint(request)
+        expired_before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        IdempotencyKey.objects.filter(user_id=request.user.id, key=key, created_at__lt=expired_before).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user_id=request.user.id, key=key, fingerprint=fingerprint)
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user_id=request.user.id, key=key).first()
+            if record is None or record.fingerprint != fingerprint:
+                return JsonResponse({'Status': False,
+                                     'Errors': f'{IDEMPOTENCY_HEADER} уже использован для другого запроса'},
+                                    status=422)
+            if record.status_code is not None:
+                return JsonResponse(record.response, status=record.status_code, safe=False)
+            if not take_over(record):
+                return JsonResponse({'Status': False,
+                                     'Errors': 'Запрос с этим ключом еще выполняется'}, status=409)
+
+        # Изменения запроса и запись ответа фиксируются одной транзакцией:
+        # при сбое между ними не остается ни того, ни другого.
+        try:
+            with transaction.atomic():
+                response = method(self, request, *args, **kwargs)
+                if response.status_code < 500 and not IdempotencyKey.objects.filter(
+                        id=record.id, started_at=record.started_at).update(
+                        status_code=response.status_code, response=response_data(response)):
+                    # Ключ успел забрать повтор: запрос выполняет он, наши изменения откатываются.
+                    transaction.set_rollback(True)
+                    return JsonResponse({'Status': False,
+                                         'Errors': 'Запрос с этим ключом еще выполняется'}, status=409)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+        return response
+
+    return wrapper
+
+
+def take_over(record):
+    """Забирает ключ незавершенного запроса, если его выполнение длится дольше ``IDEMPOTENCY_LEASE``."""
+    now = timezone.now()
+    if record.started_at > now - timedelta(seconds=settings.IDEMPOTENCY_LEASE):
+        return False
+    taken = IdempotencyKey.objects.filter(id=record.id, status_code__isnull=True,
+                                          started_at=record.started_at).update(started_at=now)
+    record.started_at = now
+    return bool(taken)
+
+
+def purge_expired(batch_size=1000):
+    """Удаляет просроченные ключи пачками, возвращает их количество."""
+    expired_before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    total = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(created_at__lt=expired_before).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,122 @@
+"""
+Поиск запросов, выполняющихся без подходящих индексов.
+
+Запросы берутся из файла ``SQL_CAPTURE_FILE``, который пишет
+``QueryInstrumentationMiddleware`` во время нагрузочного теста, или
+перехватываются во время выполнения команды (``advise_indexes --run``). Каждый
+уникальный запрос выполняется с ``EXPLAIN`` (SQLite — ``EXPLAIN QUERY PLAN``,
+PostgreSQL — ``EXPLAIN``). Полные просмотры таблиц и сортировки без индекса
+группируются по таблицам вместе с колонками из условий запросов — кандидатами
+в индекс.
+"""
+import json
+import re
+from collections import Counter
+
+from django.db import connections, DatabaseError
+
+from .middleware import query_fingerprint
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+FULL_SCAN = {
+    'sqlite': re.compile(r'^SCAN (\w+)$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+TEMP_SORT = {
+    'sqlite': re.compile(r'^USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)'),
+    'postgresql': re.compile(r'^\s*(?:->\s*)?Sort\b'),
+}
+TABLE_ALIAS = re.compile(r'"(\w+)" (?:AS )?([A-Z]\d+)\b')
+# Сравнение или логическая колонка без оператора (``WHERE "api_shop"."state"``).
+CONDITION = re.compile(r'(?:"(\w+)"|\b([A-Z]\d+))\."(\w+)"'
+                       r'(?:\s*(?:=|IN\b|<|>|IS\b)|(?=\s+(?:AND|OR|ORDER|GROUP|LIMIT)\b|\)|$))')
+
+
+def load_capture(paths):
+    """Уникальные запросы из файлов захвата: ``{отпечаток: [sql, параметры, выполнений]}``."""
+    queries = {}
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                entry = queries.setdefault(query_fingerprint(record['sql']), [record['sql'], record['params'], 0])
+                entry[2] += record['count']
+    return queries
+
+
+def from_stats(stats):
+    """Уникальные запросы, перехваченные ``QueryStats``."""
+    return {fingerprint: [sql, params, stats.fingerprints[fingerprint]]
+            for fingerprint, (sql, params) in stats.samples.items()}
+
+
+def explain(sql, params, using='default'):
+    """Строки плана выполнения запроса."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def condition_columns(sql):
+    """Колонки из условий запроса по таблицам: ``{таблица: {колонка, ...}}``."""
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    # Условия соединений (ON) тоже указывают на колонки, по которым ищутся строки.
+    joins = ' '.join(part.split(' WHERE ')[0] for part in sql.split(' ON ')[1:])
+    columns = {}
+    for table, alias, column in CONDITION.findall(where + ' ' + joins):
+        columns.setdefault(table or aliases.get(alias, alias), set()).add(column)
+    return columns
+
+
+def analyze(queries, using='default'):
+    """
+    План каждого запроса. Возвращает отчет по таблицам с полными просмотрами
+    и число запросов, которые не удалось разобрать.
+    """
+    vendor = connections[using].vendor
+    full_scan, temp_sort = FULL_SCAN.get(vendor), TEMP_SORT.get(vendor)
+    if full_scan is None:
+        raise ValueError(f'EXPLAIN не поддерживается для {vendor}')
+
+    tables, sorts, skipped = {}, [], 0
+    for sql, params, count in queries.values():
+        if params is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+            continue
+        try:
+            plan = explain(sql, params, using)
+        except (DatabaseError, TypeError, ValueError):
+            skipped += 1
+            continue
+
+        aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+        columns = condition_columns(sql)
+        for line in plan:
+            match = full_scan.search(line)
+            if match and not match.group(1).startswith('subquery'):
+                table = aliases.get(match.group(1), match.group(1))
+                report = tables.setdefault(table, {'queries': 0, 'executions': 0, 'columns': Counter(),
+                                                   'examples': []})
+                report['queries'] += 1
+                report['executions'] += count
+                report['columns'].update({column: count for column in columns.get(table, ())})
+                if len(report['examples']) < 3:
+                    report['examples'].append(sql)
+            elif temp_sort.search(line):
+                sorts.append({'sql': sql, 'executions': count, 'plan': line.strip()})
+
+    return {
+        'full_scans': {
+            table: {**report, 'columns': dict(report['columns'].most_common())}
+            for table, report in sorted(tables.items(), key=lambda item: -item[1]['executions'])
+        },
+        'temp_sorts': sorted(sorts, key=lambda sort: -sort['executions']),
+        'skipped': skipped,
+    }
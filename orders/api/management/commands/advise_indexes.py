@@ -0,0 +1,59 @@
+import json
+import shlex
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.index_advisor import load_capture, from_stats, analyze
+from api.middleware import QueryStats
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов из файла захвата (SQL_CAPTURE_FILE, пишется во время '
+            'нагрузочного теста) или из запуска команды (--run) и сообщает о полных просмотрах таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capture', action='append', help='Файл захвата, можно указать несколько раз')
+        parser.add_argument('--run', help='Команда manage.py с аргументами, запросы которой нужно проверить')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--json', action='store_true', help='Вывести отчет в JSON')
+
+    def handle(self, *args, **options):
+        if options['run']:
+            stats = QueryStats()
+            name, *arguments = shlex.split(options['run'])
+            with connections[options['database']].execute_wrapper(stats):
+                call_command(name, *arguments, stdout=self.stderr)
+            queries = from_stats(stats)
+        else:
+            paths = options['capture'] or ([settings.SQL_CAPTURE_FILE] if settings.SQL_CAPTURE_FILE else [])
+            if not paths:
+                raise CommandError('Укажите --capture, --run или настройку SQL_CAPTURE_FILE')
+            try:
+                queries = load_capture(paths)
+            except OSError as error:
+                raise CommandError(str(error))
+
+        try:
+            report = analyze(queries, options['database'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f'Уникальных запросов: {len(queries)}, не удалось разобрать: {report["skipped"]}')
+        for table, table_report in report['full_scans'].items():
+            columns = ', '.join(f'{column} ({count})' for column, count in table_report['columns'].items())
+            self.stdout.write(f'\nПолный просмотр {table}: запросов {table_report["queries"]}, '
+                              f'выполнений {table_report["executions"]}')
+            self.stdout.write(f'  колонки в условиях: {columns or "нет"}')
+            for sql in table_report['examples']:
+                self.stdout.write(f'  {sql[:300]}')
+        if report['temp_sorts']:
+            self.stdout.write(f'\nСортировок без индекса: {len(report["temp_sorts"])}')
+            for sort in report['temp_sorts'][:10]:
+                self.stdout.write(f'  {sort["executions"]:6}  {sort["plan"]}: {sort["sql"][:200]}')
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Переносит завершенные заказы старше заданного срока в архив. Запускается периодически (cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help='Возраст заказа в днях, после которого он переносится в архив')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество заказов, переносимых за одну транзакцию')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = archive_orders(before, options['batch_size'])
+        self.stdout.write(f'Перенесено в архив заказов: {archived}')
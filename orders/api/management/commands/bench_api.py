@@ -0,0 +1,67 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import WORKLOADS, DEFAULT_MIX, DEFAULT_DATA_FILE, EXCLUDED_ROUTES, Client, parse_mix, report
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера смешанными сценариями (просмотр, поиск, '
+            'учетная запись, корзина, оформление заказа, кабинет магазина, контакты, подписанные '
+            'токены, регистрация) на данных seed_bench_data. Ответы 429 учитываются отдельно: '
+            'для замеров ослабьте DEFAULT_THROTTLE_RATES. Не вызываются: '
+            + '; '.join(f'{route} — {reason}' for route, reason in EXCLUDED_ROUTES.items()) + '.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/v1/')
+        parser.add_argument('--data', default=DEFAULT_DATA_FILE, help='Файл, созданный seed_bench_data')
+        parser.add_argument('--mix', help='Веса сценариев, например browse=50,search=20,basket=10 '
+                                          f'(по умолчанию {",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items())})')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=1000, help='Всего выполнений сценариев')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['data']) as file:
+                data = json.load(file)
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {options["data"]}: {error}')
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        names = list(mix)
+        plan = random.Random(options['seed']).choices(names, weights=[mix[name] for name in names],
+                                                      k=options['iterations'])
+        local = threading.local()
+        clients = []
+        lock = threading.Lock()
+
+        def run(number):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client(options['base_url'], data, random.Random(options['seed'] + number))
+                with lock:
+                    clients.append(client)
+            WORKLOADS[plan[number]](client)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(run, range(options['iterations'])))
+        seconds = time.perf_counter() - started
+
+        result = report([sample for client in clients for sample in client.samples], seconds)
+        result = {'concurrency': options['concurrency'], 'iterations': options['iterations'],
+                  'mix': {name: plan.count(name) for name in names}, **result}
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,62 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import AUTH_USER_CACHE_KEY, CachedTokenAuthentication, SignedTokenAuthentication, \
+    issue_signed_token
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стоимость TokenAuthentication, CachedTokenAuthentication и '
+            'SignedTokenAuthentication. Тестовый пользователь создается в откатываемой транзакции, '
+            'из общего кэша удаляются только его записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = APIRequestFactory()
+
+        with transaction.atomic():
+            user = User.objects.create_user(email='bench-auth@example.com', password=None, is_active=True)
+            token = Token.objects.create(user=user)
+            headers = {
+                TokenAuthentication: f'Token {token.key}',
+                CachedTokenAuthentication: f'Token {token.key}',
+                SignedTokenAuthentication: f'Bearer {issue_signed_token(user)}',
+            }
+            try:
+                # Кэш токенов и подписанные токены замеряются и там, где они выключены
+                # из-за отсутствия общего кэша.
+                with override_settings(AUTH_TOKEN_CACHE_ENABLED=True, SIGNED_TOKENS_ENABLED=True):
+                    for auth_class, header in headers.items():
+                        self.forget(user, token)
+                        self.measure(factory, auth_class, header, iterations)
+            finally:
+                self.forget(user, token)
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def forget(user, token):
+        """Удаляет из кэшей записи тестового пользователя; общий кэш хранит корзины и лимиты."""
+        CachedTokenAuthentication.invalidate(token.key)
+        cache.delete(AUTH_USER_CACHE_KEY.format(user_id=user.pk))
+
+    def measure(self, factory, auth_class, header, iterations):
+        authentication = auth_class()
+        request = factory.get('/', HTTP_AUTHORIZATION=header)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                authentication.authenticate(request)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{auth_class.__name__}: {elapsed / iterations * 1e6:.1f} мкс/запрос, '
+                          f'запросов к БД: {len(queries.captured_queries) / iterations:.3f} на вызов')
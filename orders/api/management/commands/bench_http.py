@@ -0,0 +1,59 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from api.benchmark import latency_summary
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера: GET-запросы к путям API с заданной '
+            'конкурентностью. Позволяет сравнить запуск под WSGI и ASGI.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/v1/')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Путь относительно --base-url, можно указать несколько раз')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000, help='Всего запросов')
+        parser.add_argument('--token', help='Токен для заголовка Authorization: Token ...')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['categories', 'shops', 'products/']
+        headers = {'Authorization': f'Token {options["token"]}'} if options['token'] else {}
+        local = threading.local()
+        results = {path: {'latencies': [], 'errors': 0} for path in paths}
+        lock = threading.Lock()
+
+        def call(number):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            path = paths[number % len(paths)]
+            started = time.perf_counter()
+            try:
+                ok = session.get(options['base_url'] + path, headers=headers, timeout=30).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                results[path]['latencies'].append(elapsed)
+                results[path]['errors'] += not ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(call, range(options['requests'])))
+        total = time.perf_counter() - started
+
+        report = {'concurrency': options['concurrency'], 'requests': options['requests'],
+                  'seconds': round(total, 3), 'rps': round(options['requests'] / total, 1), 'paths': {}}
+        for path, result in results.items():
+            report['paths'][path] = {
+                'requests': len(result['latencies']),
+                'errors': result['errors'],
+                **latency_summary(result['latencies']),
+            }
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest, HttpResponse
+from django.urls import resolve
+
+from api.metrics import Registry
+from api import middleware
+
+
+class Command(BaseCommand):
+    help = ('Измеряет затраты сбора метрик на один запрос и завершается с ошибкой, '
+            'если они превышают METRICS_OVERHEAD_BUDGET.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        request = HttpRequest()
+        request.method = 'GET'
+        request.path = '/api/v1/products/'
+        request.resolver_match = resolve(request.path)
+        request.query_stats = middleware.QueryStats()
+        response = HttpResponse()
+
+        original, middleware.registry = middleware.registry, Registry()
+        try:
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                middleware.observe_request(request, response, 0.01)
+            per_request = (time.perf_counter() - started) / options['iterations']
+        finally:
+            middleware.registry = original
+
+        budget = settings.METRICS_OVERHEAD_BUDGET
+        self.stdout.write(f'Затраты на запрос: {per_request * 1e6:.2f} мкс, бюджет: {budget * 1e6:.2f} мкс')
+        if per_request > budget:
+            raise CommandError('Затраты на сбор метрик превышают бюджет')
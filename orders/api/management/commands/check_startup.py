@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Загрузка приложения так же, как при первом запросе воркера: настройки, приложения, URLconf.
+BOOT_CODE = 'import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns'
+
+
+def parse_importtime(output):
+    """Строки ``-X importtime`` -> ``[(модуль, глубина, собственное, суммарное время в мкс)]``."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, cumulative, name = line.split('|')
+        rows.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2,
+                     int(head.split(':')[1]), int(cumulative)))
+    return rows
+
+
+def importers(rows):
+    """Модуль -> модуль, из которого он был импортирован впервые."""
+    result = {}
+    # Вывод importtime — обход дерева в обратном порядке: родитель печатается после детей.
+    for index, (name, depth, _, _) in enumerate(rows):
+        for parent, parent_depth, _, _ in rows[index + 1:]:
+            if parent_depth < depth:
+                result[name] = parent
+                break
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Измеряет время загрузки приложения (python -X importtime) и завершается с ошибкой, '
+            'если оно превышает STARTUP_IMPORT_BUDGET или модули api импортируют при запуске '
+            'зависимости из STARTUP_LAZY_IMPORTS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Запусков, берется лучший результат')
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых долгих модулей вывести')
+
+    def boot(self):
+        environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                               'orders.settings')}
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT_CODE],
+                                 capture_output=True, text=True, env=environment, cwd=settings.BASE_DIR)
+        if process.returncode:
+            raise CommandError(f'Приложение не загрузилось:\n{process.stderr[-2000:]}')
+        return parse_importtime(process.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self.boot() for _ in range(options['runs'])]
+        rows = min(runs, key=lambda run: sum(cumulative for _, depth, _, cumulative in run if depth == 0))
+        total = sum(cumulative for _, depth, _, cumulative in rows if depth == 0) / 1e6
+
+        self.stdout.write(f'Время импорта: {total * 1000:.1f} мс, бюджет: {settings.STARTUP_IMPORT_BUDGET * 1000:.0f} мс')
+        for name, _, _, cumulative in sorted(rows, key=lambda row: row[3], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} мс  {name}')
+
+        parents = importers(rows)
+        eager = sorted(f'{name} (из {parents[name]})' for name in settings.STARTUP_LAZY_IMPORTS
+                       if parents.get(name, '').split('.')[0] == 'api')
+        if eager:
+            raise CommandError(f'Модули api загружают при запуске: {", ".join(eager)}')
+        if total > settings.STARTUP_IMPORT_BUDGET:
+            raise CommandError('Время загрузки приложения превышает бюджет')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.catalog import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет товары замененных версий каталогов магазинов. Запускается периодически (cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество товаров, удаляемых за один запрос')
+
+    def handle(self, *args, **options):
+        deleted = collect_garbage(options['batch_size'])
+        self.stdout.write(f'Удалено товаров прежних версий: {deleted}')
@@ -0,0 +1,52 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from api.history import append_point, decode_chunk
+from api.models import PriceHistoryChunk
+
+
+class Command(BaseCommand):
+    help = ('Объем истории цен и остатков: чанков, точек и байт на миллион точек. С --simulate '
+            'оценивает объем на синтетических данных без обращения к БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simulate', type=int, metavar='POINTS',
+                            help='Закодировать столько синтетических точек (ежедневные импорты)')
+
+    def handle(self, *args, **options):
+        if options['simulate']:
+            simulated = self.simulate(options['simulate'])
+            chunks, points = len(simulated), sum(chunk.count for chunk in simulated)
+            data_bytes = sum(len(chunk.data) for chunk in simulated)
+        else:
+            totals = PriceHistoryChunk.objects.aggregate(chunks=Count('id'), points=Sum('count'),
+                                                         data_bytes=Sum(Length('data')))
+            chunks, points, data_bytes = totals['chunks'], totals['points'] or 0, totals['data_bytes'] or 0
+
+        self.stdout.write(f'Чанков: {chunks}, точек: {points}, данных: {data_bytes} байт')
+        if points:
+            self.stdout.write(f'Байт на точку: {data_bytes / points:.2f}, '
+                              f'на миллион точек: {data_bytes / points:.2f} МБ без учета строк таблицы')
+
+    def simulate(self, count):
+        rng = random.Random(0)
+        chunks, points = [], 0
+        moment = timezone.now()
+        while points < count:
+            chunk = PriceHistoryChunk(data=b'')
+            price, quantity = rng.randint(100, 100000), rng.randint(0, 1000)
+            for day in range(min(settings.PRICE_HISTORY_CHUNK_SIZE, count - points)):
+                price = max(price + rng.randint(-price // 20, price // 20), 1)
+                quantity = max(quantity + rng.randint(-20, 20), 0)
+                append_point(chunk, moment + timedelta(days=day, seconds=rng.randint(0, 600)), price, quantity)
+            if decode_chunk(chunk)[-1][1:] != (price, quantity):
+                raise CommandError('Декодированная история не совпадает с записанной')
+            chunks.append(chunk)
+            points += chunk.count
+        return chunks
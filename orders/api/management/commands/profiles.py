@@ -0,0 +1,89 @@
+import io
+import os
+import pstats
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import list_profiles, profile_path, prune, sample_rate, set_sample_rate
+
+
+class Command(BaseCommand):
+    help = ('Профили запросов: list — список, show <имя> — функции одного профиля, '
+            'summary — сводка по маршрутам, rate [<доля>|default] — доля выборки, '
+            'clear — удалить все профили.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', default='list', choices=('list', 'show', 'summary', 'rate', 'clear'))
+        parser.add_argument('value', nargs='?', help='Имя профиля для show, доля для rate')
+        parser.add_argument('--route', help='Только профили этого маршрута')
+        parser.add_argument('--sort', default='cumulative', help='Порядок сортировки функций pstats')
+        parser.add_argument('--limit', type=int, default=20, help='Количество выводимых функций')
+
+    def handle(self, *args, **options):
+        getattr(self, f'handle_{options["action"]}')(options)
+
+    def profiles(self, options):
+        profiles = list_profiles()
+        if options['route']:
+            profiles = [meta for meta in profiles if meta['route'] == options['route']]
+        return profiles
+
+    def print_stats(self, paths, options):
+        output = io.StringIO()
+        stats = pstats.Stats(*paths, stream=output)
+        stats.sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue())
+
+    def handle_list(self, options):
+        for meta in self.profiles(options):
+            created = datetime.fromtimestamp(meta['created']).strftime('%Y-%m-%d %H:%M:%S')
+            self.stdout.write(f'{meta["name"]}  {created}  {meta["method"]} {meta["route"]}  '
+                              f'{meta["status"]}  {meta["duration_ms"]} мс  '
+                              f'запросов к БД: {meta["queries"]}  ({meta["reason"]})')
+
+    def handle_show(self, options):
+        if not options['value']:
+            raise CommandError('Укажите имя профиля')
+        path = profile_path(options['value'])
+        if not os.path.exists(path):
+            raise CommandError(f'Профиль {options["value"]} не найден')
+        self.print_stats([path], options)
+
+    def handle_summary(self, options):
+        routes = defaultdict(list)
+        for meta in self.profiles(options):
+            routes[(meta['method'], meta['route'])].append(meta)
+
+        for (method, route), profiles in sorted(routes.items()):
+            durations = sorted(meta['duration_ms'] for meta in profiles)
+            queries = [meta['queries'] for meta in profiles if meta['queries'] is not None]
+            self.stdout.write(f'{method} {route}: профилей {len(profiles)}, '
+                              f'медиана {durations[len(durations) // 2]} мс, максимум {durations[-1]} мс, '
+                              f'запросов к БД в среднем {sum(queries) / len(queries) if queries else "-"}')
+            if options['route']:
+                self.print_stats([profile_path(meta['name']) for meta in profiles], options)
+
+    def handle_rate(self, options):
+        value = options['value']
+        if value is not None:
+            if not settings.PROFILING_RATE_OVERRIDE_ENABLED:
+                raise CommandError('Долю можно менять только при общем кэше (REDIS_URL), '
+                                   'иначе задайте PROFILING_SAMPLE_RATE в настройках')
+            if value == 'default':
+                set_sample_rate(None)
+            else:
+                try:
+                    rate = float(value)
+                except ValueError:
+                    raise CommandError('Доля должна быть числом от 0 до 1')
+                if not 0 <= rate <= 1:
+                    raise CommandError('Доля должна быть числом от 0 до 1')
+                set_sample_rate(rate)
+        self.stdout.write(f'Доля профилируемых запросов: {sample_rate()} '
+                          f'(по умолчанию {settings.PROFILING_SAMPLE_RATE})')
+
+    def handle_clear(self, options):
+        self.stdout.write(f'Удалено профилей: {prune(0)}')
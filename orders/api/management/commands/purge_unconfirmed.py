@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import ConfirmEmailToken, Order, User
+
+
+def delete_in_batches(queryset, batch_size):
+    """Удаляет записи пачками по первичному ключу, возвращает их количество."""
+    total = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        queryset.model.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+
+
+class Command(BaseCommand):
+    help = ('Удаляет пользователей, не подтвердивших почту за UNCONFIRMED_USER_GRACE_DAYS, и просроченные '
+            'токены подтверждения. Неподтвержденным считается неактивный пользователь с токеном '
+            'подтверждения и без оформленных заказов. Запускается периодически (cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество записей, удаляемых за один запрос')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        grace = timezone.now() - timedelta(days=settings.UNCONFIRMED_USER_GRACE_DAYS)
+
+        # Токен удаляется при подтверждении, поэтому отключенные администратором
+        # пользователи токена не имеют и не удаляются.
+        users = User.objects.filter(
+            is_active=False, is_staff=False, date_joined__lt=grace,
+            id__in=ConfirmEmailToken.objects.values('user_id'),
+        ).exclude(id__in=Order.objects.exclude(state='basket').values('user_id'))
+        self.stdout.write(f'Удалено пользователей: {delete_in_batches(users, batch_size)}')
+
+        # Просроченные токены неподтвержденных пользователей хранятся до их удаления.
+        tokens = ConfirmEmailToken.objects.filter(created_at__lt=ConfirmEmailToken.expired_before()).filter(
+            Q(user__is_active=True) | Q(created_at__lt=grace))
+        self.stdout.write(f'Удалено токенов: {delete_in_batches(tokens, batch_size)}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает продажи по дням (SalesRollup) по всем оформленным и архивным заказам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пачки при чтении архива и записи результата')
+
+    def handle(self, *args, **options):
+        count = rebuild(options['batch_size'])
+        self.stdout.write(f'Записано строк продаж: {count}')
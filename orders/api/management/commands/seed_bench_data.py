@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.benchmark import DEFAULT_DATA_FILE, seed, clear
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическими данными для нагрузочного теста bench_api и сохраняет '
+            'токены пользователей и диапазоны id в файл. После заполнения выполните '
+            'rebuild_sales_rollups.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Покупателей')
+        parser.add_argument('--shops', type=int, default=20, help='Магазинов')
+        parser.add_argument('--categories', type=int, default=50, help='Категорий')
+        parser.add_argument('--products', type=int, default=100000, help='Продуктов')
+        parser.add_argument('--offers', type=int, default=2, help='Предложений магазинов на продукт')
+        parser.add_argument('--parameters', type=int, default=5, help='Параметров у каждого предложения')
+        parser.add_argument('--orders', type=int, default=20000, help='Заказов')
+        parser.add_argument('--items', type=int, default=3, help='Позиций в заказе')
+        parser.add_argument('--password', default='bench-password', help='Пароль всех пользователей')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Строк в одной вставке')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора случайных чисел')
+        parser.add_argument('--output', default=DEFAULT_DATA_FILE,
+                            help='Файл описания набора для bench_api (содержит токены пользователей)')
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее созданный набор и выйти')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Удалено объектов: {clear()}')
+            return
+
+        data = seed(users=options['users'], shops=options['shops'], categories=options['categories'],
+                    products=options['products'], offers=options['offers'], parameters=options['parameters'],
+                    orders=options['orders'], items=options['items'], password=options['password'],
+                    batch_size=options['batch_size'], seed_value=options['seed'], log=self.stdout.write)
+        with open(options['output'], 'w') as file:
+            json.dump(data, file, ensure_ascii=False)
+        self.stdout.write(f'Описание набора сохранено в {options["output"]}')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.outbox import OutboxSender
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди OutgoingEmail через постоянное SMTP-соединение.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Количество писем, забираемых из очереди за раз')
+        parser.add_argument('--group-size', type=int, default=None,
+                            help='Количество писем в одном вызове send_messages')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Ограничение скорости, писем в секунду (0 — без ограничения)')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Отправить все готовые письма и завершиться')
+
+    def handle(self, *args, **options):
+        with OutboxSender(group_size=options['group_size'], rate=options['rate']) as sender:
+            while True:
+                sent, failed = sender.send_pending(options['batch_size'])
+                if sent or failed:
+                    self.stdout.write(f'Отправлено писем: {sent}, с ошибкой: {failed}; {sender.metrics()}')
+                    continue
+                # Пока очередь пуста, соединение не держим, чтобы его не закрыл сервер.
+                sender.close()
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
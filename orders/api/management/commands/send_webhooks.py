@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.webhooks import WebhookSender
+
+
+class Command(BaseCommand):
+    help = 'Доставляет магазинам уведомления о заказах из очереди WebhookEvent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Количество событий, забираемых из очереди за раз')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Доставить все готовые события и завершиться')
+
+    def handle(self, *args, **options):
+        with WebhookSender() as sender:
+            while True:
+                delivered, failed = sender.send_pending(options['batch_size'])
+                if delivered or failed:
+                    self.stdout.write(f'Доставлено событий: {delivered}, с ошибкой: {failed}; {sender.stats}')
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
@@ -0,0 +1,86 @@
+import json
+import secrets
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, OperationalError
+from django.db.models import F, Max
+
+from api.catalog import import_catalog
+from api.models import Category, Parameter, ProductInfo, User
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочная проверка конкурентного доступа: импорт каталога во время чтения '
+            'списка товаров. Сравните результаты с SQLITE_TUNED=1 и без него. Магазин, категория, '
+            'товары и параметр проверки создаются с уникальной меткой и удаляются по окончании.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, default=2000, help='Товаров в импортируемом каталоге')
+        parser.add_argument('--readers', type=int, default=4, help='Потоков чтения')
+
+    def handle(self, *args, **options):
+        # Метка запуска отделяет данные проверки от рабочих и от прерванных прошлых запусков.
+        tag = f'stress-sqlite-{secrets.token_hex(4)}'
+        category_id = (Category.objects.aggregate(id=Max('id'))['id'] or 0) + 1
+        user = User.objects.create_user(email=f'{tag}@example.com', password=None, type='shop')
+        try:
+            import_seconds, latencies, errors = self.run(user, tag, category_id, options)
+        finally:
+            # Магазин, его товары и параметры удаляются вместе с пользователем.
+            user.delete()
+            Category.objects.filter(id=category_id, name=tag).delete()
+            Parameter.objects.filter(name=tag).delete()
+
+        latencies.sort()
+        report = {
+            'engine': connection.settings_dict['ENGINE'],
+            'import_seconds': round(import_seconds, 3),
+            'reads': len(latencies),
+            'read_errors': len(errors),
+            'read_p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+            'read_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+            'read_max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, user, tag, category_id, options):
+        data = {
+            'shop': tag,
+            'categories': [{'id': category_id, 'name': tag}],
+            'goods': [{'id': number, 'category': category_id, 'name': f'{tag}-{number % 100}', 'model': 'm',
+                       'price': 100, 'price_rrc': 120, 'quantity': 10, 'parameters': {tag: str(number)}}
+                      for number in range(options['goods'])],
+        }
+        latencies, errors = [], []
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def reader():
+            try:
+                while not done.is_set():
+                    started = time.perf_counter()
+                    try:
+                        list(ProductInfo.objects.filter(shop__state=True, version=F('shop__catalog_version'))
+                             .select_related('product')[:40])
+                    except OperationalError as error:
+                        with lock:
+                            errors.append(str(error))
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        started = time.perf_counter()
+        try:
+            import_catalog(user.id, data)
+        finally:
+            import_seconds = time.perf_counter() - started
+            done.set()
+            for thread in threads:
+                thread.join()
+        return import_seconds, latencies, errors
@@ -0,0 +1,263 @@
+"""
+Метрики сервиса в формате Prometheus.
+
+Каждый процесс копит счетчики и гистограммы в памяти (наблюдение — O(1): один
+поиск корзины и три сложения под блокировкой). Если задан ``METRICS_DIR``, процесс
+раз в ``METRICS_FLUSH_INTERVAL`` секунд записывает свой снимок в отдельный файл
+``metrics-<pid>-<метка>.json`` (атомарной заменой, у файла один писатель; метка
+отличает процесс, получивший PID завершившегося), а ``api/v1/metrics`` складывает
+снимки всех процессов. Без ``METRICS_DIR`` отдаются метрики только текущего процесса.
+
+При завершении процесс переносит свой снимок в общий ``metrics-retired.json``,
+чтобы счетчики не уменьшались и файлы не копились. Снимки процессов, убитых без
+завершения, переносятся туда же при сборке, если процесса с их PID нет, а файл
+не обновлялся ``METRICS_STALE_AFTER`` секунд. Поэтому ``METRICS_DIR`` должен быть
+общим только для процессов одного хоста (одного пространства PID).
+"""
+import atexit
+import fcntl
+import json
+import math
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Границы корзин гистограмм длительности, секунд.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+RETIRED_SNAPSHOT = 'metrics-retired.json'
+SNAPSHOT_NAME = re.compile(r'^metrics-(\d+)-[0-9a-f]+\.json$')
+
+DESCRIPTIONS = {
+    'http_requests_total': ('counter', 'Количество запросов по маршруту, методу и коду ответа'),
+    'http_request_duration_seconds': ('histogram', 'Полное время обработки запроса'),
+    'http_request_db_seconds': ('histogram', 'Время запросов к БД внутри обработки запроса'),
+    'http_request_app_seconds': ('histogram', 'Время обработки без БД (сериализация, логика)'),
+    'catalog_import_items_total': ('counter', 'Импортировано товаров из каталогов магазинов'),
+    'catalog_import_duration_seconds': ('histogram', 'Длительность импорта каталога'),
+    'object_cache_requests_total': ('counter', 'Чтения кэша объектов: попадание, ожидание пересчета, промах'),
+    'metrics_overhead_seconds': ('histogram', 'Собственные затраты сбора метрик на запрос'),
+}
+
+
+class Registry:
+    """Метрики одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed_at = time.monotonic()
+        self.retired = False
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][bisect_left(BUCKETS, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(buckets), total, count]
+                               for (name, labels), (buckets, total, count) in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """Записывает снимок процесса в ``METRICS_DIR`` не чаще ``METRICS_FLUSH_INTERVAL``."""
+        if not settings.METRICS_DIR or self.retired:
+            return
+        if not force and time.monotonic() - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed_at = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        write_snapshot(self.snapshot(), snapshot_path())
+
+    def retire(self):
+        """Переносит снимок завершающегося процесса в ``metrics-retired.json``."""
+        if not settings.METRICS_DIR or self.retired:
+            return
+        self.retired = True
+        path = snapshot_path()
+        if os.path.exists(path) or self.counters or self.histograms:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            write_snapshot(self.snapshot(), path)
+            with snapshots_lock():
+                retire_snapshots([path])
+
+
+registry = Registry()
+atexit.register(registry.retire)
+
+_snapshot_name = {'pid': None, 'name': None}
+
+
+def snapshot_path():
+    """Файл снимка текущего процесса; после ``fork`` у потомка новое имя."""
+    pid = os.getpid()
+    if _snapshot_name['pid'] != pid:
+        _snapshot_name.update(pid=pid, name=f'metrics-{pid}-{secrets.token_hex(4)}.json')
+    return os.path.join(settings.METRICS_DIR, _snapshot_name['name'])
+
+
+def write_snapshot(snapshot, path):
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temporary, path)
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def snapshots_lock():
+    """Блокировка каталога снимков: перенос в ``metrics-retired.json`` и чтение не пересекаются."""
+    with open(os.path.join(settings.METRICS_DIR, 'metrics.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def retire_snapshots(paths):
+    """Прибавляет снимки к ``metrics-retired.json`` и удаляет их файлы; вызывается под ``snapshots_lock``."""
+    retired_path = os.path.join(settings.METRICS_DIR, RETIRED_SNAPSHOT)
+    snapshots = [read_snapshot(path) for path in [retired_path] + list(paths)]
+    counters, histograms = merge([snapshot for snapshot in snapshots if snapshot is not None])
+    write_snapshot(to_snapshot(counters, histograms), retired_path)
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def is_stale(path):
+    """Снимок процесса, убитого без завершения: процесса с его PID нет, файл давно не обновлялся."""
+    match = SNAPSHOT_NAME.match(os.path.basename(path))
+    if match is None or process_alive(int(match.group(1))):
+        return False
+    try:
+        return time.time() - os.path.getmtime(path) > settings.METRICS_STALE_AFTER
+    except OSError:
+        return False
+
+
+def collect():
+    """Снимки всех процессов, у текущего — актуальное состояние из памяти."""
+    snapshots = [registry.snapshot()]
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return snapshots
+    own = os.path.basename(snapshot_path())
+    with snapshots_lock():
+        paths = [os.path.join(settings.METRICS_DIR, name) for name in os.listdir(settings.METRICS_DIR)
+                 if name != own and (name == RETIRED_SNAPSHOT or SNAPSHOT_NAME.match(name))]
+        stale = [path for path in paths if is_stale(path)]
+        if stale:
+            retire_snapshots(stale)
+            paths = [path for path in paths if path not in stale]
+            if os.path.join(settings.METRICS_DIR, RETIRED_SNAPSHOT) not in paths:
+                paths.append(os.path.join(settings.METRICS_DIR, RETIRED_SNAPSHOT))
+        for path in paths:
+            snapshot = read_snapshot(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return snapshots
+
+
+def merge(snapshots):
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * (len(BUCKETS) + 1), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def to_snapshot(counters, histograms):
+    """Обратное к ``merge``: сложенные значения в формате снимка процесса."""
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), buckets, total, count]
+                       for (name, labels), (buckets, total, count) in histograms.items()],
+    }
+
+
+def format_value(value):
+    """Целые — без дробной части, дробные — без потери точности (``:g`` оставляет 6 знаков)."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if value.is_integer():
+            return str(int(value))
+    return repr(value)
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus(snapshots=None):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    counters, histograms = merge(collect() if snapshots is None else snapshots)
+    lines = []
+    for metric, (kind, description) in DESCRIPTIONS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        if kind == 'counter':
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f'{metric}{format_labels(labels)} {format_value(value)}')
+        else:
+            for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+                    cumulative += bucket
+                    lines.append(f'{metric}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{metric}_sum{format_labels(labels)} {format_value(total)}')
+                lines.append(f'{metric}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,240 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .db_router import mark_sticky
+from .metrics import registry
+from .profiling import should_profile, ashould_profile, run_profiled, arun_profiled
+
+sql_logger = logging.getLogger('api.sql')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class HybridMiddleware:
+    """
+    Основа промежуточных слоев, работающих и в синхронной, и в асинхронной цепочке.
+    Под ASGI Django не оборачивает такой слой в ``sync_to_async``: асинхронные
+    представления выполняются в цикле событий без перехода в поток, а переменные
+    контекста (``replica_reads``) видны обработчику без копирования. Подкласс
+    реализует ``handle`` и ``ahandle``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def ahandle(self, request):
+        raise NotImplementedError
+
+
+class ReplicaStickinessMiddleware(HybridMiddleware):
+    """После успешного изменяющего запроса чтение пользователя временно идет с основной БД."""
+
+    @staticmethod
+    def changes_data(request, response):
+        return settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400
+
+    @staticmethod
+    def stick(request):
+        # DRF записывает пользователя, прошедшего аутентификацию по токену, в request.user.
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            mark_sticky(user)
+
+    def handle(self, request):
+        response = self.get_response(request)
+        if self.changes_data(request, response):
+            self.stick(request)
+        return response
+
+    async def ahandle(self, request):
+        response = await self.get_response(request)
+        if self.changes_data(request, response):
+            # Ленивый request.user из сессии и запись в кэш — синхронные операции.
+            await sync_to_async(self.stick)(request)
+        return response
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """Выполняет выбранные запросы под профилировщиком (см. ``api/profiling.py``)."""
+
+    def handle(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        reason = should_profile(request)
+        if reason is None:
+            return self.get_response(request)
+        return run_profiled(self.get_response, request, reason)
+
+    async def ahandle(self, request):
+        if not settings.PROFILING_ENABLED:
+            return await self.get_response(request)
+        reason = await ashould_profile(request)
+        if reason is None:
+            return await self.get_response(request)
+        return await arun_profiled(self.get_response, request, reason)
+
+
+def query_fingerprint(sql):
+    """Текст запроса без различий в длине списков параметров ``IN (%s, %s, ...)``."""
+    return re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', sql)
+
+
+class QueryStats:
+    """Обертка ``execute_wrapper``: считает запросы, их время и повторы."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        # Первый текст и параметры каждого запроса — для EXPLAIN (api/index_advisor.py).
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            fingerprint = query_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            if fingerprint not in self.samples:
+                self.samples[fingerprint] = (sql, None if many else params)
+
+    def repeated(self, threshold):
+        return {sql: count for sql, count in self.fingerprints.items() if count >= threshold}
+
+
+class QueryInstrumentationMiddleware(HybridMiddleware):
+    """
+    Считает запросы к БД каждого запроса, их суммарное время и повторяющиеся
+    запросы (признак N+1). Результат отдается в заголовке ``Server-Timing`` и
+    пишется в журнал ``api.sql`` одной JSON-строкой.
+    """
+
+    @staticmethod
+    def instrument(stack, request):
+        stats = QueryStats()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        request.query_stats = stats
+        return stats
+
+    def handle(self, request):
+        if not settings.SQL_INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            stats = self.instrument(stack, request)
+            response = self.get_response(request)
+        return self.report(request, response, stats, time.perf_counter() - started)
+
+    async def ahandle(self, request):
+        if not settings.SQL_INSTRUMENTATION_ENABLED:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        # Асинхронный ORM выполняет запросы в потоке sync_to_async, у которого свои
+        # соединения, поэтому обертки ставятся и снимаются в этом же потоке.
+        stack = ExitStack()
+        stats = await sync_to_async(self.instrument)(stack, request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def report(request, response, stats, total):
+        response['Server-Timing'] = (f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+                                     f'total;dur={total * 1000:.2f}')
+        repeated = stats.repeated(settings.SQL_REPEATED_QUERY_THRESHOLD)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'repeated': repeated,
+        }
+        sql_logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(record, ensure_ascii=False))
+        if settings.SQL_CAPTURE_FILE:
+            capture_queries(stats, settings.SQL_CAPTURE_FILE)
+        return response
+
+
+def capture_queries(stats, path):
+    """Дописывает запросы в файл для ``manage.py advise_indexes``, по строке JSON на запрос."""
+    lines = [json.dumps({'sql': sql, 'params': params, 'count': stats.fingerprints[fingerprint]},
+                        ensure_ascii=False, default=str)
+             for fingerprint, (sql, params) in stats.samples.items()]
+    if lines:
+        with open(path, 'a') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Собирает метрики запроса: количество по маршруту и коду ответа, гистограммы
+    полного времени, времени БД и остального времени (см. ``api/metrics.py``).
+    """
+
+    def handle(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    async def ahandle(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    @staticmethod
+    def record(request, response, started):
+        finished = time.perf_counter()
+        observe_request(request, response, finished - started)
+        registry.observe('metrics_overhead_seconds', (), time.perf_counter() - finished)
+        registry.flush()
+
+
+def observe_request(request, response, duration):
+    match = request.resolver_match
+    labels = (('route', match.view_name if match else 'unmatched'), ('method', request.method))
+    registry.inc('http_requests_total', labels + (('status', str(response.status_code)),))
+    registry.observe('http_request_duration_seconds', labels, duration)
+    stats = getattr(request, 'query_stats', None)
+    if stats is not None:
+        registry.observe('http_request_db_seconds', labels, stats.duration)
+        registry.observe('http_request_app_seconds', labels, max(duration - stats.duration, 0))
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-19 04:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ИД заказа')),
+                ('dt', models.DateTimeField()),
+                ('state', models.CharField(choices=[('basket', 'Статус корзины'), ('new', 'Новый'), ('confirmed', 'Подтвержден'), ('assembled', 'Собран'), ('sent', 'Отправлен'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], max_length=15, verbose_name='Статус')),
+                ('total_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма заказа')),
+                ('items', models.JSONField(default=list, verbose_name='Позиции заказа')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('contact', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.contact', verbose_name='Контакт')),
+                ('shops', models.ManyToManyField(blank=True, related_name='archived_orders', to='api.shop', verbose_name='Магазины')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+                'ordering': ('-dt',),
+            },
+        ),
+    ]
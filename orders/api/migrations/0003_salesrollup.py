@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-19 04:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_archivedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано единиц')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('product_info', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_rollups', to='api.productinfo', verbose_name='Информация о продукте')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='api.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+                'indexes': [models.Index(fields=['shop', 'day'], name='sales_rollup_shop_day')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('shop', 'product_info', 'day'), name='unique_sales_rollup'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='confirmemailtoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='When was this token generated'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.0.3 on 2026-10-19 04:53
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_product_info(apps, duplicate, kept):
+    """
+    Переносит на ``kept`` все, что ссылается на ``duplicate`` (то же предложение
+    магазина), и удаляет ``duplicate``. История заказов сохраняется: позиции одного
+    заказа складываются, продажи за один день суммируются.
+    """
+    OrderItem = apps.get_model('api', 'OrderItem')
+    ProductParameter = apps.get_model('api', 'ProductParameter')
+    SalesRollup = apps.get_model('api', 'SalesRollup')
+
+    for order_item in OrderItem.objects.filter(product_info_id=duplicate.id):
+        existing = OrderItem.objects.filter(order_id=order_item.order_id, product_info_id=kept.id).first()
+        if existing is not None:
+            existing.quantity += order_item.quantity
+            existing.save(update_fields=['quantity'])
+            order_item.delete()
+        else:
+            order_item.product_info_id = kept.id
+            order_item.save(update_fields=['product_info'])
+
+    for rollup in SalesRollup.objects.filter(product_info_id=duplicate.id):
+        existing = SalesRollup.objects.filter(shop_id=rollup.shop_id, product_info_id=kept.id, day=rollup.day).first()
+        if existing is not None:
+            existing.units += rollup.units
+            existing.revenue += rollup.revenue
+            existing.save(update_fields=['units', 'revenue'])
+            rollup.delete()
+        else:
+            rollup.product_info_id = kept.id
+            rollup.save(update_fields=['product_info'])
+
+    # Параметры, которые есть у обеих записей, остаются как у сохраняемой.
+    ProductParameter.objects.filter(product_info_id=duplicate.id).exclude(
+        parameter_id__in=ProductParameter.objects.filter(product_info_id=kept.id).values('parameter_id')
+    ).update(product_info_id=kept.id)
+    duplicate.delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Объединяет одноименные продукты категории и одноименные параметры перед
+    созданием уникальных ограничений. Ссылки переносятся на запись с меньшим id.
+    Предложение магазина, которое после переноса совпало бы с существующим,
+    сливается с ним вместе с позициями заказов и продажами (``merge_product_info``);
+    совпавшие значения параметров удаляются.
+    """
+    Product = apps.get_model('api', 'Product')
+    ProductInfo = apps.get_model('api', 'ProductInfo')
+    Parameter = apps.get_model('api', 'Parameter')
+    ProductParameter = apps.get_model('api', 'ProductParameter')
+
+    duplicates = Product.objects.values('name', 'category_id').annotate(
+        keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Product.objects.filter(name=duplicate['name'], category_id=duplicate['category_id']).exclude(
+            id=duplicate['keep_id'])
+        for product_info in ProductInfo.objects.filter(product__in=extra):
+            kept = ProductInfo.objects.filter(product_id=duplicate['keep_id'], shop_id=product_info.shop_id,
+                                              external_id=product_info.external_id).first()
+            if kept is not None:
+                merge_product_info(apps, product_info, kept)
+            else:
+                product_info.product_id = duplicate['keep_id']
+                product_info.save(update_fields=['product'])
+        extra.delete()
+
+    duplicates = Parameter.objects.values('name').annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Parameter.objects.filter(name=duplicate['name']).exclude(id=duplicate['keep_id'])
+        for product_parameter in ProductParameter.objects.filter(parameter__in=extra):
+            if ProductParameter.objects.filter(product_info_id=product_parameter.product_info_id,
+                                               parameter_id=duplicate['keep_id']).exists():
+                product_parameter.delete()
+            else:
+                product_parameter.parameter_id = duplicate['keep_id']
+                product_parameter.save(update_fields=['parameter'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_confirmemailtoken_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'state'], name='order_user_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(fields=['state', '-name'], name='shop_state_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='parameter',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_parameter'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('name', 'category'), name='unique_product'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-19 04:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='webhook_secret',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Ключ подписи уведомлений'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='webhook_url',
+            field=models.URLField(blank=True, null=True, verbose_name='Адрес уведомлений о заказах'),
+        ),
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(verbose_name='ИД заказа')),
+                ('state', models.CharField(choices=[('basket', 'Статус корзины'), ('new', 'Новый'), ('confirmed', 'Подтвержден'), ('assembled', 'Собран'), ('sent', 'Отправлен'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], max_length=15, verbose_name='Статус')),
+                ('changed_at', models.DateTimeField(verbose_name='Изменен')),
+                ('send_after', models.DateTimeField(verbose_name='Отправить после')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток доставки')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='webhook_events', to='api.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Уведомление магазина',
+                'verbose_name_plural': 'Очередь уведомлений магазинов',
+                'indexes': [models.Index(fields=['send_after'], name='webhook_event_pending')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(fields=('shop', 'order_id'), name='unique_webhook_event'),
+        ),
+    ]
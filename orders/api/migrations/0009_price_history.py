@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-19 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_shop_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistoryChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний ИД')),
+                ('first_at', models.DateTimeField(verbose_name='Первая точка')),
+                ('last_at', models.DateTimeField(verbose_name='Последняя точка')),
+                ('last_price', models.PositiveIntegerField(verbose_name='Последняя цена')),
+                ('last_quantity', models.PositiveIntegerField(verbose_name='Последнее количество')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Точек')),
+                ('closed', models.BooleanField(default=False, verbose_name='Заполнен')),
+                ('data', models.BinaryField(verbose_name='Точки')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='api.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'История цены',
+                'verbose_name_plural': 'История цен',
+                'indexes': [models.Index(fields=['shop', 'external_id', 'first_at'], name='price_history_lookup')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricehistorychunk',
+            constraint=models.UniqueConstraint(condition=models.Q(('closed', False)), fields=('shop', 'external_id'), name='unique_open_price_history_chunk'),
+        ),
+    ]
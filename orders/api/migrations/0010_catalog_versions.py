@@ -0,0 +1,35 @@
+# Generated by Django 5.0.3 on 2026-10-19 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_price_history'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='productinfo',
+            name='unique_product_info',
+        ),
+        migrations.AddField(
+            model_name='productinfo',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия каталога'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Опубликованная версия каталога'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'version'], name='product_info_shop_version_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productinfo',
+            constraint=models.UniqueConstraint(fields=('product', 'shop', 'external_id', 'version'), name='unique_product_info'),
+        ),
+    ]
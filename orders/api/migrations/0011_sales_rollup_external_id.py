@@ -0,0 +1,74 @@
+# Generated by Django 5.0.3 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+def rollups_by_external_id(apps, schema_editor):
+    """
+    Переводит строки продаж с ``ProductInfo`` на внешний ИД товара. Строки
+    разных версий одного товара за день складываются. Строки, потерявшие
+    товар (``product_info`` удален), не отнести к товару — они удаляются,
+    точные значения восстанавливает ``manage.py rebuild_sales_rollups``.
+    """
+    SalesRollup = apps.get_model('api', 'SalesRollup')
+
+    SalesRollup.objects.filter(product_info__isnull=True).delete()
+    merged = {}
+    for rollup in SalesRollup.objects.select_related('product_info').order_by('id'):
+        key = (rollup.shop_id, rollup.product_info.external_id, rollup.day)
+        if key in merged:
+            merged[key].units += rollup.units
+            merged[key].revenue += rollup.revenue
+            rollup.delete()
+        else:
+            rollup.external_id = key[1]
+            merged[key] = rollup
+    SalesRollup.objects.bulk_update(merged.values(), ['external_id', 'units', 'revenue'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_catalog_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='placed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Оформлен'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Цена при оформлении'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='placed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Оформлен'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='salesrollup',
+            name='unique_sales_rollup',
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='external_id',
+            field=models.PositiveIntegerField(null=True, verbose_name='Внешний ИД'),
+        ),
+        migrations.RunPython(rollups_by_external_id, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='salesrollup',
+            name='product_info',
+        ),
+        migrations.AlterField(
+            model_name='salesrollup',
+            name='external_id',
+            field=models.PositiveIntegerField(verbose_name='Внешний ИД'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('shop', 'external_id', 'day'), name='unique_sales_rollup'),
+        ),
+    ]
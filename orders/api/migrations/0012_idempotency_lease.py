@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-19 05:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_sales_rollup_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начало выполнения'),
+        ),
+    ]
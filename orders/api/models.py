@@ -1,7 +1,11 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.utils import timezone
 from django_rest_passwordreset.tokens import get_token_generator
 
 STATE_CHOICES = (
@@ -107,6 +111,7 @@ class ConfirmEmailToken(models.Model):
 
     created_at = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         verbose_name="When was this token generated"
     )
 
@@ -125,6 +130,14 @@ class ConfirmEmailToken(models.Model):
     def __str__(self):
         return "Password reset token for user {user}".format(user=self.user)
 
+    @staticmethod
+    def expired_before():
+        """Токены, созданные раньше этого момента, просрочены."""
+        return timezone.now() - timedelta(seconds=settings.CONFIRM_EMAIL_TOKEN_TTL)
+
+    def is_expired(self):
+        return self.created_at < self.expired_before()
+
 
 class Contact(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
@@ -155,11 +168,18 @@ class Shop(models.Model):
                                 on_delete=models.CASCADE,
                                 verbose_name='Пользователь')
     state = models.BooleanField(default=True, verbose_name='Статус получения заказов')
+    webhook_url = models.URLField(null=True, blank=True, verbose_name='Адрес уведомлений о заказах')
+    webhook_secret = models.CharField(max_length=64, blank=True, verbose_name='Ключ подписи уведомлений')
+    catalog_version = models.PositiveIntegerField(default=0, verbose_name='Опубликованная версия каталога')
 
     class Meta:
         verbose_name = 'Магазин'
         verbose_name_plural = "Список магазинов"
         ordering = ('-name',)
+        indexes = [
+            # Списки активных магазинов и их категорий (shops__state=True) в порядке выдачи.
+            models.Index(fields=['state', '-name'], name='shop_state_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -187,6 +207,9 @@ class Product(models.Model):
         verbose_name = 'Продукт'
         verbose_name_plural = "Список продуктов"
         ordering = ('-name',)
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'category'], name='unique_product'),
+        ]
 
     def __str__(self):
         return self.name
@@ -202,12 +225,18 @@ class ProductInfo(models.Model):
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    # Покупателям видны только товары опубликованной версии каталога магазина (Shop.catalog_version).
+    version = models.PositiveIntegerField(default=0, verbose_name='Версия каталога')
 
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информационный список о продуктах"
         constraints = [
-            models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
+            models.UniqueConstraint(fields=['product', 'shop', 'external_id', 'version'],
+                                    name='unique_product_info'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'version'], name='product_info_shop_version_idx'),
         ]
 
 
@@ -216,6 +245,8 @@ class Order(models.Model):
                              related_name='orders', blank=True,
                              on_delete=models.CASCADE)
     dt = models.DateTimeField(auto_now_add=True)
+    # Момент перехода из корзины (или отмены) в оформленный заказ; день продаж в SalesRollup.
+    placed_at = models.DateTimeField(null=True, blank=True, verbose_name='Оформлен')
     state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
@@ -225,6 +256,9 @@ class Order(models.Model):
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказов"
         ordering = ('-dt',)
+        indexes = [
+            models.Index(fields=['user', 'state'], name='order_user_state_idx'),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -238,6 +272,8 @@ class OrderItem(models.Model):
                                      blank=True,
                                      on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    # Цена на момент оформления; до оформления (и в старых заказах) пусто, действует цена товара.
+    price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Цена при оформлении')
 
     class Meta:
         verbose_name = 'Заказанная позиция'
@@ -254,6 +290,9 @@ class Parameter(models.Model):
         verbose_name = 'Имя параметра'
         verbose_name_plural = "Список имен параметров"
         ordering = ('-name',)
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_parameter'),
+        ]
 
     def __str__(self):
         return self.name
@@ -272,4 +311,167 @@ class ProductParameter(models.Model):
         verbose_name_plural = "Список параметров"
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
-        ]
\ No newline at end of file
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Архивная копия завершенного заказа.
+
+    Позиции заказа хранятся одним JSON-полем в виде списков значений в порядке
+    ``ITEM_FIELDS``, чтобы архив не разрастался на отдельные строки.
+    """
+    ITEM_FIELDS = ('product_info', 'shop', 'product', 'category', 'model', 'price', 'quantity', 'external_id')
+
+    id = models.BigIntegerField(primary_key=True, verbose_name='ИД заказа')
+    user = models.ForeignKey(User, verbose_name='Пользователь',
+                             related_name='archived_orders',
+                             on_delete=models.CASCADE)
+    dt = models.DateTimeField()
+    placed_at = models.DateTimeField(null=True, blank=True, verbose_name='Оформлен')
+    state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
+    contact = models.ForeignKey(Contact, verbose_name='Контакт',
+                                blank=True, null=True,
+                                on_delete=models.SET_NULL)
+    shops = models.ManyToManyField(Shop, verbose_name='Магазины', related_name='archived_orders', blank=True)
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма заказа', default=0)
+    items = models.JSONField(verbose_name='Позиции заказа', default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = "Архив заказов"
+        ordering = ('-dt',)
+
+    def __str__(self):
+        return str(self.dt)
+
+    @property
+    def ordered_items(self):
+        return [dict(zip(self.ITEM_FIELDS, item)) for item in self.items]
+
+
+class SalesRollup(models.Model):
+    """
+    Продажи товара магазина за день, обновляются при смене статуса заказа.
+    Товар задается внешним ИД магазина: ``ProductInfo`` пересоздается при каждом
+    импорте каталога.
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='sales_rollups',
+                             on_delete=models.CASCADE)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    day = models.DateField(verbose_name='День')
+    units = models.IntegerField(verbose_name='Продано единиц', default=0)
+    revenue = models.BigIntegerField(verbose_name='Выручка', default=0)
+
+    class Meta:
+        verbose_name = 'Продажи за день'
+        verbose_name_plural = "Продажи по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'external_id', 'day'], name='unique_sales_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'day'], name='sales_rollup_shop_day'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Сохраненный ответ на запрос с заголовком ``Idempotency-Key``."""
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='idempotency_keys',
+                             on_delete=models.CASCADE)
+    key = models.CharField(verbose_name='Ключ', max_length=64)
+    fingerprint = models.CharField(verbose_name='Отпечаток запроса', max_length=64)
+    status_code = models.PositiveSmallIntegerField(verbose_name='Код ответа', null=True)
+    response = models.JSONField(verbose_name='Тело ответа', null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(verbose_name='Начало выполнения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку, записывается в одной транзакции с изменением данных."""
+    subject = models.CharField(verbose_name='Тема', max_length=255)
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(verbose_name='Отправитель', max_length=254)
+    to = models.JSONField(verbose_name='Получатели', default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(verbose_name='Отправить после')
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток отправки', default=0)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+    sent_at = models.DateTimeField(verbose_name='Отправлено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Очередь исходящих писем'
+        indexes = [
+            models.Index(fields=['sent_at', 'send_after'], name='outgoing_email_pending'),
+        ]
+
+    def __str__(self):
+        return self.subject
+
+
+class WebhookEvent(models.Model):
+    """
+    Изменение заказа, о котором нужно уведомить магазин. На пару магазин-заказ
+    хранится одна запись: повторные изменения до доставки обновляют её.
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='webhook_events',
+                             on_delete=models.CASCADE)
+    order_id = models.BigIntegerField(verbose_name='ИД заказа')
+    state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
+    changed_at = models.DateTimeField(verbose_name='Изменен')
+    send_after = models.DateTimeField(verbose_name='Отправить после')
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток доставки', default=0)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Уведомление магазина'
+        verbose_name_plural = 'Очередь уведомлений магазинов'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'order_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['send_after'], name='webhook_event_pending'),
+        ]
+
+    def __str__(self):
+        return f'{self.shop_id}: {self.order_id} {self.state}'
+
+
+class PriceHistoryChunk(models.Model):
+    """
+    Отрезок истории цены и остатка товара магазина (см. ``api/history.py``).
+
+    Точки хранятся в ``data`` последовательностью разностей с предыдущей точкой
+    (секунды, цена, количество) в виде varint, поэтому точка занимает несколько байт.
+    В чанке не больше ``PRICE_HISTORY_CHUNK_SIZE`` точек, новые точки дописываются
+    в единственный открытый чанк пары магазин — внешний ИД.
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='price_history',
+                             on_delete=models.CASCADE)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    first_at = models.DateTimeField(verbose_name='Первая точка')
+    last_at = models.DateTimeField(verbose_name='Последняя точка')
+    last_price = models.PositiveIntegerField(verbose_name='Последняя цена')
+    last_quantity = models.PositiveIntegerField(verbose_name='Последнее количество')
+    count = models.PositiveIntegerField(verbose_name='Точек', default=0)
+    closed = models.BooleanField(verbose_name='Заполнен', default=False)
+    data = models.BinaryField(verbose_name='Точки')
+
+    class Meta:
+        verbose_name = 'История цены'
+        verbose_name_plural = 'История цен'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'external_id'], condition=models.Q(closed=False),
+                                    name='unique_open_price_history_chunk'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'external_id', 'first_at'], name='price_history_lookup'),
+        ]
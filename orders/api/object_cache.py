@@ -0,0 +1,126 @@
+"""
+Кэш сериализованных товаров и магазинов для карточки товара.
+
+Запись объекта хранится под ключом ``object_cache:<вид>:<id>:<версия>``, где
+версия — случайная метка в отдельном ключе. Инвалидация (сигналы моделей,
+импорт каталога, смена статуса магазина) выдает объекту новую метку после
+фиксации транзакции, поэтому запись, посчитанная по старым данным параллельным
+запросом, попадает под старую метку и больше не читается; старые записи
+истекают через ``OBJECT_CACHE_TIMEOUT``.
+
+При промахе запись пересчитывает один запрос — тот, кто взял блокировку
+``cache.add``; остальные ждут появления записи не дольше
+``OBJECT_CACHE_LOCK_TIMEOUT`` и только потом считают сами. Отсутствующие
+объекты тоже кэшируются (пустой записью).
+
+Запись товара не зависит от состояния магазина: видимость (магазин принимает
+заказы, товар из опубликованной версии каталога) проверяется при чтении по
+записи магазина. Публикация каталога и смена статуса сбрасывают только запись
+магазина, ``collect_garbage`` — записи удаленных товаров одним вызовом на пачку.
+Переименование категорий и удаление товаров через админку становятся видны по
+истечении ``OBJECT_CACHE_TIMEOUT``.
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import registry
+from .models import ProductInfo, Shop
+from .serializers import ProductInfoSerializer, ShopSerializer
+
+PRODUCT_INFO = 'product_info'
+SHOP = 'shop'
+OBJECT_CACHE_KEY = 'object_cache:{kind}:{pk}:{version}'
+OBJECT_VERSION_KEY = 'object_cache:{kind}:{pk}'
+
+
+def version_key(kind, pk):
+    return OBJECT_VERSION_KEY.format(kind=kind, pk=pk)
+
+
+def new_version():
+    return secrets.token_hex(6)
+
+
+def current_version(kind, pk):
+    key = version_key(kind, pk)
+    version = cache.get(key)
+    if version is None:
+        # Метка выдается при первом чтении (или после вытеснения) и живет дольше записей.
+        cache.add(key, new_version(), settings.OBJECT_CACHE_TIMEOUT * 2)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(kind, *pks):
+    """Выдает объектам новые версии после фиксации текущей транзакции."""
+    if pks:
+        transaction.on_commit(lambda: cache.set_many({version_key(kind, pk): new_version() for pk in pks},
+                                                     settings.OBJECT_CACHE_TIMEOUT * 2))
+
+
+def read_through(kind, pk, compute):
+    """Запись объекта из кэша или ``compute(pk)`` с одним пересчетом на ключ; ``None`` — объекта нет."""
+    key = OBJECT_CACHE_KEY.format(kind=kind, pk=pk, version=current_version(kind, pk))
+    record = cache.get(key)
+    if record is not None:
+        registry.inc('object_cache_requests_total', (('kind', kind), ('result', 'hit')))
+        return record or None
+
+    lock_key = key + ':lock'
+    locked = cache.add(lock_key, 1, settings.OBJECT_CACHE_LOCK_TIMEOUT)
+    if not locked:
+        # Запись уже пересчитывает другой запрос.
+        deadline = time.monotonic() + settings.OBJECT_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(settings.OBJECT_CACHE_WAIT_INTERVAL)
+            record = cache.get(key)
+            if record is not None:
+                registry.inc('object_cache_requests_total', (('kind', kind), ('result', 'wait')))
+                return record or None
+
+    registry.inc('object_cache_requests_total', (('kind', kind), ('result', 'miss')))
+    try:
+        record = compute(pk)
+        cache.set(key, record or {}, settings.OBJECT_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return record
+
+
+def load_shop(pk):
+    shop = Shop.objects.filter(pk=pk).first()
+    if shop is None:
+        return None
+    return {'data': ShopSerializer(shop).data, 'catalog_version': shop.catalog_version}
+
+
+def load_product_info(pk):
+    product_info = ProductInfo.objects.filter(pk=pk).select_related(
+        'product__category'
+    ).prefetch_related('product_parameters__parameter').first()
+    if product_info is None:
+        return None
+    return {'data': ProductInfoSerializer(product_info).data,
+            'shop': product_info.shop_id,
+            'version': product_info.version}
+
+
+def get_shop(pk):
+    """Запись магазина: ``{'data': сериализованный магазин, 'catalog_version': ...}``."""
+    return read_through(SHOP, pk, load_shop)
+
+
+def get_product_info(pk):
+    """Сериализованный товар, если он виден покупателям, иначе ``None``."""
+    product_info = read_through(PRODUCT_INFO, pk, load_product_info)
+    if product_info is None:
+        return None
+    shop = get_shop(product_info['shop'])
+    if shop is None or not shop['data']['state'] or shop['catalog_version'] != product_info['version']:
+        return None
+    return product_info['data']
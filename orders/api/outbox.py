@@ -0,0 +1,153 @@
+"""
+Очередь исходящих писем.
+
+``queue_email`` записывает письмо в ``OutgoingEmail`` в текущей транзакции,
+поэтому письмо уходит только если изменение данных зафиксировано. Отправляет
+письма команда ``manage.py send_outbox``; при ошибке письмо откладывается с
+экспоненциальной задержкой, после ``EMAIL_OUTBOX_MAX_ATTEMPTS`` попыток
+остается в таблице с текстом последней ошибки.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .delivery import claim, retry_later
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, body, to, from_email=None):
+    """Ставит письмо в очередь на отправку."""
+    return OutgoingEmail.objects.create(subject=subject, body=body, to=list(to),
+                                        from_email=from_email or settings.EMAIL_HOST_USER,
+                                        send_after=timezone.now())
+
+
+def claim_batch(batch_size):
+    """
+    Забирает пачку писем, готовых к отправке. Чтобы параллельный обработчик не
+    взял те же письма, их ``send_after`` сдвигается на ``EMAIL_OUTBOX_LEASE``.
+    """
+    ids = claim(OutgoingEmail.objects.filter(sent_at__isnull=True, attempts__lt=settings.EMAIL_OUTBOX_MAX_ATTEMPTS),
+                batch_size, settings.EMAIL_OUTBOX_LEASE)
+    return list(OutgoingEmail.objects.filter(id__in=ids).order_by('id'))
+
+
+def mark_sent(emails):
+    OutgoingEmail.objects.filter(id__in=[email.id for email in emails]).update(sent_at=timezone.now())
+
+
+def mark_failed(emails, error):
+    """Откладывает повторную отправку писем с экспоненциальной задержкой."""
+    retry_later(emails, error, settings.EMAIL_OUTBOX_RETRY_DELAY)
+    logger.warning('Не удалось отправить письма %s: %s', [email.id for email in emails], error)
+
+
+class OutboxSender:
+    """
+    Отправитель очереди писем с постоянным SMTP-соединением.
+
+    Соединение открывается один раз и переиспользуется между пачками, пока не
+    отправлено ``max_per_connection`` писем или не случилась ошибка. Письма
+    уходят группами по ``group_size`` через ``send_messages``, скорость
+    ограничивается ``rate`` писем в секунду. Если группа не отправилась целиком,
+    все её письма откладываются на повтор, поэтому доставка — «хотя бы один раз».
+    """
+
+    def __init__(self, group_size=None, rate=None, max_per_connection=None):
+        self.group_size = group_size or settings.EMAIL_OUTBOX_GROUP_SIZE
+        self.rate = settings.EMAIL_OUTBOX_RATE_LIMIT if rate is None else rate
+        self.max_per_connection = max_per_connection or settings.EMAIL_OUTBOX_MAX_PER_CONNECTION
+        self.connection = None
+        self.connection_sent = 0
+        self.next_send_at = 0
+        self.started_at = time.monotonic()
+        self.stats = {'sent': 0, 'failed': 0, 'connections': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        if self.connection is not None and self.connection_sent >= self.max_per_connection:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection()
+            self.connection.open()
+            self.connection_sent = 0
+            self.stats['connections'] += 1
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def throttle(self, count):
+        """Ждет, пока отправка ``count`` писем не превысит ограничение скорости."""
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self.next_send_at > now:
+            time.sleep(self.next_send_at - now)
+        self.next_send_at = max(self.next_send_at, now) + count / self.rate
+
+    def metrics(self):
+        """Писем в секунду и среднее число писем на одно соединение."""
+        elapsed = time.monotonic() - self.started_at
+        return {
+            **self.stats,
+            'messages_per_second': round(self.stats['sent'] / elapsed, 2) if elapsed else 0,
+            'messages_per_connection': round(self.stats['sent'] / self.stats['connections'], 2)
+            if self.stats['connections'] else 0,
+        }
+
+    def send_group(self, emails):
+        """
+        Отправляет начало списка ``emails``, умещающееся в текущее соединение.
+        Возвращает обработанные и успешно отправленные письма.
+        """
+        try:
+            connection = self.open()
+            emails = emails[:self.max_per_connection - self.connection_sent]
+            self.throttle(len(emails))
+            messages = [EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to)
+                        for email in emails]
+            connection.send_messages(messages)
+        except Exception as error:
+            self.close()
+            mark_failed(emails, error)
+            self.stats['failed'] += len(emails)
+            return emails, []
+        self.connection_sent += len(emails)
+        self.stats['sent'] += len(emails)
+        return emails, emails
+
+    def send_pending(self, batch_size=100):
+        """
+        Отправляет одну пачку писем.
+        Возвращает количество отправленных и неотправленных писем.
+        """
+        emails = claim_batch(batch_size)
+        sent = []
+        position = 0
+        while position < len(emails):
+            processed, group_sent = self.send_group(emails[position:position + self.group_size])
+            position += len(processed)
+            sent += group_sent
+        mark_sent(sent)
+        return len(sent), len(emails) - len(sent)
+
+
+def send_pending(batch_size=100):
+    """Отправляет одну пачку писем через отдельное соединение."""
+    with OutboxSender() as sender:
+        return sender.send_pending(batch_size)
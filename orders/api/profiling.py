@@ -0,0 +1,203 @@
+"""
+Профилирование отдельных запросов в рабочем окружении.
+
+Запрос выполняется под ``cProfile``, если передан заголовок ``X-Profile: 1`` и
+пользователь, прошедший аутентификацию по токену, — сотрудник (``is_staff``), или
+запрос попал в случайную выборку с долей ``PROFILING_SAMPLE_RATE``. Долю можно
+поменять без перезапуска командой ``profiles rate <доля>``: значение хранится в
+общем кэше и перечитывается процессами раз в ``PROFILING_RATE_REFRESH`` секунд.
+Без общего кэша (``PROFILING_RATE_OVERRIDE_ENABLED``) значение из кэша не видно
+другим процессам, поэтому доля берется только из настроек.
+
+Профиль сохраняется в ``PROFILING_DIR`` в формате pstats (``<имя>.prof``) вместе
+с описанием (``<имя>.json``): маршрут, метод, код ответа, время, число запросов
+к БД. Хранятся последние ``PROFILING_MAX_PROFILES`` профилей.
+"""
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+from itertools import count
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SAMPLE_RATE_CACHE_KEY = 'profiling:sample_rate'
+
+_rate = {'value': None, 'expires': 0.0}
+_rate_lock = threading.Lock()
+_sequence = count()
+
+
+def sample_rate():
+    """Доля профилируемых запросов: значение из кэша, если задано, иначе из настроек."""
+    if not settings.PROFILING_RATE_OVERRIDE_ENABLED:
+        return settings.PROFILING_SAMPLE_RATE
+    now = time.monotonic()
+    if now >= _rate['expires']:
+        with _rate_lock:
+            if now >= _rate['expires']:
+                _rate['value'] = cache.get(SAMPLE_RATE_CACHE_KEY)
+                _rate['expires'] = now + settings.PROFILING_RATE_REFRESH
+    value = _rate['value']
+    return settings.PROFILING_SAMPLE_RATE if value is None else value
+
+
+def set_sample_rate(value):
+    """Доля профилируемых запросов для всех процессов; ``None`` — вернуть значение из настроек."""
+    if value is None:
+        cache.delete(SAMPLE_RATE_CACHE_KEY)
+    else:
+        cache.set(SAMPLE_RATE_CACHE_KEY, value, None)
+    _rate['expires'] = 0.0
+
+
+def requested_by_staff(request):
+    """
+    Заголовок ``X-Profile`` учитывается только от сотрудника. Промежуточный слой
+    работает до представления, поэтому токен проверяется теми же классами
+    аутентификации DRF, что и в представлении; профилировщик без этой проверки
+    не включается.
+    """
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+def should_profile(request):
+    if request.META.get(PROFILE_HEADER) == '1' and requested_by_staff(request):
+        return 'header'
+    rate = sample_rate()
+    if rate > 0 and random.random() < rate:
+        return 'sample'
+    return None
+
+
+async def ashould_profile(request):
+    """Асинхронный вариант ``should_profile``: проверка токена — синхронный запрос к БД."""
+    if request.META.get(PROFILE_HEADER) == '1':
+        return await sync_to_async(should_profile)(request)
+    return should_profile(request)
+
+
+def save_profile(profiler, request, response, duration, reason):
+    """Сохраняет профиль и его описание, возвращает имя профиля."""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(_sequence)}'
+    match = request.resolver_match
+    stats = getattr(request, 'query_stats', None)
+    meta = {
+        'name': name,
+        'created': time.time(),
+        'reason': reason,
+        'route': match.view_name if match else 'unmatched',
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'queries': stats.count if stats is not None else None,
+        'db_ms': round(stats.duration * 1000, 2) if stats is not None else None,
+    }
+    profiler.dump_stats(os.path.join(settings.PROFILING_DIR, f'{name}.prof'))
+    with open(os.path.join(settings.PROFILING_DIR, f'{name}.json'), 'w') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    prune(settings.PROFILING_MAX_PROFILES)
+    return name
+
+
+def list_profiles():
+    """Описания сохраненных профилей, от старых к новым."""
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for file_name in os.listdir(settings.PROFILING_DIR):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILING_DIR, file_name)) as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta['created'])
+
+
+def profile_path(name):
+    return os.path.join(settings.PROFILING_DIR, f'{name}.prof')
+
+
+def delete_profile(name):
+    for extension in ('.json', '.prof'):
+        try:
+            os.remove(os.path.join(settings.PROFILING_DIR, name + extension))
+        except FileNotFoundError:
+            pass
+
+
+def prune(keep):
+    """Удаляет самые старые профили сверх ``keep``, возвращает их количество."""
+    profiles = list_profiles()
+    excess = profiles[:max(len(profiles) - keep, 0)]
+    for meta in excess:
+        delete_profile(meta['name'])
+    return len(excess)
+
+
+def start_profiler():
+    """Включенный профилировщик или ``None``, если в потоке уже работает другой профилировщик."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def finish_profile(profiler, request, response, duration, reason):
+    response['X-Profile-Id'] = save_profile(profiler, request, response, duration, reason)
+    return response
+
+
+def run_profiled(get_response, request, reason):
+    """
+    Выполняет запрос под профилировщиком и сохраняет результат. Если профилировщик
+    не включается (в потоке уже работает другой), запрос выполняется без профиля.
+    """
+    started = time.perf_counter()
+    profiler = start_profiler()
+    if profiler is None:
+        return get_response(request)
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+    return finish_profile(profiler, request, response, time.perf_counter() - started, reason)
+
+
+async def arun_profiled(get_response, request, reason):
+    """
+    Асинхронный вариант ``run_profiled``. Профилировщик видит только поток цикла
+    событий, поэтому в профиль попадают и другие задачи, выполнявшиеся, пока
+    запрос ждал БД; синхронные вызовы в потоках ``sync_to_async`` в него не попадают.
+    """
+    started = time.perf_counter()
+    profiler = start_profiler()
+    if profiler is None:
+        return await get_response(request)
+    try:
+        response = await get_response(request)
+    finally:
+        profiler.disable()
+    # Запись файлов — синхронная операция.
+    return await sync_to_async(finish_profile)(profiler, request, response, time.perf_counter() - started,
+                                               reason)
@@ -0,0 +1,175 @@
+"""
+Предрассчитанные продажи по дням (``SalesRollup``).
+
+Строки обновляются инкрементально при переходе заказа между «корзиной/отменой»
+и статусами оформленного заказа, полный пересчет выполняет
+``manage.py rebuild_sales_rollups``.
+
+Продажи относятся ко дню оформления (``Order.placed_at``) и товару магазина по
+внешнему ИД. При оформлении цены позиций фиксируются в ``OrderItem.price``, и
+отмена вычитает ровно ту выручку, что была добавлена. Заказы, оформленные до
+появления этих полей, учитываются по дате создания и текущей цене товара.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import ArchivedOrder, OrderItem, ProductInfo, SalesRollup
+
+SOLD_STATES = ('new', 'confirmed', 'assembled', 'sent', 'delivered')
+
+# NumPy необязателен и долго загружается, поэтому импортируется при первой агрегации.
+numpy = None
+_numpy_loaded = False
+
+
+def _load_numpy():
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy, _numpy_loaded = module, True
+    return numpy
+
+
+def order_state_changed(order_id, previous_state, state):
+    """Учитывает смену статуса заказа в продажах."""
+    if (previous_state in SOLD_STATES) == (state in SOLD_STATES):
+        return
+    apply_order(order_id, 1 if state in SOLD_STATES else -1)
+
+
+def sold_items(order_items):
+    """Позиции с магазином, внешним ИД товара, днем оформления, ценой и количеством."""
+    return order_items.annotate(
+        sold_at=Coalesce('order__placed_at', 'order__dt'),
+        sold_price=Coalesce('price', 'product_info__price'),
+    ).values_list('product_info__shop_id', 'product_info__external_id', 'sold_at', 'quantity', 'sold_price')
+
+
+def apply_order(order_id, sign):
+    """
+    Добавляет (``sign=1``) или вычитает (``sign=-1``) позиции заказа из продаж.
+    При добавлении фиксирует текущие цены позиций.
+    """
+    with transaction.atomic():
+        order_items = OrderItem.objects.filter(order_id=order_id)
+        if sign > 0:
+            order_items.update(price=Subquery(ProductInfo.objects.filter(
+                id=OuterRef('product_info_id')).values('price')[:1]))
+
+        totals = defaultdict(lambda: [0, 0])
+        for shop_id, external_id, sold_at, quantity, price in sold_items(order_items):
+            key = (shop_id, external_id, timezone.localdate(sold_at))
+            totals[key][0] += sign * quantity
+            totals[key][1] += sign * quantity * price
+        if not totals:
+            return
+
+        external_ids = {external_id for _, external_id, _ in totals}
+        days = {day for _, _, day in totals}
+        existing = {
+            (rollup.shop_id, rollup.external_id, rollup.day): rollup
+            for rollup in SalesRollup.objects.select_for_update().filter(external_id__in=external_ids,
+                                                                         day__in=days)
+        }
+        created = []
+        for key, (units, revenue) in totals.items():
+            if key in existing:
+                SalesRollup.objects.filter(id=existing[key].id).update(units=F('units') + units,
+                                                                       revenue=F('revenue') + revenue)
+            else:
+                shop_id, external_id, day = key
+                created.append(SalesRollup(shop_id=shop_id, external_id=external_id, day=day,
+                                           units=units, revenue=revenue))
+        SalesRollup.objects.bulk_create(created)
+
+
+def rebuild(batch_size=1000):
+    """Полный пересчет продаж по оформленным и архивным заказам."""
+    totals = defaultdict(lambda: [0, 0])
+    rows = sold_items(OrderItem.objects.filter(order__state__in=SOLD_STATES))
+    for shop_id, external_id, sold_at, quantity, price in rows.iterator(chunk_size=batch_size):
+        key = (shop_id, external_id, timezone.localdate(sold_at))
+        totals[key][0] += quantity
+        totals[key][1] += quantity * price
+
+    archived = ArchivedOrder.objects.filter(state__in=SOLD_STATES).values_list('dt', 'placed_at', 'items')
+    external_ids = None
+    for dt, placed_at, items in archived.iterator(chunk_size=batch_size):
+        day = timezone.localdate(placed_at or dt)
+        for item in items:
+            item = dict(zip(ArchivedOrder.ITEM_FIELDS, item))
+            external_id = item.get('external_id')
+            if external_id is None:
+                # В архивах, созданных до появления external_id в позициях, он берется из товара.
+                if external_ids is None:
+                    external_ids = dict(ProductInfo.objects.values_list('id', 'external_id'))
+                external_id = external_ids.get(item['product_info'])
+            if external_id is None:
+                continue
+            key = (item['shop'], external_id, day)
+            totals[key][0] += item['quantity']
+            totals[key][1] += item['quantity'] * item['price']
+
+    with transaction.atomic():
+        SalesRollup.objects.all().delete()
+        SalesRollup.objects.bulk_create(
+            [SalesRollup(shop_id=shop_id, external_id=external_id, day=day, units=units, revenue=revenue)
+             for (shop_id, external_id, day), (units, revenue) in totals.items()],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+def shop_sales(shop_id, date_from, date_to, period='day'):
+    """
+    Продажи магазина за период с группировкой по ``day``, ``week`` или ``month``.
+    Неделя и месяц агрегируются NumPy, если он установлен, иначе средствами БД.
+    """
+    rollups = SalesRollup.objects.filter(shop_id=shop_id, day__gte=date_from, day__lte=date_to)
+
+    if period == 'day':
+        rows = rollups.values_list('external_id', 'day', 'units', 'revenue').order_by('day', 'external_id')
+    elif _load_numpy() is not None:
+        rows = _aggregate_numpy(rollups.values_list('external_id', 'day', 'units', 'revenue'), period)
+    else:
+        trunc = TruncWeek if period == 'week' else TruncMonth
+        rows = rollups.annotate(period=trunc('day')).values_list('external_id', 'period').annotate(
+            units=Sum('units'), revenue=Sum('revenue')
+        ).order_by('period', 'external_id')
+
+    return [{'external_id': external_id, 'period': day, 'units': units, 'revenue': revenue}
+            for external_id, day, units, revenue in rows]
+
+
+def _aggregate_numpy(rows, period):
+    rows = list(rows)
+    if not rows:
+        return []
+    external_ids = numpy.array([row[0] for row in rows], dtype=numpy.int64)
+    days = numpy.array([row[1] for row in rows], dtype='datetime64[D]')
+    units = numpy.array([row[2] for row in rows], dtype=numpy.int64)
+    revenue = numpy.array([row[3] for row in rows], dtype=numpy.int64)
+
+    if period == 'week':
+        # 1970-01-01 — четверг, сдвигаем к понедельнику недели.
+        periods = days - (days.astype(numpy.int64) + 3) % 7
+    else:
+        periods = days.astype('datetime64[M]').astype('datetime64[D]')
+
+    keys = numpy.stack([periods.astype(numpy.int64), external_ids], axis=1)
+    unique_keys, inverse = numpy.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    units_total = numpy.zeros(len(unique_keys), dtype=numpy.int64)
+    revenue_total = numpy.zeros(len(unique_keys), dtype=numpy.int64)
+    numpy.add.at(units_total, inverse, units)
+    numpy.add.at(revenue_total, inverse, revenue)
+
+    return [(int(external_id), numpy.datetime64(int(day), 'D').item(), int(units), int(revenue))
+            for (day, external_id), units, revenue in zip(unique_keys, units_total, revenue_total)]
@@ -1,6 +1,8 @@
+from django.db.models import F
 from rest_framework import serializers
 
-from .models import User, Contact, OrderItem, Order, Shop, Category, Product, ProductInfo, ProductParameter
+from .models import User, Contact, OrderItem, Order, Shop, Category, Product, ProductInfo, ProductParameter, \
+    ArchivedOrder
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -28,7 +30,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ('id', 'product_info', 'quantity', 'order',)
         read_only_fields = ('id',)
         extra_kwargs = {
-            'order': {'write_only': True}
+            'order': {'write_only': True},
+            # В корзину добавляются только товары опубликованной версии каталога
+            'product_info': {'queryset': ProductInfo.objects.filter(version=F('shop__catalog_version'))},
         }
 
 
@@ -86,3 +90,13 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
         read_only_fields = ('id',)
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    ordered_items = serializers.ListField(child=serializers.DictField(), read_only=True)
+    contact = ContactSerializer(read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
+        read_only_fields = ('id',)
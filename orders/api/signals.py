@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import object_cache, rollups, webhooks
+from .authentication import AUTH_USER_CACHE_KEY, CachedTokenAuthentication
+from .models import Order, User, Shop, Product, ProductInfo, ProductParameter
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    """Запоминает статус заказа до сохранения и отмечает момент оформления."""
+    instance._previous_state = None
+    if instance.pk:
+        instance._previous_state = Order.objects.filter(pk=instance.pk).values_list('state', flat=True).first()
+    if instance.state in rollups.SOLD_STATES and instance._previous_state not in rollups.SOLD_STATES:
+        instance.placed_at = timezone.now()
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, **kwargs):
+    """Обновляет продажи по дням при смене статуса заказа."""
+    rollups.order_state_changed(instance.pk, getattr(instance, '_previous_state', None), instance.state)
+
+
+@receiver(post_save, sender=Order)
+def queue_order_webhooks(sender, instance, **kwargs):
+    """Ставит уведомления магазинам об измененном заказе."""
+    webhooks.order_changed(instance.pk, instance.state)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Удаленный токен (выход из системы) сразу перестает приниматься."""
+    CachedTokenAuthentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Смена пароля, ``is_active`` или других данных пользователя сбрасывает кэш его токенов."""
+    if not created:
+        CachedTokenAuthentication.invalidate(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+        cache.delete(AUTH_USER_CACHE_KEY.format(user_id=instance.pk))
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def invalidate_cached_shop(sender, instance, **kwargs):
+    object_cache.invalidate(object_cache.SHOP, instance.pk)
+
+
+# Удаление товаров и параметров без post_delete: иначе Django выбирает удаляемые
+# строки по одной вместо одного DELETE. Записи сбрасывает collect_garbage.
+@receiver(post_save, sender=ProductInfo)
+def invalidate_cached_product_info(sender, instance, **kwargs):
+    object_cache.invalidate(object_cache.PRODUCT_INFO, instance.pk)
+
+
+@receiver(post_save, sender=ProductParameter)
+def invalidate_cached_product_parameters(sender, instance, **kwargs):
+    object_cache.invalidate(object_cache.PRODUCT_INFO, instance.product_info_id)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_cached_product(sender, instance, created, **kwargs):
+    """Название товара входит в карточки всех его предложений."""
+    if not created:
+        object_cache.invalidate(object_cache.PRODUCT_INFO,
+                                *ProductInfo.objects.filter(product_id=instance.pk).values_list('id', flat=True))
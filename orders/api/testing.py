@@ -0,0 +1,70 @@
+"""
+Вспомогательные средства для тестов API.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Contact
+
+TEST_PASSWORD = 'Test-password-123'
+
+
+def create_user(email='buyer@example.com', type='buyer', **extra_fields):
+    """Активный пользователь с паролем ``TEST_PASSWORD``."""
+    extra_fields.setdefault('is_active', True)
+    return User.objects.create_user(email=email, password=TEST_PASSWORD, type=type, **extra_fields)
+
+
+def api_client(user=None):
+    """Клиент API, аутентифицированный токеном пользователя (если он задан)."""
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def create_contact(user):
+    return Contact.objects.create(user=user, city='Москва', street='Тверская', house='1', phone='+70000000000')
+
+
+def create_catalog(shop_user=None, goods=3, quantity=10, shop_name='Магазин', category_name='Категория'):
+    """Магазин с категорией и ``goods`` товарами; возвращает магазин и список ``ProductInfo``."""
+    shop = Shop.objects.create(name=shop_name, user=shop_user)
+    category = Category.objects.create(name=category_name)
+    category.shops.add(shop)
+    parameter, _ = Parameter.objects.get_or_create(name='Цвет')
+    product_infos = []
+    for number in range(goods):
+        product = Product.objects.create(name=f'{category_name} {number}', category=category)
+        product_info = ProductInfo.objects.create(product=product, shop=shop, external_id=number, model='m',
+                                                  price=100 + number, price_rrc=150, quantity=quantity)
+        ProductParameter.objects.create(product_info=product_info, parameter=parameter, value='черный')
+        product_infos.append(product_info)
+    return shop, product_infos
+
+
+class QueryCountAssertionsMixin:
+    """Примесь к ``TestCase`` для проверки отсутствия N+1 запросов."""
+
+    def assertConstantQueries(self, make_data, request, sizes=(1, 10)):
+        """
+        Доводит объем данных до каждого размера из ``sizes`` (``make_data(n)``
+        должна добавить ``n`` объектов) и выполняет ``request()``. Тест падает,
+        если число запросов к БД зависит от объема данных.
+        """
+        # Первый вызов прогревает кэши (токены, ограничение частоты).
+        request()
+        counts = {}
+        created = 0
+        for size in sorted(sizes):
+            make_data(size - created)
+            created = size
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            counts[size] = len(queries.captured_queries)
+        if len(set(counts.values())) > 1:
+            self.fail(f'Число запросов растет с объемом данных: {counts}')
+        return counts
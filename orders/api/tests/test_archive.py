@@ -0,0 +1,74 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api import async_views
+from api.archive import archive_orders
+from api.models import ArchivedOrder, Order, OrderItem
+from api.testing import api_client, create_catalog, create_contact, create_user
+
+
+class ArchiveRoundTripTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shop_user = create_user('shop@example.com', type='shop')
+        _, (self.first, self.second) = create_catalog(self.shop_user, goods=2)
+        self.buyer = create_user()
+        self.contact = create_contact(self.buyer)
+        now = timezone.now()
+
+        # Архивный заказ оказывается между двумя живыми по дате.
+        self.oldest = self.create_order('new', now - timedelta(days=30), self.first)
+        self.archived = self.create_order('delivered', now - timedelta(days=20), self.first, self.second, price=90)
+        self.newest = self.create_order('confirmed', now - timedelta(days=10), self.second)
+        self.create_order('basket', now, self.first)
+
+    def create_order(self, state, dt, *product_infos, price=None):
+        order = Order.objects.create(user=self.buyer, state=state, contact=self.contact)
+        Order.objects.filter(id=order.id).update(dt=dt)
+        OrderItem.objects.bulk_create(OrderItem(order=order, product_info=product_info, quantity=2, price=price)
+                                      for product_info in product_infos)
+        return order
+
+    def archive(self):
+        self.assertEqual(archive_orders(timezone.now() - timedelta(days=15)), 1)
+        self.assertFalse(Order.objects.filter(id=self.archived.id).exists())
+
+    def assertHistory(self, data):
+        self.assertEqual([order['id'] for order in data], [self.newest.id, self.archived.id, self.oldest.id])
+        archived = data[1]
+        self.assertEqual(archived['state'], 'delivered')
+        self.assertEqual(archived['total_sum'], 2 * 90 + 2 * 90)
+        self.assertEqual(archived['contact']['id'], self.contact.id)
+        self.assertEqual(sorted(item['product_info'] for item in archived['ordered_items']),
+                         [self.first.id, self.second.id])
+
+    def test_order_view(self):
+        self.archive()
+        client = api_client(self.buyer)
+
+        self.assertEqual([order['id'] for order in client.get('/api/v1/order').json()],
+                         [self.newest.id, self.oldest.id])
+        self.assertHistory(client.get('/api/v1/order', {'archive': 'true'}).json())
+
+    def test_partner_orders(self):
+        self.archive()
+
+        self.assertHistory(api_client(self.shop_user).get('/api/v1/partner/orders', {'archive': '1'}).json())
+        self.assertEqual(ArchivedOrder.objects.get().shops.get().user, self.shop_user)
+
+    def test_async_order_view(self):
+        self.archive()
+        token, _ = Token.objects.get_or_create(user=self.buyer)
+        request = AsyncRequestFactory().get('/api/v1/order', {'archive': 'true'},
+                                            headers={'Authorization': f'Token {token.key}'})
+
+        response = async_to_sync(async_views.order)(request)
+
+        self.assertHistory(json.loads(response.content))
@@ -0,0 +1,35 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api import async_views
+from api.models import ArchivedOrder, Order, OrderItem
+from api.testing import api_client, create_catalog, create_contact, create_user
+
+
+class AsyncOrderViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        _, (product_info,) = create_catalog(goods=1)
+        order = Order.objects.create(user=self.user, state='new', contact=create_contact(self.user))
+        OrderItem.objects.create(order=order, product_info=product_info, quantity=2)
+        ArchivedOrder.objects.create(id=order.id + 100, user=self.user, dt=timezone.now(), state='delivered',
+                                     total_sum=10, items=[[product_info.id, 1, 'Товар', 'Категория', 'm', 5, 2, 0]])
+        self.client = api_client(self.user)
+        self.token = Token.objects.get(user=self.user).key
+
+    def get_async(self, query=''):
+        request = AsyncRequestFactory().get(f'/api/v1/order{query}', headers={'Authorization': f'Token {self.token}'})
+        return json.loads(async_to_sync(async_views.order)(request).content)
+
+    def test_matches_sync_view(self):
+        for query in ('', '?archive=true'):
+            with self.subTest(query=query):
+                self.assertEqual(self.get_async(query), self.client.get(f'/api/v1/order{query}').json())
+        self.assertEqual(len(self.get_async('?archive=true')), 2)
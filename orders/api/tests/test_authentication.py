@@ -0,0 +1,149 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from api import authentication
+from api.authentication import AUTH_TOKEN_CACHE_KEY, CachedTokenAuthentication
+from api.testing import TEST_PASSWORD, api_client, create_user
+
+
+@override_settings(AUTH_TOKEN_CACHE_ENABLED=True)
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        CachedTokenAuthentication.local_cache.clear()
+        for counter in CachedTokenAuthentication.counters:
+            CachedTokenAuthentication.counters[counter] = 0
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def counters(self):
+        return {counter: CachedTokenAuthentication.counters[counter]
+                for counter in ('local_hits', 'cache_hits', 'misses')}
+
+    def test_hits(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(), (self.user, self.token))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate()[0], self.user)
+            # Другой процесс: локального кэша нет, запись берется из общего.
+            CachedTokenAuthentication.local_cache.clear()
+            self.assertEqual(self.authenticate()[0], self.user)
+
+        self.assertEqual(self.counters(), {'local_hits': 1, 'cache_hits': 1, 'misses': 1})
+
+    def test_logout(self):
+        self.authenticate()
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.assertIsNone(cache.get(AUTH_TOKEN_CACHE_KEY.format(key=self.token.key)))
+
+    def test_deactivated_user(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaisesMessage(AuthenticationFailed, 'User inactive or deleted.'):
+            self.authenticate()
+
+    def test_request(self):
+        client = api_client(self.user)
+        self.assertEqual(client.get('/api/v1/user/details').status_code, 200)
+        self.token.delete()
+        self.assertEqual(client.get('/api/v1/user/details').status_code, 401)
+
+    @override_settings(AUTH_TOKEN_CACHE_ENABLED=False)
+    def test_without_shared_cache(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.authenticate(), (self.user, self.token))
+
+        self.assertEqual(self.counters(), {'local_hits': 0, 'cache_hits': 0, 'misses': 0})
+        self.assertIsNone(cache.get(AUTH_TOKEN_CACHE_KEY.format(key=self.token.key)))
+
+
+@override_settings(SIGNED_TOKENS_ENABLED=True, SIGNED_TOKEN_ACCESS_TTL=60, SIGNED_TOKEN_REFRESH_TTL=600)
+class SignedTokenTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/api/v1/user/login', {'email': self.user.email, 'password': TEST_PASSWORD,
+                                                       'token_type': 'signed'}).json()
+
+    def details(self, access):
+        return self.client.get('/api/v1/user/details', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def refresh(self, refresh):
+        return self.client.post('/api/v1/user/token/refresh', {'refresh': refresh})
+
+    def revoke(self, token):
+        return self.client.post('/api/v1/user/token/revoke', {'token': token})
+
+    def test_issue_and_refresh(self):
+        tokens = self.login()
+
+        self.assertEqual(self.details(tokens['Access']).json()['email'], self.user.email)
+        access = self.refresh(tokens['Refresh']).json()['Access']
+        self.assertEqual(self.details(access).status_code, 200)
+        # Токены разных типов не взаимозаменяемы.
+        self.assertEqual(self.details(tokens['Refresh']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['Access']).status_code, 403)
+
+    def test_revoke(self):
+        tokens = self.login()
+
+        self.assertEqual(self.revoke(tokens['Access']).json(), {'Status': True})
+        self.assertEqual(self.details(tokens['Access']).status_code, 401)
+        self.assertEqual(self.revoke(tokens['Refresh']).json(), {'Status': True})
+        self.assertEqual(self.refresh(tokens['Refresh']).status_code, 403)
+        self.assertEqual(self.revoke('garbage').status_code, 403)
+
+    def test_expiry(self):
+        tokens = self.login()
+        now = authentication.time.time()
+
+        with mock.patch.object(authentication.time, 'time', return_value=now + 61):
+            self.assertEqual(self.details(tokens['Access']).json(), {'detail': 'Token expired.'})
+            self.assertEqual(self.refresh(tokens['Refresh']).status_code, 200)
+        with mock.patch.object(authentication.time, 'time', return_value=now + 601):
+            self.assertEqual(self.refresh(tokens['Refresh']).status_code, 403)
+
+    def test_password_change_invalidates_tokens(self):
+        tokens = self.login()
+        self.assertEqual(self.details(tokens['Access']).status_code, 200)
+
+        self.user.set_password('Other-password-456')
+        self.user.save()
+
+        self.assertEqual(self.details(tokens['Access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['Refresh']).status_code, 403)
+
+    def test_deactivated_user(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.details(tokens['Access']).json(), {'detail': 'User inactive or deleted.'})
+
+    @override_settings(SIGNED_TOKENS_ENABLED=False)
+    def test_disabled_without_shared_cache(self):
+        self.assertEqual(self.login(), {'Status': False, 'Errors': 'Подписанные токены недоступны'})
+        with override_settings(SIGNED_TOKENS_ENABLED=True):
+            tokens = self.login()
+
+        self.assertEqual(self.details(tokens['Access']).json(), {'detail': 'Signed tokens are disabled.'})
+        self.assertEqual(self.refresh(tokens['Refresh']).status_code, 403)
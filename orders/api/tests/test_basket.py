@@ -0,0 +1,219 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.basket import CachedBasket, flush_basket, writer
+from api.models import Order, OrderItem
+from api.testing import QueryCountAssertionsMixin, api_client, create_catalog, create_contact, create_user
+
+
+class BasketUpdateTests(QueryCountAssertionsMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = api_client(self.user)
+        self.basket = Order.objects.create(user=self.user, state='basket')
+        self.shops = 0
+
+    def fill_basket(self, goods):
+        self.shops += 1
+        _, product_infos = create_catalog(goods=goods, quantity=5, shop_name=f'Магазин {self.shops}',
+                                          category_name=f'Категория {self.shops}')
+        return OrderItem.objects.bulk_create(OrderItem(order=self.basket, product_info=product_info, quantity=1)
+                                             for product_info in product_infos)
+
+    def put(self, items):
+        return self.client.put('/api/v1/basket', {'items': json.dumps(items)})
+
+    def quantities(self):
+        return dict(OrderItem.objects.values_list('id', 'quantity'))
+
+    def test_update_and_errors(self):
+        first, second, third = self.fill_basket(3)
+        foreign = Order.objects.create(user=create_user('other@example.com'), state='basket')
+        foreign_item = OrderItem.objects.create(order=foreign, product_info=first.product_info, quantity=1)
+
+        response = self.put([
+            {'id': first.id, 'quantity': 5},
+            # Больше остатка.
+            {'id': second.id, 'quantity': 6},
+            {'id': third.id, 'quantity': 0},
+            # Чужая позиция и несуществующая.
+            {'id': foreign_item.id, 'quantity': 2},
+            {'id': 999999, 'quantity': 2},
+            {'quantity': 2},
+        ]).json()
+
+        self.assertEqual(response, {
+            'Status': True,
+            'Объектов обновлено': 1,
+            'Обновлены': [first.id],
+            'Errors': {str(second.id): 'Недостаточно товара',
+                       str(third.id): 'Неверное количество',
+                       str(foreign_item.id): 'Позиция не найдена',
+                       '999999': 'Позиция не найдена'},
+        })
+        self.assertEqual(self.quantities(), {first.id: 5, second.id: 1, third.id: 1, foreign_item.id: 1})
+
+    def test_no_errors_key_when_everything_updated(self):
+        first, second = self.fill_basket(2)
+
+        response = self.put([{'id': first.id, 'quantity': 2}, {'id': second.id, 'quantity': 3}]).json()
+
+        self.assertEqual(response, {'Status': True, 'Объектов обновлено': 2, 'Обновлены': [first.id, second.id]})
+
+    def test_constant_queries(self):
+        def request():
+            items = [{'id': order_item_id, 'quantity': 2} for order_item_id in self.quantities()]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.put(items)
+            self.assertEqual(response.json()['Объектов обновлено'], len(items))
+            # Позиции с остатком читаются одним SELECT и обновляются одним UPDATE ... CASE.
+            item_queries = [query['sql'] for query in queries.captured_queries if 'api_orderitem' in query['sql']]
+            if items:
+                self.assertEqual(len(item_queries), 2, item_queries)
+                self.assertIn('CASE', item_queries[1])
+
+        self.assertConstantQueries(self.fill_basket, request)
+
+
+@override_settings(BASKET_CACHE_ENABLED=True, BASKET_FLUSH_DELAY=0)
+class CachedBasketTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = api_client(self.user)
+        _, self.product_infos = create_catalog(quantity=5)
+
+    def add(self, *product_infos, quantity=1):
+        items = [{'product_info': product_info.id, 'quantity': quantity} for product_info in product_infos]
+        return self.client.post('/api/v1/basket', {'items': json.dumps(items)}).json()
+
+    def basket(self):
+        return self.client.get('/api/v1/basket').json()[0]
+
+    def order_items(self):
+        return dict(OrderItem.objects.filter(order__user=self.user).values_list('product_info_id', 'quantity'))
+
+    def item_ids(self):
+        """``id`` позиций корзины по ``id`` товара."""
+        return dict(OrderItem.objects.filter(order__user=self.user).values_list('product_info_id', 'id'))
+
+    def test_add(self):
+        first, second, _ = self.product_infos
+        self.assertEqual(self.add(first, second, quantity=2), {'Status': True, 'Объектов создано': 2})
+
+        basket = self.basket()
+        item_ids = self.item_ids()
+        self.assertEqual({item['id']: item['quantity'] for item in basket['ordered_items']},
+                         {item_ids[first.id]: 2, item_ids[second.id]: 2})
+        self.assertEqual(basket['total_sum'], 2 * first.price + 2 * second.price)
+        self.assertEqual(self.order_items(), {first.id: 2, second.id: 2})
+
+    def test_add_rejects_duplicates_and_unknown_items(self):
+        first = self.product_infos[0]
+        self.add(first)
+        self.assertFalse(self.add(first)['Status'])
+        response = self.client.post('/api/v1/basket',
+                                    {'items': json.dumps([{'product_info': 999999, 'quantity': 1}])}).json()
+        self.assertFalse(response['Status'])
+        self.assertEqual(self.order_items(), {first.id: 1})
+
+    def test_update(self):
+        first, second, _ = self.product_infos
+        self.add(first, second)
+        item_ids = self.item_ids()
+        response = self.client.put('/api/v1/basket', {'items': json.dumps([
+            {'id': item_ids[first.id], 'quantity': 3},
+            # Больше остатка — не обновляется.
+            {'id': item_ids[second.id], 'quantity': 50},
+        ])}).json()
+
+        self.assertEqual(response['Обновлены'], [item_ids[first.id]])
+        self.assertEqual(response['Errors'], {str(item_ids[second.id]): 'Недостаточно товара'})
+        self.assertEqual(self.order_items(), {first.id: 3, second.id: 1})
+
+    def test_delete(self):
+        first, second, third = self.product_infos
+        self.add(first, second, third)
+        item_ids = self.item_ids()
+        response = self.client.delete('/api/v1/basket', {'items': f'{item_ids[first.id]},{item_ids[third.id]},x'}).json()
+
+        self.assertEqual(response['Объектов удалено'], 2)
+        self.assertEqual([item['id'] for item in self.basket()['ordered_items']], [item_ids[second.id]])
+        self.assertEqual(self.order_items(), {second.id: 1})
+
+    def test_same_representation_as_database_basket(self):
+        first, second, _ = self.product_infos
+        self.add(first, second, quantity=2)
+        cached = self.basket()
+
+        with override_settings(BASKET_CACHE_ENABLED=False):
+            self.assertEqual(self.basket(), cached)
+
+    def test_write_behind_flush(self):
+        first = self.product_infos[0]
+        self.add(first)
+        with override_settings(BASKET_FLUSH_DELAY=5), mock.patch.object(writer, '_run'):
+            self.client.put('/api/v1/basket', {'items': json.dumps([{'id': self.item_ids()[first.id],
+                                                                     'quantity': 2}])})
+            # До сброса изменения есть только в кэше.
+            self.assertEqual(self.order_items(), {first.id: 1})
+            self.assertEqual(self.basket()['ordered_items'][0]['quantity'], 2)
+
+            writer.flush()
+        self.assertEqual(self.order_items(), {first.id: 2})
+
+    def test_readd_after_pending_delete(self):
+        first = self.product_infos[0]
+        self.add(first)
+        with override_settings(BASKET_FLUSH_DELAY=5), mock.patch.object(writer, '_run'):
+            self.client.delete('/api/v1/basket', {'items': str(self.item_ids()[first.id])})
+            # Удаление еще не записано в БД, повторное добавление не должно упасть на уникальности.
+            self.assertEqual(self.add(first, quantity=3), {'Status': True, 'Объектов создано': 1})
+
+        self.assertEqual(self.order_items(), {first.id: 3})
+        self.assertEqual([item['id'] for item in self.basket()['ordered_items']], [self.item_ids()[first.id]])
+
+    def test_checkout(self):
+        first = self.product_infos[0]
+        with override_settings(BASKET_FLUSH_DELAY=5), mock.patch.object(writer, '_run'):
+            self.add(first, quantity=2)
+            order_id = self.basket()['id']
+            response = self.client.post('/api/v1/order', {'id': str(order_id),
+                                                          'contact': create_contact(self.user).id})
+            writer.flush()
+
+        self.assertEqual(response.json(), {'Status': True})
+        self.assertEqual(Order.objects.get(id=order_id).state, 'new')
+        # Корзина сброшена в БД синхронно перед оформлением, запись в кэше удалена.
+        self.assertEqual(self.order_items(), {first.id: 2})
+        self.assertIsNone(cache.get(CachedBasket.cache_key(self.user.id)))
+        self.assertNotEqual(self.basket()['id'], order_id)
+
+    def test_stale_entry_does_not_change_placed_order(self):
+        first, second, _ = self.product_infos
+        self.add(first)
+        basket = CachedBasket.load(self.user.id)
+        Order.objects.filter(id=basket.order_id).update(state='new')
+
+        # Запись в кэше пережила оформление и получила новое количество.
+        basket.update([{'id': self.item_ids()[first.id], 'quantity': 2}])
+        basket.save(persist=False)
+
+        with self.assertLogs('api.basket', 'WARNING'):
+            self.assertFalse(flush_basket(self.user.id))
+        self.assertEqual(self.order_items(), {first.id: 1})
+        self.assertIsNone(cache.get(CachedBasket.cache_key(self.user.id)))
+
+        # Добавление в устаревшую запись тоже не пишет в оформленный заказ.
+        basket.save(persist=False)
+        with self.assertLogs('api.basket', 'WARNING'):
+            self.assertIsInstance(basket.add([{'product_info': second.id, 'quantity': 1}]), str)
+        self.assertEqual(self.order_items(), {first.id: 1})
@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.models import Contact, OrderItem
+from api.testing import api_client, create_catalog, create_contact, create_user
+from api.views import AccountDetails
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = api_client(self.user)
+
+    def batch(self, *operations, atomic=False):
+        return self.client.post('/api/v1/batch', {'requests': list(operations), 'atomic': atomic},
+                                format='json').json()
+
+    def test_body_is_passed_as_form_data(self):
+        contact = create_contact(self.user)
+        _, (product_info,) = create_catalog(goods=1)
+
+        response = self.batch(
+            {'method': 'POST', 'path': 'user/contact', 'body': {'city': 'Тула', 'street': 'Ленина', 'phone': '1'}},
+            {'method': 'PUT', 'path': 'user/contact', 'body': {'id': contact.id, 'house': '5'}},
+            {'method': 'POST', 'path': 'basket', 'body': {'items': [{'product_info': product_info.id, 'quantity': 2}]}},
+        )
+
+        self.assertEqual([result['status'] for result in response['responses']], [201, 200, 200])
+        self.assertTrue(response['Status'])
+        self.assertEqual(Contact.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Contact.objects.get(id=contact.id).house, '5')
+        self.assertEqual(list(OrderItem.objects.values_list('product_info_id', 'quantity')), [(product_info.id, 2)])
+
+    def test_exception_in_view(self):
+        with mock.patch.object(AccountDetails, 'get', side_effect=RuntimeError), \
+                self.assertLogs('api.batch', 'ERROR'):
+            response = self.batch(
+                {'method': 'GET', 'path': 'user/details'},
+                {'method': 'GET', 'path': 'user/contact'},
+            )
+
+        self.assertEqual(response['responses'][0], {'status': 500, 'body': {'Status': False,
+                                                                             'Errors': 'Внутренняя ошибка сервера'}})
+        self.assertEqual(response['responses'][1]['status'], 200)
+
+    def test_exception_rolls_back_atomic_batch(self):
+        with mock.patch.object(AccountDetails, 'get', side_effect=RuntimeError), \
+                self.assertLogs('api.batch', 'ERROR'):
+            response = self.batch(
+                {'method': 'POST', 'path': 'user/contact', 'body': {'city': 'Тула', 'street': 'Ленина', 'phone': '1'}},
+                {'method': 'GET', 'path': 'user/details'},
+                atomic=True,
+            )
+
+        self.assertFalse(response['Status'])
+        self.assertEqual([result['status'] for result in response['responses']], [201, 500])
+        self.assertFalse(Contact.objects.exists())
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models.deletion import Collector
+from django.test import TestCase
+
+from api import object_cache
+from api.catalog import collect_garbage, import_catalog, stage_catalog
+from api.models import Order, OrderItem, ProductInfo, ProductParameter
+from api.testing import create_user
+
+
+def catalog_file(*external_ids):
+    return {'shop': 'Магазин', 'categories': [{'id': 1, 'name': 'Категория'}],
+            'goods': [{'id': external_id, 'category': 1, 'name': f'Товар {external_id}', 'model': 'm',
+                       'price': 100, 'price_rrc': 120, 'quantity': 10, 'parameters': {'Цвет': 'черный'}}
+                      for external_id in external_ids]}
+
+
+class CatalogVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shop_user = create_user('shop@example.com', type='shop')
+        self.buyer = create_user()
+
+    def offer(self, shop, external_id):
+        return ProductInfo.objects.get(shop=shop, external_id=external_id, version=shop.catalog_version)
+
+    def test_garbage_collection_keeps_ordered_offers(self):
+        shop = import_catalog(self.shop_user.id, catalog_file(1, 2, 3))
+        basket = Order.objects.create(user=self.buyer, state='basket')
+        OrderItem.objects.create(order=basket, product_info=self.offer(shop, 1), quantity=1)
+        placed = Order.objects.create(user=self.buyer, state='basket')
+        OrderItem.objects.create(order=placed, product_info=self.offer(shop, 2), quantity=1)
+        placed.state = 'new'
+        placed.save()
+        old_ids = set(ProductInfo.objects.filter(shop=shop).values_list('id', flat=True))
+
+        shop = import_catalog(self.shop_user.id, catalog_file(1, 2, 3))
+
+        self.assertEqual(collect_garbage(), 1)
+        # Остались позиции корзины и оформленного заказа, третий товар прежней версии удален.
+        self.assertEqual(set(ProductInfo.objects.filter(shop=shop, version__lt=shop.catalog_version).values_list(
+            'external_id', flat=True)), {1, 2})
+        self.assertEqual(OrderItem.objects.filter(product_info_id__in=old_ids).count(), 2)
+
+    def test_garbage_collection_invalidates_cache_in_bulk(self):
+        shop = import_catalog(self.shop_user.id, catalog_file(1, 2))
+        old_ids = list(ProductInfo.objects.filter(shop=shop).values_list('id', flat=True))
+        versions = [object_cache.current_version(object_cache.PRODUCT_INFO, pk) for pk in old_ids]
+        import_catalog(self.shop_user.id, catalog_file(1, 2))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(collect_garbage(), 2)
+
+        self.assertEqual(len(callbacks), 1)
+        for pk, version in zip(old_ids, versions):
+            self.assertNotEqual(object_cache.current_version(object_cache.PRODUCT_INFO, pk), version)
+        # Без обработчиков post_delete параметры удаляются одним DELETE, без выборки строк.
+        self.assertTrue(Collector(using='default').can_fast_delete(ProductParameter.objects.all()))
+
+    def test_failed_staging_leaves_no_rows(self):
+        shop = import_catalog(self.shop_user.id, catalog_file(1))
+        with mock.patch.object(ProductParameter.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            stage_catalog(shop, catalog_file(1, 2)['goods'])
+
+        self.assertEqual(list(ProductInfo.objects.values_list('external_id', 'version')), [(1, 1)])
+        self.assertEqual(stage_catalog(shop, catalog_file(1, 2)['goods']), 2)
@@ -0,0 +1,82 @@
+import copy
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connections
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from api import async_views
+from api.db_router import ReplicaRouter, is_sticky, mark_sticky, replica_reads_enabled
+from api.models import Category, Order
+from api.testing import api_client, create_catalog, create_contact, create_user
+
+
+# Вторая БД SQLite под псевдонимом replica: схема та же (таблицы создаются по моделям,
+# без миграций), данных нет, поэтому запрос, ушедший на реплику, видно по пустому ответу.
+# Псевдоним добавляется при импорте модуля, до того как запускающий тесты создаст тестовые БД.
+if 'replica' not in connections.settings:
+    connections.settings['replica'] = copy.deepcopy(connections.settings['default'])
+    connections.settings['replica']['TEST']['MIGRATE'] = False
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = api_client(self.user)
+        create_catalog()
+        self.order = Order.objects.create(user=self.user, state='new', contact=create_contact(self.user))
+
+    def order_ids(self):
+        return [order['id'] for order in self.client.get('/api/v1/order').json()]
+
+    def test_router(self):
+        router = ReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Category), 'default')
+        with replica_reads_enabled():
+            self.assertEqual(router.db_for_read(Category), 'replica')
+            self.assertEqual(router.db_for_write(Category), 'default')
+            self.assertFalse(Category.objects.exists())
+        self.assertTrue(Category.objects.exists())
+        self.assertFalse(router.allow_migrate('replica', 'api'))
+        self.assertTrue(router.allow_migrate('default', 'api'))
+
+        with override_settings(DATABASE_REPLICAS=[]), replica_reads_enabled():
+            self.assertEqual(router.db_for_read(Category), 'default')
+
+    def test_views_read_from_replica(self):
+        self.assertEqual(self.client.get('/api/v1/categories').json()['count'], 0)
+        self.assertEqual(self.client.get('/api/v1/products/').json()['count'], 0)
+        self.assertEqual(self.order_ids(), [])
+        # Представления без ReplicaReadMixin читают основную БД.
+        self.assertEqual(self.client.get('/api/v1/user/details').json()['email'], self.user.email)
+
+    def test_sticky_after_write(self):
+        response = self.client.post('/api/v1/user/contact', {'city': 'Тула', 'street': 'Ленина', 'phone': '1'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(is_sticky(self.user))
+        self.assertEqual(self.order_ids(), [self.order.id])
+        # Анонимные запросы по-прежнему идут на реплику.
+        self.assertEqual(api_client().get('/api/v1/categories').json()['count'], 0)
+
+    def test_async_views(self):
+        token, _ = Token.objects.get_or_create(user=self.user)
+        headers = {'Authorization': f'Token {token.key}'}
+
+        def get(view, path):
+            request = AsyncRequestFactory().get(path, headers=headers)
+            return json.loads(async_to_sync(view)(request).content)
+
+        self.assertEqual(get(async_views.order, '/api/v1/order'), [])
+        self.assertEqual(get(async_views.products, '/api/v1/products/')['count'], 0)
+
+        mark_sticky(self.user)
+        self.assertEqual([order['id'] for order in get(async_views.order, '/api/v1/order')], [self.order.id])
+        self.assertEqual(get(async_views.products, '/api/v1/products/')['count'], 3)
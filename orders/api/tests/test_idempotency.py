@@ -0,0 +1,83 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from api import idempotency
+from api.idempotency import IDEMPOTENCY_HEADER
+from api.models import IdempotencyKey, OrderItem
+from api.testing import api_client, create_catalog, create_user
+
+
+class IdempotencyKeyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = api_client(self.user)
+        _, self.product_infos = create_catalog()
+
+    def add(self, product_info, key='key-1'):
+        items = json.dumps([{'product_info': product_info.id, 'quantity': 1}])
+        return self.client.post('/api/v1/basket', {'items': items}, headers={IDEMPOTENCY_HEADER: key})
+
+    def pending_key(self, product_info, started_at):
+        """Ключ, оставленный запросом, воркер которого упал до записи ответа."""
+        self.add(product_info)
+        OrderItem.objects.all().delete()
+        IdempotencyKey.objects.update(status_code=None, response=None, started_at=started_at)
+
+    def test_replay_returns_stored_response(self):
+        first = self.add(self.product_infos[0])
+        second = self.add(self.product_infos[0])
+
+        self.assertEqual(first.json(), {'Status': True, 'Объектов создано': 1})
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+    def test_same_key_other_body(self):
+        self.add(self.product_infos[0])
+        self.assertEqual(self.add(self.product_infos[1]).status_code, 422)
+
+    def test_request_in_progress(self):
+        self.pending_key(self.product_infos[0], timezone.now())
+
+        self.assertEqual(self.add(self.product_infos[0]).status_code, 409)
+        self.assertEqual(OrderItem.objects.count(), 0)
+
+    def test_abandoned_request_is_taken_over(self):
+        self.pending_key(self.product_infos[0], timezone.now() - timedelta(hours=1))
+
+        response = self.add(self.product_infos[0])
+
+        self.assertEqual(response.json(), {'Status': True, 'Объектов создано': 1})
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+        self.assertEqual(self.add(self.product_infos[0]).json(), response.json())
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+    def test_crash_before_storing_response_rolls_back_request(self):
+        with mock.patch.object(idempotency, 'response_data', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.add(self.product_infos[0])
+
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.add(self.product_infos[0]).json(), {'Status': True, 'Объектов создано': 1})
+
+    def test_key_taken_over_during_request(self):
+        response_data = idempotency.response_data
+
+        def taken_over(response):
+            # Повтор забрал ключ, пока выполнялся первый запрос.
+            IdempotencyKey.objects.update(started_at=timezone.now() + timedelta(seconds=1))
+            return response_data(response)
+
+        with mock.patch.object(idempotency, 'response_data', side_effect=taken_over):
+            response = self.add(self.product_infos[0])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertIsNone(IdempotencyKey.objects.get().status_code)
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from api import metrics
+from api.metrics import Registry, collect, render_prometheus, snapshot_path
+
+
+def sample(output, prefix):
+    return [line.split(' ')[-1] for line in output.splitlines() if line.startswith(prefix)]
+
+
+class RenderPrometheusTests(SimpleTestCase):
+
+    def render(self, registry):
+        return render_prometheus([registry.snapshot()])
+
+    def test_values_keep_precision(self):
+        registry = Registry()
+        registry.inc('http_requests_total', (('route', 'a'),), 3)
+        registry.inc('catalog_import_items_total', (), 1234567)
+        registry.observe('http_request_duration_seconds', (), 0.1)
+        registry.observe('http_request_duration_seconds', (), 0.2)
+        output = self.render(registry)
+
+        self.assertEqual(sample(output, 'http_requests_total{'), ['3'])
+        # С форматом :g было бы 1.23457e+06.
+        self.assertEqual(sample(output, 'catalog_import_items_total'), ['1234567'])
+        self.assertEqual(sample(output, 'http_request_duration_seconds_sum'), [repr(0.1 + 0.2)])
+        self.assertEqual(sample(output, 'http_request_duration_seconds_count'), ['2'])
+
+
+class SnapshotFilesTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(METRICS_DIR=self.directory, METRICS_STALE_AFTER=60))
+
+    def requests_total(self, route):
+        return sample(render_prometheus(collect()), f'http_requests_total{{route="{route}"}}')
+
+    def test_snapshot_name_is_unique_per_process(self):
+        self.assertRegex(os.path.basename(snapshot_path()), rf'^metrics-{os.getpid()}-[0-9a-f]+\.json$')
+
+    def test_retired_process_keeps_counters(self):
+        registry = Registry()
+        registry.inc('http_requests_total', (('route', 'retired'),), 2)
+        registry.flush(force=True)
+        registry.retire()
+
+        self.assertEqual(sorted(os.listdir(self.directory)), ['metrics-retired.json', 'metrics.lock'])
+        self.assertEqual(self.requests_total('retired'), ['2'])
+
+    def test_snapshot_of_killed_process_is_retired(self):
+        process = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                                 capture_output=True, text=True, check=True)
+        path = os.path.join(self.directory, f'metrics-{process.stdout.strip()}-abcd.json')
+        registry = Registry()
+        registry.inc('http_requests_total', (('route', 'killed'),), 5)
+        metrics.write_snapshot(registry.snapshot(), path)
+
+        # Свежий снимок мог быть записан только что: он пока учитывается как есть.
+        self.assertEqual(self.requests_total('killed'), ['5'])
+        self.assertTrue(os.path.exists(path))
+
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        self.assertEqual(self.requests_total('killed'), ['5'])
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.requests_total('killed'), ['5'])
@@ -0,0 +1,91 @@
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from api.db_router import is_sticky, replica_reads
+from api.middleware import MetricsMiddleware, ProfilingMiddleware, QueryInstrumentationMiddleware, \
+    ReplicaStickinessMiddleware
+from api.models import Category, Order, OrderItem
+from api.testing import QueryCountAssertionsMixin, api_client, create_catalog, create_user
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaStickinessMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+
+    def request(self, method):
+        request = getattr(RequestFactory(), method)('/api/v1/basket')
+        request.user = self.user
+        return request
+
+    def test_sync_chain(self):
+        middleware = ReplicaStickinessMiddleware(lambda request: HttpResponse())
+
+        middleware(self.request('get'))
+        self.assertFalse(is_sticky(self.user))
+        middleware(self.request('post'))
+        self.assertTrue(is_sticky(self.user))
+
+    def test_async_chain(self):
+        seen = []
+
+        async def view(request):
+            seen.append(replica_reads.get())
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        # Переменная контекста доходит до представления без перехода в поток.
+        token = replica_reads.set(True)
+        try:
+            async_to_sync(middleware)(self.request('post'))
+        finally:
+            replica_reads.reset(token)
+
+        self.assertEqual(seen, [True])
+        self.assertTrue(is_sticky(self.user))
+
+
+class QueryBudgetTests(QueryCountAssertionsMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = api_client(self.user)
+        self.shops = 0
+
+    def add_shop(self, goods):
+        self.shops += 1
+        return create_catalog(goods=goods, shop_name=f'Магазин {self.shops}', category_name=f'Категория {self.shops}')
+
+    def test_products(self):
+        self.assertConstantQueries(self.add_shop, lambda: self.client.get('/api/v1/products/'))
+
+    def test_basket(self):
+        def add_to_basket(goods):
+            basket, _ = Order.objects.get_or_create(user=self.user, state='basket')
+            _, product_infos = self.add_shop(goods)
+            OrderItem.objects.bulk_create(OrderItem(order=basket, product_info=product_info, quantity=1)
+                                          for product_info in product_infos)
+
+        self.assertConstantQueries(add_to_basket, lambda: self.client.get('/api/v1/basket'))
+
+
+class AsyncChainTests(TestCase):
+
+    def test_instrumentation_sees_async_orm_queries(self):
+        async def view(request):
+            await Category.objects.acount()
+            return HttpResponse()
+
+        chain = MetricsMiddleware(ProfilingMiddleware(QueryInstrumentationMiddleware(view)))
+        self.assertTrue(iscoroutinefunction(chain))
+
+        response = async_to_sync(chain)(RequestFactory().get('/api/v1/categories'))
+
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
@@ -0,0 +1,118 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from api import object_cache
+from api.object_cache import OBJECT_CACHE_KEY, PRODUCT_INFO, SHOP, current_version, read_through
+from api.testing import api_client, create_catalog
+
+
+class ReadThroughTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, pk):
+        self.calls.append(pk)
+        return {'id': pk}
+
+    def lock_key(self, pk):
+        return OBJECT_CACHE_KEY.format(kind=SHOP, pk=pk, version=current_version(SHOP, pk)) + ':lock'
+
+    def test_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_compute(pk):
+            started.set()
+            release.wait(5)
+            return self.compute(pk)
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(read_through(SHOP, 1, slow_compute)))
+        first.start()
+        started.wait(5)
+
+        # Пока первый запрос держит блокировку, второй ждет его записи, а не считает сам.
+        sleep = mock.patch('api.object_cache.time.sleep', side_effect=lambda seconds: release.set())
+        with sleep:
+            results.append(read_through(SHOP, 1, self.compute))
+        first.join(5)
+
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(results, [{'id': 1}, {'id': 1}])
+        self.assertIsNone(cache.get(self.lock_key(1)))
+        self.assertEqual(read_through(SHOP, 1, self.compute), {'id': 1})
+        self.assertEqual(self.calls, [1])
+
+    @override_settings(OBJECT_CACHE_LOCK_TIMEOUT=0.05, OBJECT_CACHE_WAIT_INTERVAL=0.01)
+    def test_lock_holder_never_finishes(self):
+        cache.add(self.lock_key(1), 1, 60)
+
+        self.assertEqual(read_through(SHOP, 1, self.compute), {'id': 1})
+        self.assertEqual(self.calls, [1])
+        # Чужая блокировка не снимается.
+        self.assertIsNotNone(cache.get(self.lock_key(1)))
+
+    def test_missing_object_is_cached(self):
+        for _ in range(2):
+            self.assertIsNone(read_through(SHOP, 1, lambda pk: self.calls.append(pk)))
+        self.assertEqual(self.calls, [1])
+
+    def test_lock_released_on_error(self):
+        with self.assertRaises(ZeroDivisionError):
+            read_through(SHOP, 1, lambda pk: 1 / 0)
+
+        self.assertIsNone(cache.get(self.lock_key(1)))
+
+
+@override_settings(OBJECT_CACHE_ENABLED=True)
+class InvalidationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shop, (self.product_info,) = create_catalog(goods=1)
+        self.client = api_client()
+
+    def price(self):
+        return self.client.get(f'/api/v1/products/{self.product_info.id}/').json()['price']
+
+    def test_new_version_after_commit(self):
+        self.assertEqual(self.price(), 100)
+        version = current_version(PRODUCT_INFO, self.product_info.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product_info.price = 200
+            self.product_info.save()
+            # До фиксации транзакции параллельные запросы читают прежнюю запись.
+            self.assertEqual(current_version(PRODUCT_INFO, self.product_info.id), version)
+            self.assertEqual(self.price(), 100)
+        for callback in callbacks:
+            callback()
+
+        self.assertNotEqual(current_version(PRODUCT_INFO, self.product_info.id), version)
+        self.assertEqual(self.price(), 200)
+
+    def test_rollback_keeps_version(self):
+        version = current_version(SHOP, self.shop.id)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ZeroDivisionError), transaction.atomic():
+                object_cache.invalidate(SHOP, self.shop.id)
+                1 / 0
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(current_version(SHOP, self.shop.id), version)
+
+    def test_shop_state_hides_product(self):
+        self.assertEqual(self.price(), 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.state = False
+            self.shop.save()
+
+        self.assertEqual(self.client.get(f'/api/v1/products/{self.product_info.id}/').status_code, 404)
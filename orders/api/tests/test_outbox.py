@@ -0,0 +1,190 @@
+import smtplib
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import outbox
+from api.models import OutgoingEmail
+from api.outbox import OutboxSender, claim_batch, mark_failed, queue_email, send_pending
+
+
+def queue(count=1):
+    return [queue_email(f'Письмо {number}', 'Текст', [f'user{number}@example.com']) for number in range(count)]
+
+
+class SMTPConnection(locmem.EmailBackend):
+    """Заменитель SMTP-соединения: запоминает пачки писем и может оборвать отправку."""
+
+    def __init__(self, fail=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail
+        self.groups = []
+        self.closed = False
+
+    def send_messages(self, messages):
+        if self.fail:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.groups.append([message.to[0] for message in messages])
+        return super().send_messages(messages)
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    """Монотонные часы, которые идут только во время ``sleep``."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@override_settings(EMAIL_OUTBOX_RETRY_DELAY=30, EMAIL_OUTBOX_LEASE=300, EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+                   EMAIL_OUTBOX_RATE_LIMIT=0)
+class OutboxQueueTests(TestCase):
+
+    def make_ready(self):
+        """Все письма готовы к отправке: срок аренды или задержки истек."""
+        OutgoingEmail.objects.update(send_after=timezone.now() - timedelta(seconds=1))
+
+    def test_queued_in_callers_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            queue()
+            raise RuntimeError
+
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+        with transaction.atomic():
+            queue()
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+        # Письмо только в очереди, отправляет его send_outbox.
+        self.assertEqual(mail.outbox, [])
+
+    def test_claim_leases_emails(self):
+        first, second = queue(2)
+
+        self.assertEqual(claim_batch(1), [first])
+        # Забранное письмо недоступно другому обработчику до конца аренды.
+        self.assertEqual(claim_batch(10), [second])
+        self.assertEqual(claim_batch(10), [])
+        lease = OutgoingEmail.objects.get(id=first.id).send_after - timezone.now()
+        self.assertAlmostEqual(lease.total_seconds(), 300, delta=5)
+
+        self.make_ready()
+        self.assertEqual(claim_batch(10), [first, second])
+
+    def test_failures_back_off_exponentially(self):
+        email, = queue()
+
+        delays = []
+        for attempt in range(3):
+            email, = claim_batch(10)
+            started = timezone.now()
+            with self.assertLogs('api.outbox', 'WARNING'):
+                mark_failed([email], 'SMTP 421')
+            email.refresh_from_db()
+            delays.append(round((email.send_after - started).total_seconds()))
+            self.make_ready()
+
+        self.assertEqual(delays, [30, 60, 120])
+        self.assertEqual((email.attempts, email.last_error), (3, 'SMTP 421'))
+
+    def test_stops_after_max_attempts(self):
+        email, = queue()
+        OutgoingEmail.objects.update(attempts=3, last_error='SMTP 550')
+
+        self.assertEqual(claim_batch(10), [])
+        self.assertEqual(send_pending(), (0, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.attempts, email.last_error, email.sent_at), (3, 'SMTP 550', None))
+
+    def test_send_pending(self):
+        queue(2)
+
+        self.assertEqual(send_pending(), (2, 0))
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['user0@example.com', 'user1@example.com'])
+        self.assertFalse(OutgoingEmail.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(send_pending(), (0, 0))
+
+
+@override_settings(EMAIL_OUTBOX_RETRY_DELAY=30, EMAIL_OUTBOX_LEASE=300, EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class OutboxSenderTests(TestCase):
+
+    def setUp(self):
+        self.connections = []
+        self.failing = 0
+        patcher = mock.patch.object(outbox, 'get_connection', side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self):
+        """Новое соединение; первые ``self.failing`` соединений обрываются при отправке."""
+        self.connections.append(SMTPConnection(fail=len(self.connections) < self.failing))
+        return self.connections[-1]
+
+    def groups(self):
+        return [[len(group) for group in connection.groups] for connection in self.connections]
+
+    def test_connection_is_reused_between_batches(self):
+        queue(3)
+        with OutboxSender(group_size=2, rate=0) as sender:
+            self.assertEqual(sender.send_pending(), (3, 0))
+            queue(2)
+            self.assertEqual(sender.send_pending(), (2, 0))
+            self.assertEqual(self.groups(), [[2, 1, 2]])
+            self.assertFalse(self.connections[0].closed)
+
+        self.assertTrue(self.connections[0].closed)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_connection_rotates_after_max_per_connection(self):
+        queue(5)
+        with OutboxSender(group_size=10, rate=0, max_per_connection=2) as sender:
+            self.assertEqual(sender.send_pending(), (5, 0))
+
+        self.assertEqual(self.groups(), [[2], [2], [1]])
+        self.assertTrue(all(connection.closed for connection in self.connections))
+
+    def test_reconnects_after_smtp_error(self):
+        queue(3)
+        self.failing = 1
+        with OutboxSender(group_size=2, rate=0) as sender:
+            with self.assertLogs('api.outbox', 'WARNING'):
+                # Группа на оборванном соединении откладывается, следующая идет через новое.
+                self.assertEqual(sender.send_pending(), (1, 2))
+            self.assertTrue(self.connections[0].closed)
+            self.assertEqual(self.groups(), [[], [1]])
+
+            failed = OutgoingEmail.objects.filter(sent_at__isnull=True)
+            self.assertEqual([(email.attempts, email.last_error) for email in failed],
+                             [(1, 'Connection unexpectedly closed')] * 2)
+            failed.update(send_after=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(sender.send_pending(), (2, 0))
+
+        self.assertEqual(self.groups(), [[], [1, 2]])
+        self.assertEqual(sender.stats, {'sent': 3, 'failed': 2, 'connections': 2})
+
+    def test_rate_limit_and_metrics(self):
+        queue(10)
+        clock = Clock()
+        with mock.patch.object(outbox, 'time', clock), OutboxSender(group_size=5, rate=10) as sender:
+            self.assertEqual(sender.send_pending(), (10, 0))
+            metrics = sender.metrics()
+
+        # Первая группа уходит сразу, вторая ждет, пока 5 писем уложатся в 10 писем в секунду.
+        self.assertEqual(clock.sleeps, [0.5])
+        self.assertEqual(metrics, {'sent': 10, 'failed': 0, 'connections': 1,
+                                   'messages_per_second': 20.0, 'messages_per_connection': 10.0})
@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api import history
+from api.models import ProductInfo, Shop
+from api.testing import api_client, create_catalog, create_user
+
+
+class ProductHistoryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = api_client(create_user())
+        self.shop, (self.product_info,) = create_catalog(goods=1)
+        history.record(self.shop.id, [{'id': self.product_info.external_id, 'price': 100, 'quantity': 5}])
+
+    def get(self, pk):
+        return self.client.get(f'/api/v1/products/{pk}/history/')
+
+    def test_history(self):
+        response = self.get(self.product_info.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['series']), 1)
+
+    def test_invalid_id(self):
+        response = self.get('abc')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'Status': False, 'Errors': 'Неверный ИД товара'})
+
+    def test_hidden_product(self):
+        Shop.objects.filter(id=self.shop.id).update(state=False)
+        self.assertEqual(self.get(self.product_info.id).status_code, 404)
+
+        Shop.objects.filter(id=self.shop.id).update(state=True)
+        ProductInfo.objects.filter(id=self.product_info.id).update(version=self.shop.catalog_version + 1)
+        self.assertEqual(self.get(self.product_info.id).json(), {'Status': False, 'Errors': 'Товар не найден'})
@@ -0,0 +1,89 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from api import profiling
+from api.middleware import ProfilingMiddleware
+from api.testing import api_client, create_user
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(PROFILING_DIR=self.directory))
+
+    def get(self, user):
+        return api_client(user).get('/api/v1/basket', headers={'X-Profile': '1'})
+
+    def profiles(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.prof'))
+
+    def test_staff_header(self):
+        response = self.get(create_user('staff@example.com', is_staff=True))
+
+        self.assertEqual(self.profiles(), [response['X-Profile-Id'] + '.prof'])
+
+    def test_header_from_buyer_does_not_start_profiler(self):
+        with mock.patch('cProfile.Profile.enable') as enable:
+            responses = [self.get(create_user()), self.get(None),
+                         api_client().get('/api/v1/basket', headers={'X-Profile': '1', 'Authorization': 'Token bad'})]
+
+        self.assertEqual([response.status_code for response in responses], [200, 403, 401])
+        enable.assert_not_called()
+        self.assertEqual(self.profiles(), [])
+
+    def test_async_staff_header(self):
+        async def view(request):
+            return HttpResponse()
+
+        def get(user):
+            token, _ = Token.objects.get_or_create(user=user)
+            request = AsyncRequestFactory().get('/api/v1/basket',
+                                                headers={'X-Profile': '1', 'Authorization': f'Token {token.key}'})
+            return async_to_sync(ProfilingMiddleware(view))(request)
+
+        self.assertNotIn('X-Profile-Id', get(create_user()))
+        self.assertIn('X-Profile-Id', get(create_user('staff@example.com', is_staff=True)))
+
+    def test_another_profiler_active(self):
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is already active')):
+            response = self.get(create_user('staff@example.com', is_staff=True))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.profiles(), [])
+
+
+class SampleRateTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(profiling.set_sample_rate, None)
+
+    @override_settings(PROFILING_RATE_OVERRIDE_ENABLED=True)
+    def test_override_with_shared_cache(self):
+        call_command('profiles', 'rate', '0.5', stdout=io.StringIO())
+        self.assertEqual(profiling.sample_rate(), 0.5)
+
+        call_command('profiles', 'rate', 'default', stdout=io.StringIO())
+        self.assertEqual(profiling.sample_rate(), 0.0)
+
+    @override_settings(PROFILING_RATE_OVERRIDE_ENABLED=False)
+    def test_override_requires_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'общем кэше'):
+            call_command('profiles', 'rate', '0.5')
+        # Значение, оставшееся в кэше, не учитывается.
+        cache.set(profiling.SAMPLE_RATE_CACHE_KEY, 1.0)
+        self.assertEqual(profiling.sample_rate(), 0.0)
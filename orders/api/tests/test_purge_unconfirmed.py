@@ -0,0 +1,61 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from api.models import ConfirmEmailToken, Contact, Order, OrderItem, User
+from api.testing import create_catalog, create_contact, create_user
+
+
+class PurgeUnconfirmedTests(TestCase):
+
+    def setUp(self):
+        self.long_ago = timezone.now() - timedelta(days=30)
+
+    def signup(self, email, joined=None, confirmed=False):
+        user = create_user(email, is_active=confirmed)
+        ConfirmEmailToken.objects.create(user=user)
+        User.objects.filter(id=user.id).update(date_joined=joined or timezone.now())
+        ConfirmEmailToken.objects.filter(user=user).update(created_at=joined or timezone.now())
+        return user
+
+    def purge(self):
+        call_command('purge_unconfirmed', stdout=StringIO())
+
+    def test_unconfirmed_signup_is_deleted(self):
+        user = self.signup('unconfirmed@example.com', joined=self.long_ago)
+        self.purge()
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+
+    def test_recent_signup_keeps_expired_token(self):
+        user = self.signup('recent@example.com', joined=timezone.now() - timedelta(days=3))
+        self.purge()
+        self.assertTrue(ConfirmEmailToken.objects.filter(user=user).exists())
+
+    def test_deactivated_customer_with_orders_survives(self):
+        customer = create_user('customer@example.com')
+        _, (product_info,) = create_catalog(goods=1)
+        order = Order.objects.create(user=customer, state='delivered', contact=create_contact(customer))
+        OrderItem.objects.create(order=order, product_info=product_info, quantity=1)
+        User.objects.filter(id=customer.id).update(is_active=False, date_joined=self.long_ago)
+
+        self.purge()
+
+        self.assertTrue(User.objects.filter(id=customer.id).exists())
+        self.assertEqual(Order.objects.filter(user=customer).count(), 1)
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 1)
+        self.assertEqual(Contact.objects.filter(user=customer).count(), 1)
+
+    def test_inactive_user_with_token_and_placed_order_survives(self):
+        user = self.signup('ordered@example.com', joined=self.long_ago)
+        Order.objects.create(user=user, state='new')
+        self.purge()
+        self.assertTrue(User.objects.filter(id=user.id).exists())
+
+    def test_expired_token_of_confirmed_user_is_deleted(self):
+        user = self.signup('confirmed@example.com', joined=self.long_ago, confirmed=True)
+        self.purge()
+        self.assertTrue(User.objects.filter(id=user.id).exists())
+        self.assertFalse(ConfirmEmailToken.objects.filter(user=user).exists())
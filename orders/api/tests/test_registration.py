@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import ConfirmEmailToken, Order, User
+from api.testing import TEST_PASSWORD, create_user
+
+EMAIL = 'new@example.com'
+
+
+class RegistrationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def register(self, first_name='Иван'):
+        return self.client.post('/api/v1/user/register', {
+            'first_name': first_name, 'last_name': 'Петров', 'email': EMAIL, 'password': TEST_PASSWORD,
+            'company': 'ООО', 'position': 'Менеджер',
+        })
+
+    def confirm(self, token):
+        return self.client.post('/api/v1/user/register/confirm', {'email': EMAIL, 'token': token.key}).json()
+
+    def expire_token(self):
+        ConfirmEmailToken.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+    def test_confirm(self):
+        self.assertEqual(self.register().status_code, 201)
+
+        self.assertEqual(self.confirm(ConfirmEmailToken.objects.get()), {'Status': True})
+        self.assertTrue(User.objects.get(email=EMAIL).is_active)
+        self.assertFalse(ConfirmEmailToken.objects.exists())
+
+    def test_register_again_after_token_expired(self):
+        self.register()
+        expired = ConfirmEmailToken.objects.get()
+        self.expire_token()
+
+        self.assertEqual(self.confirm(expired), {'Status': False,
+                                                 'Errors': 'Срок действия токена истек, зарегистрируйтесь заново'})
+        self.assertFalse(User.objects.get(email=EMAIL).is_active)
+
+        self.assertEqual(self.register(first_name='Петр').status_code, 201)
+        user = User.objects.get(email=EMAIL)
+        self.assertEqual(user.first_name, 'Петр')
+        self.assertEqual(self.confirm(ConfirmEmailToken.objects.get()), {'Status': True})
+        self.assertFalse(User.objects.filter(id=expired.user_id).exists())
+
+    def test_pending_confirmation_keeps_email(self):
+        self.register()
+
+        response = self.register(first_name='Петр')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('email', response.json()['Errors'])
+        self.assertEqual(User.objects.get(email=EMAIL).first_name, 'Иван')
+
+    def test_invalid_registration_keeps_expired_user(self):
+        self.register()
+        self.expire_token()
+
+        response = self.client.post('/api/v1/user/register', {
+            'first_name': 'Петр', 'last_name': 'Петров', 'email': EMAIL, 'password': TEST_PASSWORD,
+            'company': 'О' * 41, 'position': 'Менеджер',
+        })
+
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('company', response.json()['Errors'])
+        self.assertEqual(User.objects.get(email=EMAIL).first_name, 'Иван')
+
+    def test_existing_accounts_are_not_replaced(self):
+        active = create_user(EMAIL)
+        self.assertEqual(self.register().status_code, 422)
+
+        # Пользователь с оформленными заказами не заменяется, даже если у него остался просроченный токен.
+        User.objects.filter(id=active.id).update(is_active=False)
+        ConfirmEmailToken.objects.create(user=active)
+        self.expire_token()
+        Order.objects.create(user=active, state='delivered')
+        self.assertEqual(self.register().status_code, 422)
+        self.assertTrue(User.objects.filter(id=active.id).exists())
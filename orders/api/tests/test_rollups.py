@@ -0,0 +1,102 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from api import rollups
+from api.catalog import import_catalog
+from api.models import Order, OrderItem, ProductInfo, SalesRollup
+from api.testing import api_client, create_catalog, create_contact, create_user
+
+
+def catalog_file(price):
+    return {'shop': 'Магазин', 'categories': [{'id': 1, 'name': 'Категория'}],
+            'goods': [{'id': 7, 'category': 1, 'name': 'Товар', 'model': 'm', 'price': price, 'price_rrc': price,
+                       'quantity': 10, 'parameters': {}}]}
+
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.buyer = create_user()
+        self.shop_user = create_user('shop@example.com', type='shop')
+
+    def basket(self, *product_infos, quantity=2):
+        order = Order.objects.create(user=self.buyer, state='basket')
+        for product_info in product_infos:
+            OrderItem.objects.create(order=order, product_info=product_info, quantity=quantity)
+        return order
+
+    def set_state(self, order, state):
+        order.state = state
+        order.save()
+
+    def sales(self):
+        return list(SalesRollup.objects.values_list('external_id', 'day', 'units', 'revenue').order_by('external_id'))
+
+    def test_cancel_subtracts_revenue_at_placement_price(self):
+        shop, (product_info,) = create_catalog(self.shop_user, goods=1)
+        order = self.basket(product_info)
+        self.set_state(order, 'new')
+        ProductInfo.objects.filter(id=product_info.id).update(price=999)
+        self.set_state(order, 'canceled')
+
+        self.assertEqual(self.sales(), [(product_info.external_id, timezone.localdate(), 0, 0)])
+
+    def test_sales_of_reimported_offer_stay_in_one_row(self):
+        first = import_catalog(self.shop_user.id, catalog_file(100))
+        self.set_state(self.basket(ProductInfo.objects.get(shop=first, version=first.catalog_version)), 'new')
+        second = import_catalog(self.shop_user.id, catalog_file(150))
+        self.set_state(self.basket(ProductInfo.objects.get(shop=second, version=second.catalog_version)), 'new')
+
+        self.assertEqual(self.sales(), [(7, timezone.localdate(), 4, 2 * 100 + 2 * 150)])
+
+    def test_day_is_placement_day(self):
+        shop, (product_info,) = create_catalog(self.shop_user, goods=1)
+        order = self.basket(product_info, quantity=1)
+        Order.objects.filter(id=order.id).update(dt=timezone.now() - timedelta(days=10))
+
+        response = api_client(self.buyer).post('/api/v1/order', {'id': str(order.id),
+                                                                 'contact': create_contact(self.buyer).id})
+
+        self.assertEqual(response.json(), {'Status': True})
+        self.assertEqual(self.sales(), [(product_info.external_id, timezone.localdate(), 1, product_info.price)])
+
+    def test_concurrent_placement_is_counted_once(self):
+        shop, (product_info,) = create_catalog(self.shop_user, goods=1)
+        order = self.basket(product_info)
+        contact = create_contact(self.buyer)
+        concurrent = []
+        test = self
+
+        class SoldStates(tuple):
+            def __contains__(self, state):
+                # OrderView.post проверяет прежний статус между чтением и UPDATE:
+                # в этот момент другой запрос оформляет тот же заказ.
+                if not concurrent:
+                    concurrent.append(state)
+                    test.set_state(Order.objects.get(id=order.id), 'new')
+                return super().__contains__(state)
+
+        with mock.patch.object(rollups, 'SOLD_STATES', SoldStates(rollups.SOLD_STATES)):
+            response = api_client(self.buyer).post('/api/v1/order', {'id': str(order.id), 'contact': contact.id})
+
+        self.assertEqual(concurrent, ['basket'])
+        self.assertFalse(response.json()['Status'])
+        self.assertEqual(self.sales(), [(product_info.external_id, timezone.localdate(), 2, 2 * product_info.price)])
+
+    def test_rebuild_matches_incremental_updates(self):
+        shop, product_infos = create_catalog(self.shop_user, goods=2)
+        self.set_state(self.basket(*product_infos), 'new')
+        canceled = self.basket(product_infos[0], quantity=5)
+        self.set_state(canceled, 'new')
+        self.set_state(canceled, 'canceled')
+        ProductInfo.objects.filter(shop=shop).update(price=1)
+        incremental = [row for row in self.sales() if row[2]]
+
+        rollups.rebuild()
+
+        self.assertEqual(self.sales(), incremental)
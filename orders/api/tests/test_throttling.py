@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.throttling import SimpleRateThrottle
+
+from api.testing import create_user
+from api.throttling import AnonSlidingWindowThrottle, ScopedSlidingWindowThrottle, UserSlidingWindowThrottle
+
+RATES = {'anon': '3/min', 'user': '5/min'}
+# Начало окна: метка времени, кратная минуте.
+START = 60 * 1000000
+
+
+class View:
+
+    def __init__(self, throttle_scope=None):
+        self.throttle_scope = throttle_scope
+
+
+@mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', RATES)
+class SlidingWindowThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = START
+        self.user = create_user()
+
+    def request(self, user=None, ip='10.0.0.1'):
+        request = Request(APIRequestFactory().get('/', REMOTE_ADDR=ip))
+        request.user = user or AnonymousUser()
+        return request
+
+    def allow(self, throttle_class=ScopedSlidingWindowThrottle, scope='anon', **request_kwargs):
+        throttle = throttle_class()
+        throttle.timer = lambda: self.now
+        allowed = throttle.allow_request(self.request(**request_kwargs), View(scope))
+        return allowed, throttle.wait()
+
+    def test_window_boundaries(self):
+        self.assertEqual([self.allow()[0] for _ in range(4)], [True, True, True, False])
+        self.assertEqual(self.allow(), (False, 60))
+
+        # Начало следующего окна: предыдущее учитывается целиком.
+        self.now = START + 60
+        self.assertEqual(self.allow(), (False, 60))
+
+        # Середина окна: из трех запросов предыдущего окна учитывается половина.
+        self.now = START + 90
+        self.assertEqual(self.allow(), (True, None))
+        self.assertEqual(self.allow(), (False, 30))
+
+        # Через два окна старые запросы не учитываются.
+        self.now = START + 180
+        self.assertEqual([self.allow()[0] for _ in range(4)], [True, True, True, False])
+
+    def test_scoped_rates(self):
+        self.assertEqual([self.allow(scope='user')[0] for _ in range(6)], [True] * 5 + [False])
+        # У каждой области свой счетчик и своя частота.
+        self.assertEqual([self.allow(scope='anon')[0] for _ in range(4)], [True] * 3 + [False])
+        # Представление без области не ограничивается.
+        self.assertTrue(all(self.allow(scope=None)[0] for _ in range(10)))
+
+    def test_user_and_anon_throttles(self):
+        for _ in range(3):
+            self.assertTrue(self.allow(AnonSlidingWindowThrottle)[0])
+        self.assertEqual(self.allow(AnonSlidingWindowThrottle), (False, 60))
+        # Другой адрес и авторизованный пользователь ограничиваются отдельно.
+        self.assertTrue(self.allow(AnonSlidingWindowThrottle, ip='10.0.0.2')[0])
+        self.assertTrue(self.allow(AnonSlidingWindowThrottle, user=self.user)[0])
+
+        allowed = [self.allow(UserSlidingWindowThrottle, user=self.user)[0] for _ in range(6)]
+        self.assertEqual(allowed, [True] * 5 + [False])
+        self.assertTrue(self.allow(UserSlidingWindowThrottle, user=create_user('other@example.com'))[0])
+
+    def test_counter_evicted_between_add_and_incr(self):
+        with mock.patch.object(cache, 'incr', side_effect=ValueError):
+            self.assertEqual(self.allow(), (True, None))
+        # Счетчик пересоздан со значением 1.
+        self.assertEqual([self.allow()[0] for _ in range(3)], [True, True, False])
+
+    def test_retry_after_header(self):
+        client = APIClient()
+        # ConfirmAccount ограничивается областью anon.
+        statuses = [client.post('/api/v1/user/register/confirm').status_code for _ in range(4)]
+        response = client.post('/api/v1/user/register/confirm')
+
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
@@ -0,0 +1,146 @@
+import json
+import socket
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import webhooks
+from api.models import Order, OrderItem, WebhookEvent
+from api.testing import api_client, create_catalog, create_contact, create_user
+from api.webhooks import SIGNATURE_HEADER, TIMESTAMP_HEADER, WebhookSender
+
+
+class ShopServer(ThreadingHTTPServer):
+    """Адрес уведомлений магазина: запоминает полученные запросы и отвечает кодом ``status``."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ShopHandler)
+        self.status = 200
+        self.received = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/hook'
+
+
+class ShopHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+# Тестовый адрес магазина — 127.0.0.1.
+@override_settings(WEBHOOK_RETRY_DELAY=30, WEBHOOK_ALLOW_PRIVATE_HOSTS=True)
+class WebhookDeliveryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.server = ShopServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        shop_user = create_user('shop@example.com', type='shop')
+        self.shop, (self.product_info,) = create_catalog(shop_user, goods=1)
+        response = api_client(shop_user).post('/api/v1/partner/webhook', {'url': self.server.url}).json()
+        self.secret = response['Secret']
+
+        buyer = create_user()
+        self.order = Order.objects.create(user=buyer, state='basket', contact=create_contact(buyer))
+        OrderItem.objects.create(order=self.order, product_info=self.product_info, quantity=2)
+
+    def set_state(self, state):
+        self.order.state = state
+        self.order.save()
+
+    def send(self):
+        with WebhookSender(timeout=5) as sender:
+            return sender.send_pending()
+
+    def register(self, url):
+        return api_client(self.shop.user).post('/api/v1/partner/webhook', {'url': url}).json()
+
+    def test_signed_delivery_of_coalesced_changes(self):
+        self.set_state('new')
+        self.set_state('confirmed')
+
+        self.assertEqual(self.send(), (1, 0))
+
+        (headers, body), = self.server.received
+        self.assertEqual(headers[SIGNATURE_HEADER], webhooks.sign(self.secret, headers[TIMESTAMP_HEADER], body))
+        payload = json.loads(body)
+        # Два изменения до доставки — одно событие с последним статусом.
+        self.assertEqual([(event['order'], event['state']) for event in payload['events']],
+                         [(self.order.id, 'confirmed')])
+        self.assertEqual(payload['events'][0]['items'][0]['quantity'], 2)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_failed_delivery_backs_off(self):
+        self.server.status = 500
+        self.set_state('new')
+
+        delays = []
+        for _ in range(2):
+            started = timezone.now()
+            with self.assertLogs('api.webhooks', 'WARNING'):
+                self.assertEqual(self.send(), (0, 1))
+            event = WebhookEvent.objects.get()
+            delays.append(round((event.send_after - started).total_seconds()))
+            # Следующая попытка — сразу, не дожидаясь задержки.
+            WebhookEvent.objects.update(send_after=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(delays, [30, 60])
+        self.assertEqual((event.attempts, event.last_error), (2, 'HTTP 500'))
+        self.assertEqual(len(self.server.received), 2)
+
+    def test_price_fixed_at_placement(self):
+        self.set_state('new')
+        OrderItem.objects.update(price=self.product_info.price - 10)
+        self.product_info.price += 100
+        self.product_info.save()
+
+        self.assertEqual(self.send(), (1, 0))
+        (_, body), = self.server.received
+        self.assertEqual(json.loads(body)['events'][0]['items'][0]['price'], self.product_info.price - 110)
+
+    def test_invalid_url(self):
+        response = self.register('ftp://example.com')
+
+        self.assertFalse(response['Status'])
+        self.assertIn('Errors', response)
+
+    @override_settings(WEBHOOK_ALLOW_PRIVATE_HOSTS=False)
+    def test_internal_hosts_rejected(self):
+        for url in ('http://127.0.0.1/hook', 'http://localhost:8000/hook', 'http://10.0.0.5/hook',
+                    'http://192.168.1.1/hook', 'http://169.254.169.254/latest', 'http://[::1]/hook',
+                    'http://[::ffff:127.0.0.1]/hook', 'http://unknown-host.invalid/hook'):
+            with self.subTest(url=url):
+                self.assertFalse(self.register(url)['Status'])
+        self.shop.refresh_from_db()
+        self.assertEqual(self.shop.webhook_url, self.server.url)
+
+        public = [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('93.184.216.34', 443))]
+        with mock.patch('socket.getaddrinfo', return_value=public):
+            self.assertTrue(self.register('https://shop.example.com/hook')['Status'])
+
+    def test_internal_host_rejected_at_send_time(self):
+        # Имя разрешалось во внешний адрес при регистрации, а теперь указывает на локальный.
+        self.set_state('new')
+
+        with override_settings(WEBHOOK_ALLOW_PRIVATE_HOSTS=False), self.assertLogs('api.webhooks', 'WARNING'):
+            self.assertEqual(self.send(), (0, 1))
+
+        self.assertEqual(WebhookEvent.objects.get().last_error, 'Адрес узла относится к внутренней сети')
+        self.assertEqual(self.server.received, [])
@@ -0,0 +1,61 @@
+"""
+Ограничение частоты запросов по скользящему окну.
+
+Для каждого клиента и области хранится только два счетчика — за текущее и
+предыдущее окно длиной ``duration``. Число запросов за последние ``duration``
+секунд оценивается как ``предыдущее * доля_непрошедшего_окна + текущее``.
+Счетчики увеличиваются атомарным ``incr`` в кэше ``default``, поэтому при общем
+кэше (Redis, ``SHARED_CACHE``) ограничения действуют на все процессы сразу. Без
+него у каждого процесса свои счетчики, и предел фактически умножается на число
+процессов.
+"""
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """Базовый класс: O(1) состояния на клиента вместо списка времен запросов."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous = self.cache.get(f'{self.key}:{int(window) - 1}', 0)
+
+        # Окно живет два периода, чтобы стать «предыдущим» для следующего.
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, self.duration * 2)
+            current = 1
+
+        if previous * (1 - elapsed / self.duration) + current > self.num_requests:
+            self.cache.decr(current_key)
+            self.wait_seconds = self.duration - elapsed
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class ScopedSlidingWindowThrottle(ScopedRateThrottle, SlidingWindowRateThrottle):
+    """Ограничение по ``throttle_scope`` представления."""
+
+
+class UserSlidingWindowThrottle(UserRateThrottle, SlidingWindowRateThrottle):
+    """Ограничение для авторизованных пользователей по области ``user``."""
+
+
+class AnonSlidingWindowThrottle(AnonRateThrottle, SlidingWindowRateThrottle):
+    """Ограничение для анонимных клиентов по области ``anon``."""
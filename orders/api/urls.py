@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path, include
 from django_rest_passwordreset.views import reset_password_request_token, reset_password_confirm
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import RegisterAccount, LoginAccount, AccountDetails, ContactView, ConfirmAccount, PartnerOrders, OrderView, \
-    BasketView, ProductInfoView, CategoryView, ShopView, SellerUpdateCatalog, SellerState
+    BasketView, ProductInfoView, CategoryView, ShopView, SellerUpdateCatalog, SellerState, PartnerAnalytics, \
+    AuthCacheStats, RefreshSignedToken, RevokeSignedToken, MetricsView, BatchView, \
+    PartnerWebhook
 
 app_name = 'api'
 router = DefaultRouter()
@@ -15,9 +19,16 @@ urlpatterns = [
     path('user/details', AccountDetails.as_view(), name='user-details'),
     path('user/contact', ContactView.as_view(), name='user-contact'),
     path('user/login', LoginAccount.as_view(), name='user-login'),
+    path('user/token/refresh', RefreshSignedToken.as_view(), name='user-token-refresh'),
+    path('user/token/revoke', RevokeSignedToken.as_view(), name='user-token-revoke'),
     path('user/password_reset', reset_password_request_token, name='password-reset'),
     path('user/password_reset/confirm', reset_password_confirm, name='password-reset-confirm'),
+    path('auth/cache-stats', AuthCacheStats.as_view(), name='auth-cache-stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('batch', BatchView.as_view(), name='batch'),
     path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
+    path('partner/analytics', PartnerAnalytics.as_view(), name='partner-analytics'),
+    path('partner/webhook', PartnerWebhook.as_view(), name='partner-webhook'),
     path('order', OrderView.as_view(), name='order'),
     path('basket', BasketView.as_view(), name='basket'),
     path('categories', CategoryView.as_view(), name='categories'),
@@ -26,3 +37,13 @@ urlpatterns = [
     path('seller/state', SellerState.as_view(), name='partner-state'),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    # Под ASGI читающие представления заменяются асинхронными версиями.
+    urlpatterns = [
+        path('order', async_views.order, name='order'),
+        path('categories', async_views.categories, name='categories'),
+        path('shops', async_views.shops, name='shops'),
+        path('products/', async_views.products, name='products-list'),
+        path('seller/update', async_views.seller_update, name='partner-update'),
+    ] + urlpatterns
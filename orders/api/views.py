@@ -1,31 +1,66 @@
 import json
-from distutils.util import strtobool
+from datetime import datetime
 
-import requests
 from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.core.mail import EmailMultiAlternatives
 from django.core.validators import URLValidator
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, F, Q
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.authtoken.models import Token
+from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from yaml import load as load_yaml, Loader
 
-from .models import User, Order, OrderItem, Contact, ConfirmEmailToken, Category, Shop, ProductInfo, ProductParameter, \
-    Parameter, Product
+from . import history, object_cache, rollups, webhooks
+from .authentication import CachedTokenAuthentication, issue_signed_token, read_signed_token, \
+    revoke_signed_token, ACCESS_TOKEN, REFRESH_TOKEN
+from .basket import CachedBasket, flush_basket
+from .batch import execute_batch
+from .catalog import load_catalog, import_catalog
+from .db_router import ReplicaReadMixin
+from .idempotency import idempotent
+from .metrics import render_prometheus
+from .models import User, Order, OrderItem, Contact, ConfirmEmailToken, Category, Shop, ProductInfo, ArchivedOrder
+from .outbox import queue_email
 from .permissions import IsShopUser
 from .serializers import UserSerializer, ContactSerializer, OrderSerializer, OrderItemSerializer, ShopSerializer, \
-    CategorySerializer, ProductInfoSerializer
+    CategorySerializer, ProductInfoSerializer, ArchivedOrderSerializer
+from .throttling import UserSlidingWindowThrottle, AnonSlidingWindowThrottle
+
+
+def with_archive(request):
+    """Нужно ли добавлять к истории заказов архивные заказы."""
+    return request.query_params.get('archive', '').lower() in ('1', 'true', 'yes')
+
+
+def order_history(orders, archived=()):
+    """
+    Живые и архивные заказы одним списком по убыванию даты, как в ``Order.Meta.ordering``.
+    """
+    entries = [(order.dt, OrderSerializer(order).data) for order in orders]
+    entries += [(order.dt, ArchivedOrderSerializer(order).data) for order in archived]
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+    return [data for _, data in entries]
+
+
+def str_to_bool(value):
+    """Замена ``distutils.util.strtobool``: модуль удален в Python 3.12 и долго загружается."""
+    value = value.lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return True
+    if value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return False
+    raise ValueError(f'invalid truth value {value!r}')
 
 
 class RegisterAccount(APIView):
@@ -48,31 +83,31 @@ class RegisterAccount(APIView):
             else:
                 request.data._mutable = True
                 request.data.update({})
-                user_serializer = UserSerializer(data=request.data)
-                if not user_serializer.is_valid():
-                    return Response({'Status': False,
-                                     'Errors': user_serializer.errors}, status=422)
-                user = user_serializer.save()
-                user.set_password(request.data['password'])
-                user.save()
-
-                # Отправление на подтверждение почты.
-                token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user.id)
-                title = f'Регистрация пользователя подтверждена: {token.user.email}'
-
-                token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user.pk)
-
-                msg = EmailMultiAlternatives(
-                    # title:
-                    title,
-                    # message:
-                    token.key,
-                    # from:
-                    settings.EMAIL_HOST_USER,
-                    # to:
-                    [user.email]
-                )
-                msg.send()
+                with transaction.atomic():
+                    # Адрес, не подтвержденный вовремя, можно зарегистрировать заново: прежний
+                    # неподтвержденный пользователь удаляется (по тем же правилам, что в purge_unconfirmed).
+                    User.objects.filter(
+                        email=request.data['email'], is_active=False, is_staff=False,
+                        id__in=ConfirmEmailToken.objects.values('user_id'),
+                    ).exclude(
+                        id__in=ConfirmEmailToken.objects.filter(
+                            created_at__gte=ConfirmEmailToken.expired_before()).values('user_id')
+                    ).exclude(id__in=Order.objects.exclude(state='basket').values('user_id')).delete()
+
+                    user_serializer = UserSerializer(data=request.data)
+                    if not user_serializer.is_valid():
+                        transaction.set_rollback(True)
+                        return Response({'Status': False,
+                                         'Errors': user_serializer.errors}, status=422)
+                    user = user_serializer.save()
+                    user.set_password(request.data['password'])
+                    user.save()
+
+                    # Отправление на подтверждение почты.
+                    token = ConfirmEmailToken.objects.create(user=user)
+                    title = f'Регистрация пользователя подтверждена: {user.email}'
+
+                    queue_email(title, token.key, [user.email])
 
                 return Response({'Status': True}, status=201)
 
@@ -100,6 +135,11 @@ class ConfirmAccount(APIView):
         if not token:
             return Response({'Status': False,
                              'Errors': 'Токен или адрес e-mail указаны неверно'})
+        # Просроченный токен остается: по нему purge_unconfirmed и повторная регистрация
+        # находят неподтвержденного пользователя.
+        if token.is_expired():
+            return Response({'Status': False,
+                             'Errors': 'Срок действия токена истек, зарегистрируйтесь заново'})
         token.user.is_active = True
         token.user.save()
         token.delete()
@@ -145,6 +185,15 @@ class LoginAccount(APIView):
         user = authenticate(request, username=request.data['email'], password=request.data['password'])
         if user is not None:
             if user.is_active:
+                # Клиент может выбрать подписанные токены вместо токена в БД.
+                if request.data.get('token_type') == 'signed':
+                    if not settings.SIGNED_TOKENS_ENABLED:
+                        return Response({'Status': False,
+                                         'Errors': 'Подписанные токены недоступны'}, status=400)
+                    return Response({'Status': True,
+                                     'Access': issue_signed_token(user, ACCESS_TOKEN),
+                                     'Refresh': issue_signed_token(user, REFRESH_TOKEN)}, status=200)
+
                 token, _ = Token.objects.get_or_create(user=user)
                 return Response({'Status': True, 'Token': token.key}, status=200)
 
@@ -152,6 +201,103 @@ class LoginAccount(APIView):
                          'Errors': 'Авторизация не удалась'}, status=403)
 
 
+class RefreshSignedToken(APIView):
+    """
+    Класс выпуска нового подписанного токена доступа.
+    """
+
+    throttle_scope = 'anon'
+    authentication_classes = []
+
+    def post(self, request, *args, **kwargs):
+
+        """
+        Выпуск токена доступа по токену обновления.
+        """
+
+        if 'refresh' not in request.data:
+            return Response({'Status': False,
+                             'Errors': 'Отсутствуют обязательные аргументы'}, status=401)
+        user, _ = read_signed_token(request.data['refresh'], REFRESH_TOKEN)
+        return Response({'Status': True, 'Access': issue_signed_token(user, ACCESS_TOKEN)}, status=200)
+
+
+class RevokeSignedToken(APIView):
+    """
+    Класс отзыва подписанных токенов.
+    """
+
+    throttle_scope = 'anon'
+    authentication_classes = []
+
+    def post(self, request, *args, **kwargs):
+
+        """
+        Отзыв токена доступа или обновления.
+        """
+
+        if 'token' not in request.data:
+            return Response({'Status': False,
+                             'Errors': 'Отсутствуют обязательные аргументы'}, status=401)
+        for token_type in (ACCESS_TOKEN, REFRESH_TOKEN):
+            try:
+                _, claims = read_signed_token(request.data['token'], token_type)
+            except AuthenticationFailed:
+                continue
+            revoke_signed_token(claims)
+            return Response({'Status': True}, status=200)
+
+        return Response({'Status': False,
+                         'Errors': 'Токен недействителен'}, status=403)
+
+
+class AuthCacheStats(APIView):
+    """Класс просмотра статистики кэша токенов текущего процесса"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(CachedTokenAuthentication.stats())
+
+
+class MetricsView(APIView):
+    """Класс выдачи метрик в формате Prometheus"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class BatchView(APIView):
+    """
+    Класс выполнения нескольких запросов к API за один HTTP-запрос.
+    """
+
+    def post(self, request, *args, **kwargs):
+
+        """
+        Выполнение операций ``requests`` по порядку, при ``atomic`` — в одной транзакции.
+        """
+
+        operations = request.data.get('requests')
+        if not isinstance(operations, list) or not operations:
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Отсутствуют обязательные аргументы'}, status=400)
+        if len(operations) > settings.BATCH_MAX_REQUESTS:
+            return JsonResponse({'Status': False,
+                                 'Errors': f'Не больше {settings.BATCH_MAX_REQUESTS} операций за запрос'},
+                                status=400)
+
+        atomic = request.data.get('atomic') in (True, 'true', '1')
+        results, rolled_back_at = execute_batch(request, operations, atomic)
+        if rolled_back_at is not None:
+            return Response({'Status': False,
+                             'Errors': f'Операция {rolled_back_at} завершилась ошибкой, изменения отменены',
+                             'responses': results})
+        return Response({'Status': True, 'responses': results})
+
+
 class ContactView(APIView):
     """ Класс работы с контактами покупателей. """
 
@@ -250,7 +396,7 @@ class ContactView(APIView):
 
 
 
-class OrderView(APIView):
+class OrderView(ReplicaReadMixin, APIView):
 
     """ Класс получения и размещения заказов. """
 
@@ -272,9 +418,13 @@ class OrderView(APIView):
             total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))
         ).distinct()
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        # Архив читается только по явному запросу ?archive=true.
+        archived = ()
+        if with_archive(request):
+            archived = ArchivedOrder.objects.filter(user_id=request.user.id).select_related('contact')
+        return Response(order_history(order, archived))
 
+    @idempotent
     def post(self, request, *args, **kwargs):
 
         """
@@ -288,31 +438,33 @@ class OrderView(APIView):
 
         if {'id', 'contact'}.issubset(request.data):
             if request.data['id'].isdigit():
+                if settings.BASKET_CACHE_ENABLED:
+                    flush_basket(request.user.id)
                 try:
-                    is_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data['id']).update(
-                        contact_id=request.data['contact'],
-                        state='new')
+                    with transaction.atomic():
+                        # Статус читается под блокировкой строки, а UPDATE сверяет его еще раз
+                        # (SQLite не поддерживает SELECT ... FOR UPDATE): параллельное оформление
+                        # того же заказа не попадает в сводку продаж дважды.
+                        previous_state = Order.objects.select_for_update().filter(
+                            user_id=request.user.id, id=request.data['id']).values_list('state', flat=True).first()
+                        placed = {} if previous_state in rollups.SOLD_STATES else {'placed_at': timezone.now()}
+                        is_updated = Order.objects.filter(
+                            user_id=request.user.id, id=request.data['id'], state=previous_state).update(
+                            contact_id=request.data['contact'],
+                            state='new', **placed)
+                        if is_updated:
+                            rollups.order_state_changed(int(request.data['id']), previous_state, 'new')
+                            webhooks.order_changed(int(request.data['id']), 'new')
+
+                            # Письмо об изменении статуса заказа уходит через очередь.
+                            queue_email('Статус заказа сменился', 'Заказ сформирован.', [request.user.email])
                 except IntegrityError:
                     return JsonResponse({'Status': False,
                                          'Errors': 'Неверные аргументы'})
                 else:
                     if is_updated:
-                        # Отправка письма при изменении статуса заказа.
-                        user = User.objects.get(id=request.user.id)
-                        title = 'Статус заказа сменился'
-                        message = 'Заказ сформирован.'
-                        msg = EmailMultiAlternatives(
-                            # title:
-                            title,
-                            # message:
-                            message,
-                            # from:
-                            settings.EMAIL_HOST_USER,
-                            # to:
-                            [user.email]
-                        )
-                        msg.send()
+                        if settings.BASKET_CACHE_ENABLED:
+                            CachedBasket.discard(request.user.id)
 
                         return JsonResponse({'Status': True})
 
@@ -320,7 +472,7 @@ class OrderView(APIView):
                              'Errors': 'Отсутствуют обязательные аргументы'})
 
 
-class PartnerOrders(APIView):
+class PartnerOrders(ReplicaReadMixin, APIView):
 
     """ Класс получения заказов поставщиками. """
 
@@ -350,8 +502,40 @@ class PartnerOrders(APIView):
             total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))
         ).distinct()
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        archived = ()
+        if with_archive(request):
+            archived = ArchivedOrder.objects.filter(
+                shops__user_id=request.user.id
+            ).select_related('contact').distinct()
+        return Response(order_history(order, archived))
+
+
+class PartnerAnalytics(APIView):
+
+    """ Класс получения статистики продаж магазина. """
+
+    permission_classes = [IsAuthenticated, IsShopUser]
+    throttle_scope = 'user'
+
+    def get(self, request, *args, **kwargs):
+
+        """
+        Продажи по товарам за период ``date_from``..``date_to`` с группировкой ``period``.
+        """
+
+        date_from = parse_date(request.query_params.get('date_from', ''))
+        date_to = parse_date(request.query_params.get('date_to', ''))
+        period = request.query_params.get('period', 'day')
+        if not date_from or not date_to or period not in ('day', 'week', 'month'):
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Отсутствуют обязательные аргументы'}, status=400)
+
+        shop = Shop.objects.filter(user_id=request.user.id).only('id').first()
+        if not shop:
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Магазин не найден'}, status=404)
+
+        return Response(rollups.shop_sales(shop.id, date_from, date_to, period))
 
 
 class BasketView(APIView):
@@ -369,6 +553,9 @@ class BasketView(APIView):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
 
+        if settings.BASKET_CACHE_ENABLED:
+            return Response(CachedBasket.load(request.user.id).to_representation())
+
         basket = Order.objects.filter(
             user_id=request.user.id, state='basket'
         ).prefetch_related(
@@ -381,6 +568,7 @@ class BasketView(APIView):
         serializer = OrderSerializer(basket, many=True)
         return Response(serializer.data)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
 
         """
@@ -399,6 +587,16 @@ class BasketView(APIView):
                 JsonResponse({'Status': False,
                               'Errors': 'Неверный формат запроса'})
             else:
+                if settings.BASKET_CACHE_ENABLED:
+                    cached_basket = CachedBasket.load(request.user.id)
+                    result = cached_basket.add(items_dict)
+                    if isinstance(result, str):
+                        return JsonResponse({'Status': False,
+                                             'Errors': result})
+                    cached_basket.save()
+                    return JsonResponse({'Status': True,
+                                         'Объектов создано': result})
+
                 basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
                 objects_created = 0
                 for order_item in items_dict:
@@ -423,6 +621,7 @@ class BasketView(APIView):
         return JsonResponse({'Status': False,
                              'Errors': 'Отсутствуют обязательные аргументы'})
 
+    @idempotent
     def put(self, request, *args, **kwargs):
 
         """
@@ -441,18 +640,60 @@ class BasketView(APIView):
                 JsonResponse({'Status': False,
                               'Errors': 'Неверный формат запроса'})
             else:
-                basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                objects_updated = 0
+                if settings.BASKET_CACHE_ENABLED:
+                    cached_basket = CachedBasket.load(request.user.id)
+                    updated_ids, errors = cached_basket.update(items_dict)
+                    if updated_ids:
+                        cached_basket.save()
+                    return self.update_response(updated_ids, errors)
+
+                # Новые количества по id позиции, некорректные записи отбрасываются сразу.
+                quantities = {}
+                errors = {}
                 for order_item in items_dict:
-                    if type(order_item['id']) == int and type(order_item['quantity']) == int:
-                        objects_updated += OrderItem.objects.filter(order_id=basket.id, id=order_item['id']).update(
-                            quantity=order_item['quantity'])
+                    if type(order_item.get('id')) != int:
+                        continue
+                    if type(order_item.get('quantity')) == int and order_item['quantity'] > 0:
+                        quantities[order_item['id']] = order_item['quantity']
+                    else:
+                        errors[order_item['id']] = 'Неверное количество'
+
+                # Одним запросом получаем позиции корзины вместе с остатком товара,
+                # проверяем количество против остатка и обновляем одним UPDATE ... CASE.
+                order_items = OrderItem.objects.filter(
+                    order__user_id=request.user.id, order__state='basket', id__in=list(quantities)
+                ).select_related('product_info').only('id', 'quantity', 'product_info__quantity')
+
+                updated = []
+                missing = set(quantities)
+                for order_item in order_items:
+                    missing.discard(order_item.id)
+                    quantity = quantities[order_item.id]
+                    if quantity <= order_item.product_info.quantity:
+                        order_item.quantity = quantity
+                        updated.append(order_item)
+                    else:
+                        errors[order_item.id] = 'Недостаточно товара'
+                errors.update(dict.fromkeys(missing, 'Позиция не найдена'))
 
-                return JsonResponse({'Status': True,
-                                     'Объектов обновлено': objects_updated})
+                if updated:
+                    OrderItem.objects.bulk_update(updated, ['quantity'])
+
+                return self.update_response(sorted(order_item.id for order_item in updated), errors)
         return JsonResponse({'Status': False,
                              'Errors': 'Отсутствуют обязательные аргументы'})
 
+    @staticmethod
+    def update_response(updated_ids, errors):
+        """Ответ на изменение количества: обновлённые позиции и причины отказа по остальным."""
+        response = {'Status': True,
+                    'Объектов обновлено': len(updated_ids),
+                    'Обновлены': updated_ids}
+        if errors:
+            response['Errors'] = {str(order_item_id): error for order_item_id, error in sorted(errors.items())}
+        return JsonResponse(response)
+
+    @idempotent
     def delete(self, request, *args, **kwargs):
 
         """
@@ -466,6 +707,16 @@ class BasketView(APIView):
         items_string = request.data.get('items')
         if items_string:
             items_list = items_string.split(',')
+
+            if settings.BASKET_CACHE_ENABLED:
+                cached_basket = CachedBasket.load(request.user.id)
+                deleted_count = cached_basket.remove(
+                    int(order_item_id) for order_item_id in items_list if order_item_id.isdigit())
+                if deleted_count:
+                    cached_basket.save()
+                return JsonResponse({'Status': True,
+                                     'Объектов удалено': deleted_count})
+
             basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
             query = Q()
             objects_deleted = False
@@ -482,26 +733,26 @@ class BasketView(APIView):
                              'Errors': 'Отсутствуют обязательные аргументы'})
 
 
-class CategoryView(ListAPIView):
+class CategoryView(ReplicaReadMixin, ListAPIView):
     """Класс просмотра категорий"""
 
     queryset = Category.objects.filter(shops__state=True)
     serializer_class = CategorySerializer
 
 
-class ShopView(ListAPIView):
+class ShopView(ReplicaReadMixin, ListAPIView):
     """Класс просмотра магазинов"""
 
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
 
 
-class ProductInfoView(ModelViewSet):
+class ProductInfoView(ReplicaReadMixin, ModelViewSet):
     """Класс поиска товаров"""
 
-    throttle_classes = [UserRateThrottle, AnonRateThrottle]
+    throttle_classes = [UserSlidingWindowThrottle, AnonSlidingWindowThrottle]
 
-    queryset = ProductInfo.objects.filter(shop__state=True).select_related(
+    queryset = ProductInfo.objects.filter(shop__state=True, version=F('shop__catalog_version')).select_related(
         'shop', 'product__category'
     ).prefetch_related('product_parameters__parameter').distinct()
 
@@ -510,6 +761,42 @@ class ProductInfoView(ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filter_fields = ('product__name', 'shop_id', 'product__category_id')
 
+    def retrieve(self, request, *args, **kwargs):
+        """Карточка товара из кэша объектов (см. api/object_cache.py)."""
+        if not settings.OBJECT_CACHE_ENABLED:
+            return super().retrieve(request, *args, **kwargs)
+        product_info = object_cache.get_product_info(int(kwargs['pk'])) if kwargs['pk'].isdigit() else None
+        if product_info is None:
+            raise Http404
+        return Response(product_info)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, *args, **kwargs):
+        """
+        История цены и остатка товара, ``date_from``/``date_to`` ограничивают период.
+        """
+        if not kwargs['pk'].isdigit():
+            return JsonResponse({'Status': False, 'Errors': 'Неверный ИД товара'}, status=400)
+        # Как и карточка товара: только товары опубликованной версии каталога работающего магазина.
+        product_info = ProductInfo.objects.filter(
+            id=kwargs['pk'], shop__state=True, version=F('shop__catalog_version')
+        ).values('shop_id', 'external_id').first()
+        if not product_info:
+            return JsonResponse({'Status': False, 'Errors': 'Товар не найден'}, status=404)
+
+        bounds = {}
+        for name, moment in (('date_from', datetime.min.time()), ('date_to', datetime.max.time())):
+            if request.query_params.get(name):
+                day = parse_date(request.query_params[name])
+                if not day:
+                    return JsonResponse({'Status': False, 'Errors': f'Неверный формат {name}'}, status=400)
+                bounds[name] = timezone.make_aware(datetime.combine(day, moment))
+
+        return Response({'shop': product_info['shop_id'],
+                         'external_id': product_info['external_id'],
+                         'series': history.price_series(product_info['shop_id'], product_info['external_id'],
+                                                        **bounds)})
+
 
 class SellerUpdateCatalog(APIView):
     """Класс обновления каталога продавцом"""
@@ -528,50 +815,56 @@ class SellerUpdateCatalog(APIView):
         except ValidationError as e:
             return JsonResponse({'Status': False, 'Error': str(e)})
         else:
-            stream = requests.get(url).content
-            data = load_yaml(stream, Loader=Loader)
-
-            # Если у пользователя нет магазина, то он создает
-            if not Shop.objects.filter(user_id=request.user.id).exists():
-                shop = Shop.objects.create(name=data['shop'], user_id=request.user.id)
-            else:
-                shop = Shop.objects.get(user_id=request.user.id)
+            import_catalog(request.user.id, load_catalog(url))
 
-            # Обновление названия
-            shop.name = data['shop']
-            shop.save()
-
-            for category in data['categories']:
-                if not Category.objects.filter(id=category['id']).exists():
-                    category_object = Category.objects.create(id=category['id'], name=category['name'])
-                else:
-                    category_object = Category.objects.get(id=category['id'])
+            return JsonResponse({'Status': True})
 
-                category_object.shops.add(shop.id)
-                category_object.save()
 
-            ProductInfo.objects.filter(shop_id=shop.id).delete()
 
-            for item in data['goods']:
-                product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
 
-                product_info = ProductInfo.objects.create(product_id=product.id,
-                                                          external_id=item['id'],
-                                                          model=item['model'],
-                                                          price=item['price'],
-                                                          price_rrc=item['price_rrc'],
-                                                          quantity=item['quantity'],
-                                                          shop_id=shop.id)
+class PartnerWebhook(APIView):
 
-                for name, value in item['parameters'].items():
-                    parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                    ProductParameter.objects.create(product_info_id=product_info.id,
-                                                    parameter_id=parameter_object.id,
-                                                    value=value)
-
-            return JsonResponse({'Status': True})
+    """Класс настройки уведомлений магазина о заказах"""
 
+    permission_classes = [IsAuthenticated, IsShopUser]
 
+    def get(self, request, *args, **kwargs):
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if not shop:
+            return JsonResponse({'Status': False, 'Errors': 'Магазин не найден'}, status=404)
+        return JsonResponse({'Status': True,
+                             'url': shop.webhook_url,
+                             'pending': shop.webhook_events.count()})
+
+    # Задать адрес; ключ подписи выдается при первой настройке и при rotate_secret
+    def post(self, request, *args, **kwargs):
+        url = request.data.get('url')
+        if not url:
+            return JsonResponse({'Status': False, 'Errors': 'Отсутствуют обязательные аргументы'})
+        try:
+            URLValidator(schemes=['http', 'https'])(url)
+            webhooks.check_url(url)
+        except ValidationError as e:
+            return JsonResponse({'Status': False, 'Errors': str(e)})
+
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if not shop:
+            return JsonResponse({'Status': False, 'Errors': 'Магазин не найден'}, status=404)
+        shop.webhook_url = url
+        if not shop.webhook_secret or str_to_bool(str(request.data.get('rotate_secret', 'false'))):
+            shop.webhook_secret = webhooks.generate_secret()
+        shop.save(update_fields=['webhook_url', 'webhook_secret'])
+        return JsonResponse({'Status': True, 'Secret': shop.webhook_secret})
+
+    # Отключить уведомления
+    def delete(self, request, *args, **kwargs):
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if not shop:
+            return JsonResponse({'Status': False, 'Errors': 'Магазин не найден'}, status=404)
+        with transaction.atomic():
+            Shop.objects.filter(id=shop.id).update(webhook_url=None, webhook_secret='')
+            shop.webhook_events.all().delete()
+        return JsonResponse({'Status': True})
 
 
 class SellerState(APIView):
@@ -593,7 +886,9 @@ class SellerState(APIView):
         if not state:
             return JsonResponse({'Status': False, 'Errors': 'Отсутствуют обязательные аргументы'})
         try:
-            Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+            Shop.objects.filter(user_id=request.user.id).update(state=str_to_bool(state))
+            object_cache.invalidate(object_cache.SHOP,
+                                    *Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True))
             return JsonResponse({'Status': True})
         except ValueError as error:
             return JsonResponse({'Status': False, 'Errors': str(error)})
@@ -0,0 +1,222 @@
+"""
+Уведомления магазинов о новых и измененных заказах.
+
+Магазин регистрирует адрес (``partner/webhook``) и получает ключ подписи.
+``order_changed`` в транзакции изменения заказа ставит в ``WebhookEvent`` по
+записи на каждый магазин, чьи товары есть в заказе; повторные изменения того же
+заказа до доставки сливаются в одну запись. Команда ``manage.py send_webhooks``
+отправляет каждому магазину одним POST-запросом пачку событий с актуальными
+позициями заказов:
+
+    {"shop": 1, "events": [{"order": 10, "state": "new", "changed_at": "...",
+                            "contact": {...}, "items": [...]}]}
+
+Тело подписывается HMAC-SHA256 ключом магазина: заголовок ``X-Webhook-Signature``
+содержит ``hex(hmac(ключ, "<X-Webhook-Timestamp>." + тело))``. Ответ 2xx
+подтверждает доставку, при ошибке пачка откладывается с экспоненциальной
+задержкой, после ``WEBHOOK_MAX_ATTEMPTS`` попыток события остаются в таблице с
+текстом последней ошибки. Доставка — «хотя бы один раз».
+
+Адрес, который разрешается в адрес внутренней сети (локальный, частный,
+link-local), отклоняется при регистрации и повторно перед каждой отправкой, так
+как имя могло начать указывать на другой адрес; перенаправления не выполняются.
+"""
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import secrets
+import socket
+import time
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .delivery import claim, retry_later
+from .models import Order, OrderItem, Shop, WebhookEvent
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+TIMESTAMP_HEADER = 'X-Webhook-Timestamp'
+
+logger = logging.getLogger(__name__)
+
+
+def generate_secret():
+    return secrets.token_hex(32)
+
+
+def sign(secret, timestamp, body):
+    return hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+
+
+def is_internal_address(address):
+    address = ipaddress.ip_address(address.split('%')[0])
+    if getattr(address, 'ipv4_mapped', None):
+        address = address.ipv4_mapped
+    return (address.is_private or address.is_loopback or address.is_link_local or address.is_reserved
+            or address.is_multicast or address.is_unspecified)
+
+
+def check_url(url):
+    """
+    Проверяет, что адрес уведомлений не ведет во внутреннюю сеть: все адреса, в
+    которые разрешается имя узла, должны быть внешними. Иначе ``ValidationError``.
+    """
+    if settings.WEBHOOK_ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+    except (ValueError, UnicodeError, socket.gaierror):
+        raise ValidationError('Не удалось определить адрес узла')
+    if not addresses or any(is_internal_address(sockaddr[0]) for *_, sockaddr in addresses):
+        raise ValidationError('Адрес узла относится к внутренней сети')
+
+
+def order_changed(order_id, state):
+    """Ставит уведомления магазинам, чьи товары есть в заказе, возвращает их количество."""
+    if state == 'basket':
+        return 0
+    shop_ids = list(Shop.objects.filter(
+        product_infos__ordered_items__order_id=order_id, webhook_url__isnull=False
+    ).exclude(webhook_url='').values_list('id', flat=True).distinct())
+    if not shop_ids:
+        return 0
+    now = timezone.now()
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(shop_id=shop_id, order_id=order_id, state=state, changed_at=now, send_after=now)
+         for shop_id in shop_ids],
+        update_conflicts=True, unique_fields=['shop', 'order_id'],
+        update_fields=['state', 'changed_at', 'send_after', 'attempts', 'last_error'],
+    )
+    return len(shop_ids)
+
+
+def claim_batch(batch_size):
+    """
+    Забирает события, готовые к доставке. Чтобы параллельный обработчик не взял
+    те же события, их ``send_after`` сдвигается на ``WEBHOOK_LEASE``.
+    """
+    ids = claim(WebhookEvent.objects.filter(attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS), batch_size,
+                settings.WEBHOOK_LEASE)
+    return list(WebhookEvent.objects.filter(id__in=ids).select_related('shop').order_by('shop_id', 'order_id'))
+
+
+def build_payload(shop, events):
+    """Тело уведомления: события с контактом и позициями магазина в заказах."""
+    order_ids = [event.order_id for event in events]
+    orders = Order.objects.filter(id__in=order_ids).select_related('contact').in_bulk()
+    items = defaultdict(list)
+    # Цена — зафиксированная при оформлении, для корзины — текущая.
+    for item in OrderItem.objects.filter(order_id__in=order_ids, product_info__shop_id=shop.id).select_related(
+            'product_info__product').annotate(item_price=Coalesce('price', 'product_info__price')):
+        items[item.order_id].append({
+            'product_info': item.product_info_id,
+            'external_id': item.product_info.external_id,
+            'name': item.product_info.product.name,
+            'quantity': item.quantity,
+            'price': item.item_price,
+        })
+
+    payload = []
+    for event in events:
+        order = orders.get(event.order_id)
+        contact = order.contact if order is not None else None
+        payload.append({
+            'order': event.order_id,
+            'state': event.state,
+            'changed_at': event.changed_at,
+            'dt': order.dt if order is not None else None,
+            'contact': {field: getattr(contact, field) for field in
+                        ('city', 'street', 'house', 'structure', 'building', 'apartment', 'phone')}
+            if contact is not None else None,
+            'items': items[event.order_id],
+        })
+    return {'shop': shop.id, 'events': payload}
+
+
+def mark_delivered(events):
+    """Удаляет доставленные события, кроме измененных после отправки."""
+    WebhookEvent.objects.filter(reduce(or_, [Q(id=event.id, changed_at=event.changed_at) for event in events])).delete()
+
+
+def mark_failed(events, error):
+    """Откладывает повторную доставку событий с экспоненциальной задержкой."""
+    retry_later(events, error, settings.WEBHOOK_RETRY_DELAY)
+    logger.warning('Не удалось доставить уведомления магазину %s (попытка %s): %s',
+                   events[0].shop_id, events[0].attempts, error)
+
+
+class WebhookSender:
+    """Отправитель уведомлений с общим HTTP-сеансом (соединения с магазинами переиспользуются)."""
+
+    def __init__(self, timeout=None):
+        import requests
+
+        self.requests = requests
+        self.session = requests.Session()
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT
+        self.stats = {'delivered': 0, 'failed': 0, 'requests': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.session.close()
+
+    def deliver(self, shop, events):
+        """Отправляет пачку событий магазина, возвращает ``True`` при успехе."""
+        body = json.dumps(build_payload(shop, events), cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+        timestamp = str(int(time.time()))
+        self.stats['requests'] += 1
+        try:
+            check_url(shop.webhook_url)
+            response = self.session.post(shop.webhook_url, data=body, timeout=self.timeout, allow_redirects=False,
+                                         headers={
+                                             'Content-Type': 'application/json',
+                                             TIMESTAMP_HEADER: timestamp,
+                                             SIGNATURE_HEADER: sign(shop.webhook_secret, timestamp, body),
+                                         })
+            if not 200 <= response.status_code < 300:
+                raise self.requests.HTTPError(f'HTTP {response.status_code}')
+        except ValidationError as error:
+            mark_failed(events, error.message)
+            self.stats['failed'] += len(events)
+            return False
+        except self.requests.RequestException as error:
+            mark_failed(events, error)
+            self.stats['failed'] += len(events)
+            return False
+        mark_delivered(events)
+        self.stats['delivered'] += len(events)
+        return True
+
+    def send_pending(self, batch_size=None):
+        """Доставляет пачку готовых событий, возвращает число доставленных и неудачных."""
+        events = claim_batch(batch_size or settings.WEBHOOK_BATCH_SIZE)
+        by_shop = defaultdict(list)
+        for event in events:
+            by_shop[event.shop_id].append(event)
+
+        delivered = failed = 0
+        for shop_events in by_shop.values():
+            shop = shop_events[0].shop
+            if not shop.webhook_url:
+                # Адрес удален после постановки события в очередь.
+                WebhookEvent.objects.filter(id__in=[event.id for event in shop_events]).delete()
+                continue
+            if self.deliver(shop, shop_events):
+                delivered += len(shop_events)
+            else:
+                failed += len(shop_events)
+        return delivered, failed
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'orders.urls'
@@ -68,6 +73,24 @@ EMAIL_PORT = '465'
 EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_HOST_USER
 
+# Очередь исходящих писем (api/outbox.py, manage.py send_outbox).
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 30
+EMAIL_OUTBOX_LEASE = 300
+EMAIL_OUTBOX_GROUP_SIZE = 50
+EMAIL_OUTBOX_MAX_PER_CONNECTION = 500
+EMAIL_OUTBOX_RATE_LIMIT = 0
+
+# Уведомления магазинов о заказах (api/webhooks.py, manage.py send_webhooks): событий в одном
+# запросе, таймаут запроса, число попыток, начальная задержка повтора и аренда пачки, секунд.
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_MAX_ATTEMPTS = 10
+WEBHOOK_RETRY_DELAY = 30
+WEBHOOK_LEASE = 120
+# Разрешить адреса уведомлений во внутренней сети (локальные, частные, link-local).
+WEBHOOK_ALLOW_PRIVATE_HOSTS = False
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 40,
@@ -80,9 +103,140 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+        'api.authentication.SignedTokenAuthentication',
+    ),
+
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.ScopedSlidingWindowThrottle',
     ),
 
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '100/hour',
+        'user': '1000/hour',
+    },
+
+}
+
+# Общий для всех процессов кэш (счетчики ограничения запросов, корзины, токены).
+# Без REDIS_URL используется кэш в памяти процесса, и то, что полагается на общий
+# кэш (SHARED_CACHE), по умолчанию выключено.
+SHARED_CACHE = bool(os.environ.get('REDIS_URL'))
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Корзина в кэше с отложенной записью в БД (см. api/basket.py).
+BASKET_CACHE_ENABLED = False
+BASKET_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+BASKET_FLUSH_DELAY = 5
+
+# Кэш карточек товаров и магазинов (см. api/object_cache.py): время жизни записи,
+# время блокировки пересчета и интервал ожидания чужого пересчета, секунд.
+# Инвалидация должна доходить до всех процессов, поэтому кэш включается только
+# при общем кэше (SHARED_CACHE).
+OBJECT_CACHE_ENABLED = SHARED_CACHE
+OBJECT_CACHE_TIMEOUT = 5 * 60
+OBJECT_CACHE_LOCK_TIMEOUT = 5
+OBJECT_CACHE_WAIT_INTERVAL = 0.05
+
+# Через сколько дней завершенные заказы переносятся в архив (manage.py archive_orders).
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+# Время хранения ответов для повторов с заголовком Idempotency-Key, секунд.
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+# Через сколько секунд незавершенный запрос с ключом (упавший воркер) может выполнить повтор.
+IDEMPOTENCY_LEASE = 60
+
+# Кэширование токенов аутентификации (api/authentication.py), секунд и записей.
+# Без общего кэша выход из системы и блокировка пользователя не дошли бы до других процессов.
+AUTH_TOKEN_CACHE_ENABLED = SHARED_CACHE
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_LOCAL_TTL = 5
+AUTH_TOKEN_LOCAL_SIZE = 10000
+
+# Подписанные токены (api/authentication.py): список отозванных токенов и пользователи
+# хранятся в кэше, поэтому без общего кэша они выключены. Срок действия токенов
+# доступа и обновления, секунд.
+SIGNED_TOKENS_ENABLED = SHARED_CACHE
+SIGNED_TOKEN_ACCESS_TTL = 15 * 60
+SIGNED_TOKEN_REFRESH_TTL = 14 * 24 * 60 * 60
+
+# Срок действия токена подтверждения почты, секунд, и срок, после которого
+# неподтвержденные пользователи удаляются (manage.py purge_unconfirmed), дней.
+CONFIRM_EMAIL_TOKEN_TTL = 60 * 60 * 24 * 2
+UNCONFIRMED_USER_GRACE_DAYS = 7
+
+# Асинхронные читающие представления (api/async_views.py), включать при запуске под ASGI.
+ASYNC_READ_VIEWS = False
+
+# Точек в одном чанке истории цен и остатков (api/history.py).
+PRICE_HISTORY_CHUNK_SIZE = 256
+
+# Наибольшее число операций в одном запросе к api/v1/batch.
+BATCH_MAX_REQUESTS = 30
+
+# Таймаут скачивания файла каталога магазина, секунд.
+CATALOG_DOWNLOAD_TIMEOUT = 30
+
+# Учет запросов к БД по каждому запросу (api/middleware.py): заголовок Server-Timing
+# и журнал api.sql. Запрос, повторенный не меньше порога раз, считается признаком N+1.
+SQL_INSTRUMENTATION_ENABLED = True
+SQL_REPEATED_QUERY_THRESHOLD = 5
+# Файл, в который дописываются выполненные запросы для manage.py advise_indexes.
+SQL_CAPTURE_FILE = os.environ.get('SQL_CAPTURE_FILE')
+
+# Метрики Prometheus (api/metrics.py, api/v1/metrics). METRICS_DIR — общий каталог
+# снимков процессов при нескольких воркерах одного хоста; снимки убитых процессов
+# складываются в общий через METRICS_STALE_AFTER секунд; бюджет — допустимые затраты
+# на запрос, секунд.
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_STALE_AFTER = 300
+METRICS_OVERHEAD_BUDGET = 0.00005
+
+# Профилирование запросов (api/profiling.py): заголовок X-Profile: 1 от сотрудника
+# или случайная выборка. Долю выборки можно менять на ходу командой profiles rate:
+# она хранится в кэше и видна всем процессам только при общем кэше.
+PROFILING_ENABLED = True
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_RATE_REFRESH = 10
+PROFILING_RATE_OVERRIDE_ENABLED = SHARED_CACHE
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_MAX_PROFILES = 200
+
+# Бюджет времени загрузки приложения, секунд (manage.py check_startup), и зависимости,
+# которые модули api должны импортировать только в использующих их функциях.
+STARTUP_IMPORT_BUDGET = 0.6
+STARTUP_LAZY_IMPORTS = ('requests', 'yaml', 'numpy', 'distutils')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # INFO — строка на каждый запрос, WARNING — только запросы с повторами.
+        'api.sql': {
+            'handlers': ['console'],
+            'level': os.environ.get('SQL_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 TEMPLATES = [
@@ -109,13 +263,36 @@ EMAIL_HOST_USER = 'admin@admin.ru'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Профиль производительности SQLite (api/backends/sqlite3): WAL, mmap, BEGIN IMMEDIATE.
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'api.backends.sqlite3' if SQLITE_TUNED else 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплики только для чтения (api/db_router.py). Для проверки локально реплику можно
+# задать копией файла SQLite через DATABASE_REPLICA_PATH.
+DATABASE_REPLICAS = []
+if os.environ.get('DATABASE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        'ENGINE': DATABASES['default']['ENGINE'],
+        'NAME': os.environ['DATABASE_REPLICA_PATH'],
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
+# Сколько секунд после изменения данных пользователь читает с основной БД.
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators